@@ -0,0 +1,317 @@
+import base64
+import logging
+import os
+import sqlite3
+import threading
+import time
+import wave
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from .config import settings
+
+logger = logging.getLogger("stefan-api-test-3")
+
+AUDIO_SUFFIXES = (".pcm", ".wav")
+DEFAULT_SAMPLE_RATE = 16000  # pcm_16000, standardformatet i röstprofilerna
+
+# Sorteringsnycklar som går att paginera med index: namn i API:t → kolumn
+SORT_COLUMNS = {"modified": "modified", "name": "name", "size": "size", "duration": "duration_sec"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audio_files (
+    name TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    modified REAL NOT NULL,
+    duration_sec REAL NOT NULL,
+    sample_rate INTEGER NOT NULL,
+    channels INTEGER NOT NULL,
+    text TEXT,
+    voice TEXT,
+    timings TEXT,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS audio_files_modified ON audio_files (modified, name);
+CREATE INDEX IF NOT EXISTS audio_files_size ON audio_files (size, name);
+CREATE INDEX IF NOT EXISTS audio_files_duration ON audio_files (duration_sec, name);
+CREATE INDEX IF NOT EXISTS audio_files_voice ON audio_files (voice, modified, name);
+CREATE INDEX IF NOT EXISTS audio_files_type ON audio_files (type, modified, name);
+CREATE INDEX IF NOT EXISTS audio_files_accessed ON audio_files (accessed, name);
+"""
+
+_COLUMNS = ("name", "type", "size", "modified", "duration_sec", "sample_rate", "channels", "text", "voice", "timings", "accessed")
+
+
+def _encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode()
+
+
+def _decode_cursor(cursor: str) -> list:
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Ogiltig cursor")
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError("Ogiltig cursor")
+    return values
+
+
+def audio_format(path: str, sample_rate: Optional[int] = None, channels: int = 1) -> tuple:
+    """(längd i sekunder, samplerate, kanaler) ur WAV-huvudet eller, för rå PCM, ur filstorleken."""
+    if path.lower().endswith(".wav"):
+        try:
+            with wave.open(path, "rb") as w:
+                rate = w.getframerate()
+                return w.getnframes() / rate, rate, w.getnchannels()
+        except (wave.Error, EOFError, OSError):
+            pass  # Trasigt huvud: räkna som rå PCM
+    rate = sample_rate or DEFAULT_SAMPLE_RATE
+    return os.path.getsize(path) / (rate * 2 * channels), rate, channels
+
+
+class AudioCatalog:
+    """Metadataindex (SQLite) över ljudfilerna i `audio_dir`.
+
+    Filer registreras när de skrivs, så listning och sökning aldrig behöver gå
+    igenom katalogen. Sidor hämtas med en cursor (keyset-paginering på ett index),
+    vilket håller varje sida lika snabb oavsett hur många filer som finns.
+    Alla metoder är synkrona; anropa dem via asyncio.to_thread från event-loopen.
+    """
+
+    def __init__(self, audio_dir: str, db_path: Optional[str] = None):
+        self.audio_dir = audio_dir
+        self.db_path = db_path or os.path.join(audio_dir, ".catalog.sqlite3")
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")  # Testskript i andra processer kan skriva samtidigt
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.audio_dir, name)
+
+    def register(
+        self,
+        path: str,
+        text: Optional[str] = None,
+        voice: Optional[str] = None,
+        timings: Optional[dict] = None,
+        sample_rate: Optional[int] = None,
+        channels: int = 1,
+    ) -> Dict[str, Any]:
+        """Lägger till eller uppdaterar en fil i katalogen (filen måste ligga i audio_dir)."""
+        name = os.path.basename(path)
+        full = self.path_for(name)
+        stat = os.stat(full)
+        duration, rate, channels = audio_format(full, sample_rate, channels)
+        row = {
+            "name": name,
+            "type": os.path.splitext(name)[1].lower(),
+            "size": stat.st_size,
+            "modified": stat.st_mtime,
+            "duration_sec": round(duration, 3),
+            "sample_rate": rate,
+            "channels": channels,
+            "text": text,
+            "voice": voice,
+            "timings": orjson.dumps(timings).decode() if timings is not None else None,
+            "accessed": time.time(),
+        }
+        with self._lock:
+            conn = self._connect()
+            # Behåll tidigare text/röst/tider om de inte anges på nytt (t.ex. när filen växer)
+            conn.execute(
+                f"INSERT INTO audio_files ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))}) "
+                "ON CONFLICT(name) DO UPDATE SET size=excluded.size, modified=excluded.modified, "
+                "duration_sec=excluded.duration_sec, sample_rate=excluded.sample_rate, channels=excluded.channels, "
+                "text=COALESCE(excluded.text, text), voice=COALESCE(excluded.voice, voice), "
+                "timings=COALESCE(excluded.timings, timings)",
+                [row[c] for c in _COLUMNS],
+            )
+            conn.commit()
+        return self._public(row)
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            conn = self._connect()
+            removed = conn.execute("DELETE FROM audio_files WHERE name = ?", (name,)).rowcount
+            conn.commit()
+        return removed > 0
+
+    def touch(self, name: str):
+        """Uppdaterar senaste åtkomst (vid nedladdning)."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("UPDATE audio_files SET accessed = ? WHERE name = ?", (time.time(), name))
+            conn.commit()
+
+    def touch_and_get(self, name: str) -> Optional[Dict[str, Any]]:
+        """touch() och get() i samma trådanrop."""
+        self.touch(name)
+        return self.get(name)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM audio_files WHERE name = ?", (name,)).fetchone()
+        return self._public(dict(row)) if row else None
+
+    def query(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        sort: str = "modified",
+        order: str = "desc",
+        voice: Optional[str] = None,
+        type: Optional[str] = None,
+        text: Optional[str] = None,
+        min_duration: Optional[float] = None,
+        max_duration: Optional[float] = None,
+        with_total: bool = False,
+    ) -> Dict[str, Any]:
+        """En sida filer med filter och sortering; `next_cursor` pekar på nästa sida (None = slut)."""
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Ogiltig sortering (tillåtna: {', '.join(SORT_COLUMNS)})")
+        if order not in ("asc", "desc"):
+            raise ValueError("Ogiltig ordning (asc eller desc)")
+        column = SORT_COLUMNS[sort]
+        where, params = [], []
+        if voice:
+            where.append("voice = ?")
+            params.append(voice)
+        if type:
+            where.append("type = ?")
+            params.append(type if type.startswith(".") else f".{type}")
+        if text:
+            where.append("text LIKE ? ESCAPE '\\'")
+            params.append("%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if min_duration is not None:
+            where.append("duration_sec >= ?")
+            params.append(min_duration)
+        if max_duration is not None:
+            where.append("duration_sec <= ?")
+            params.append(max_duration)
+        filters, filter_params = list(where), list(params)
+
+        op = "<" if order == "desc" else ">"
+        if cursor:
+            value, name = _decode_cursor(cursor)
+            where.append(f"({column}, name) {op} (?, ?)")
+            params.extend([value, name])
+        direction = order.upper()
+        sql = (
+            "SELECT * FROM audio_files"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + f" ORDER BY {column} {direction}, name {direction} LIMIT ?"
+        )
+        with self._lock:
+            conn = self._connect()
+            rows = [dict(r) for r in conn.execute(sql, params + [limit])]
+            total = None
+            if with_total:
+                total = conn.execute(
+                    "SELECT COUNT(*) FROM audio_files" + (f" WHERE {' AND '.join(filters)}" if filters else ""),
+                    filter_params,
+                ).fetchone()[0]
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1]
+            next_cursor = _encode_cursor([last[column], last["name"]])
+        result = {"files": [self._public(r) for r in rows], "next_cursor": next_cursor}
+        if with_total:
+            result["total"] = total
+        return result
+
+    def oldest(self, column: str = "accessed", limit: int = 100, before: Optional[float] = None) -> List[Dict[str, Any]]:
+        """De `limit` filer som är äldst enligt `column` (accessed eller modified), via index."""
+        if column not in ("accessed", "modified"):
+            raise ValueError("Ogiltig kolumn (accessed eller modified)")
+        where, params = "", []
+        if before is not None:
+            where = f" WHERE {column} < ?"
+            params.append(before)
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT name, size, modified, accessed FROM audio_files{where} ORDER BY {column}, name LIMIT ?",
+                params + [limit],
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM audio_files").fetchone()
+        return {"files": count, "bytes": size}
+
+    def sync(self, batch: int = 500) -> Dict[str, int]:
+        """Stämmer av katalogen mot disken: nya filer läggs till, borttagna tas bort.
+
+        Behövs bara vid start och för filer som skrivits utan register(); körs i tråd.
+        """
+        added = removed = 0
+        if not os.path.isdir(self.audio_dir):
+            return {"added": 0, "removed": 0}
+        with self._lock:
+            known = {row[0]: row[1] for row in self._connect().execute("SELECT name, modified FROM audio_files")}
+        seen = set()
+        pending = []
+        with os.scandir(self.audio_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.lower().endswith(AUDIO_SUFFIXES):
+                    continue
+                seen.add(entry.name)
+                if known.get(entry.name) != entry.stat().st_mtime:
+                    pending.append(entry.path)
+                    if len(pending) >= batch:
+                        added += self._register_many(pending)
+                        pending = []
+        added += self._register_many(pending)
+        for name in set(known) - seen:
+            removed += self.remove(name)
+        if added or removed:
+            logger.info("Audio catalog synced: %d added/updated, %d removed", added, removed)
+        return {"added": added, "removed": removed}
+
+    def _register_many(self, paths: List[str]) -> int:
+        count = 0
+        for path in paths:
+            try:
+                self.register(path)
+                count += 1
+            except OSError:
+                pass  # Filen försvann under avstämningen
+        return count
+
+    def _public(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        timings = row.get("timings")
+        return {
+            "name": row["name"],
+            "path": self.path_for(row["name"]),
+            "size": row["size"],
+            "modified": row["modified"],
+            "type": row["type"],
+            "duration_sec": row["duration_sec"],
+            "sample_rate": row["sample_rate"],
+            "channels": row["channels"],
+            "text": row["text"],
+            "voice": row["voice"],
+            "timings": orjson.loads(timings) if isinstance(timings, str) else timings,
+            "accessed": row["accessed"],
+        }
+
+
+audio_catalog = AudioCatalog(settings.AUDIO_OUTPUT_DIR, settings.AUDIO_CATALOG_DB or None)
@@ -0,0 +1,181 @@
+import asyncio
+import email.utils
+import os
+import struct
+from typing import List, Optional, Tuple
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_SIZE = 64 * 1024
+_MAX_RIFF = 0xFFFFFFFF
+
+
+def wav_header(data_bytes: int, sample_rate: int = 16000, channels: int = 1, sample_width: int = 2) -> bytes:
+    """44 bytes RIFF/WAVE-huvud för `data_bytes` bytes PCM (storlekar över 4 GB sätts till max)."""
+    block_align = channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", min(_MAX_RIFF, 36 + data_bytes), b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, sample_width * 8,
+        b"data", min(_MAX_RIFF, data_bytes),
+    )
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Tolkar `Range: bytes=...` till (start, slut inklusive); None = hela filen.
+
+    Flera intervall stöds inte och besvaras med hela filen, vilket RFC 9110 tillåter.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            # Suffix: de sista N byten
+            length = int(last)
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if first == "":
+        if length <= 0 or size == 0:
+            raise RangeNotSatisfiable()  # En tom fil har inga byte att ge
+        return max(0, size - length), size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+class AudioFileResponse(Response):
+    """ASGI-svar för en ljudfil med stöd för Range och ett valfritt förgenererat huvud.
+
+    Innehållet är `prefix` (t.ex. ett WAV-huvud för rå PCM) följt av filen, utan att
+    filen skrivs om eller läses in i minnet. Om servern erbjuder ASGI-tillägget
+    `http.response.zerocopysend` skickas fildelen med sendfile; annars läses den i
+    bitar om CHUNK_SIZE i en tråd. `stat` skickas med när anroparen redan har statat
+    filen (t.ex. för prefixets storlek), så att huvud och längd bygger på samma storlek.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        media_type: str,
+        prefix: bytes = b"",
+        filename: Optional[str] = None,
+        range_header: Optional[str] = None,
+        if_range: Optional[str] = None,
+        method: str = "GET",
+        stat: Optional[os.stat_result] = None,
+    ):
+        self.path = path
+        self.media_type = media_type
+        self.prefix = prefix
+        self.filename = filename
+        self.range_header = range_header
+        self.if_range = if_range
+        self.method = method
+        self.stat = stat
+        self.background = None
+
+    def _headers(self, stat) -> List[Tuple[bytes, bytes]]:
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}-{len(self.prefix):x}"'
+        headers = [
+            (b"content-type", self.media_type.encode()),
+            (b"accept-ranges", b"bytes"),
+            (b"etag", etag.encode()),
+            (b"last-modified", email.utils.formatdate(stat.st_mtime, usegmt=True).encode()),
+        ]
+        if self.filename:
+            headers.append((b"content-disposition", f'inline; filename="{self.filename}"'.encode()))
+        return headers
+
+    def _range_applies(self, headers) -> bool:
+        # If-Range: bara intervall om klientens version fortfarande stämmer
+        if not self.if_range:
+            return True
+        current = dict(headers)
+        return self.if_range in (current[b"etag"].decode(), current[b"last-modified"].decode())
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await self._respond(scope, send)
+        if self.background is not None:
+            await self.background()
+
+    async def _respond(self, scope: Scope, send: Send):
+        stat = self.stat
+        if stat is None:
+            try:
+                stat = await asyncio.to_thread(os.stat, self.path)
+            except FileNotFoundError:
+                await self._send_simple(send, 404, b"Filen hittades inte")
+                return
+        headers = self._headers(stat)
+        total = len(self.prefix) + stat.st_size
+        try:
+            byte_range = parse_range(self.range_header, total) if self._range_applies(headers) else None
+        except RangeNotSatisfiable:
+            headers.append((b"content-range", f"bytes */{total}".encode()))
+            await self._send_simple(send, 416, b"", headers)
+            return
+
+        status = 200
+        start, end = 0, total - 1
+        if byte_range is not None:
+            status = 206
+            start, end = byte_range
+            headers.append((b"content-range", f"bytes {start}-{end}/{total}".encode()))
+        length = end - start + 1 if total else 0
+        headers.append((b"content-length", str(length).encode()))
+
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        if self.method == "HEAD" or length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        # Del av det genererade huvudet som ingår i intervallet
+        prefix_part = self.prefix[start:end + 1] if start < len(self.prefix) else b""
+        file_start = max(0, start - len(self.prefix))
+        file_count = length - len(prefix_part)
+        if file_count <= 0:
+            await send({"type": "http.response.body", "body": prefix_part})
+            return
+
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        fd = await asyncio.to_thread(os.open, self.path, os.O_RDONLY)
+        try:
+            if prefix_part:
+                await send({"type": "http.response.body", "body": prefix_part, "more_body": True})
+            if zerocopy:
+                await send({
+                    "type": "http.response.zerocopysend", "file": fd,
+                    "offset": file_start, "count": file_count, "more_body": False,
+                })
+                return
+            offset, remaining = file_start, file_count
+            while remaining > 0:
+                chunk = await asyncio.to_thread(os.pread, fd, min(CHUNK_SIZE, remaining), offset)
+                if not chunk:
+                    break  # Filen har krympt sedan stat; avsluta i stället för att hänga
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            os.close(fd)
+
+    async def _send_simple(self, send: Send, status: int, body: bytes, headers=None):
+        headers = list(headers or []) + [(b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .audio_catalog import DEFAULT_SAMPLE_RATE
+from .config import settings
+
+logger = logging.getLogger("stefan-api-test-3")
+
+PEAKS_SUFFIX = ".peaks.npz"
+LEVEL_FACTOR = 4  # Varje nivå slår ihop fyra fönster från nivån under
+MIN_LEVEL_PEAKS = 256
+CHUNK_WINDOWS = 4096  # Fönster per minnesmappad bit; håller minnet konstant för stora filer
+
+
+def pcm_layout(path: str, sample_rate: Optional[int] = None, channels: int = 1) -> Tuple[int, int, int, int]:
+    """(dataoffset, antal bytes, samplerate, kanaler) för 16-bit PCM, rå eller i WAV."""
+    size = os.path.getsize(path)
+    if not path.lower().endswith(".wav"):
+        return 0, size, sample_rate or DEFAULT_SAMPLE_RATE, channels
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            raise ValueError("Inte en RIFF/WAVE-fil")
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise ValueError("WAV-filen saknar data-chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk)
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack("<HHIIHH", f.read(16))
+                f.seek(chunk_size - 16 + (chunk_size & 1), os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("WAV-filen saknar fmt-chunk")
+                audio_format, wav_channels, wav_rate, _, _, bits = fmt
+                if audio_format != 1 or bits != 16:
+                    raise ValueError("Bara 16-bit PCM stöds")
+                offset = f.tell()
+                # Strömmade WAV-filer kan ha maxvärde som storlek; lita på filstorleken
+                return offset, min(chunk_size, size - offset), wav_rate, wav_channels
+            else:
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
+def _reduce(mins: np.ndarray, maxs: np.ndarray, factor: int) -> Tuple[np.ndarray, np.ndarray]:
+    pad = (-len(mins)) % factor
+    if pad:
+        mins = np.concatenate([mins, np.full(pad, mins[-1], dtype=mins.dtype)])
+        maxs = np.concatenate([maxs, np.full(pad, maxs[-1], dtype=maxs.dtype)])
+    return mins.reshape(-1, factor).min(axis=1), maxs.reshape(-1, factor).max(axis=1)
+
+
+def compute_peaks(path: str, window: int = 256, sample_rate: Optional[int] = None, channels: int = 1) -> Dict:
+    """Min/max-envelopper i flera upplösningar för en PCM/WAV-fil.
+
+    Filen läses via minnesmappning i bitar om CHUNK_WINDOWS fönster, och varje bit
+    släpps innan nästa mappas, så minnet beror inte på filens storlek. Nivå 0 har
+    `window` sampel per topp och varje nivå ovanför LEVEL_FACTOR gånger fler.
+    """
+    offset, data_bytes, rate, channels = pcm_layout(path, sample_rate, channels)
+    frames = data_bytes // (2 * channels)
+    step = window * channels  # int16-värden per fönster
+    mins_parts: List[np.ndarray] = []
+    maxs_parts: List[np.ndarray] = []
+    pos = 0
+    total = frames * channels
+    while pos < total:
+        count = min(step * CHUNK_WINDOWS, total - pos)
+        chunk = np.memmap(path, dtype="<i2", mode="r", offset=offset + pos * 2, shape=(count,))
+        whole = count - count % step
+        if whole:
+            blocks = chunk[:whole].reshape(-1, step)
+            mins_parts.append(blocks.min(axis=1))
+            maxs_parts.append(blocks.max(axis=1))
+        if whole < count:
+            rest = np.asarray(chunk[whole:])
+            mins_parts.append(rest.min(keepdims=True))
+            maxs_parts.append(rest.max(keepdims=True))
+        del chunk  # Avmappa innan nästa bit
+        pos += count
+
+    mins = np.concatenate(mins_parts) if mins_parts else np.zeros(0, dtype="<i2")
+    maxs = np.concatenate(maxs_parts) if maxs_parts else np.zeros(0, dtype="<i2")
+    levels = [(window, mins, maxs)]
+    while len(mins) > MIN_LEVEL_PEAKS:
+        mins, maxs = _reduce(mins, maxs, LEVEL_FACTOR)
+        levels.append((levels[-1][0] * LEVEL_FACTOR, mins, maxs))
+    return {"sample_rate": rate, "channels": channels, "frames": frames, "levels": levels}
+
+
+def peaks_path(path: str) -> str:
+    return path + PEAKS_SUFFIX
+
+
+def _source_stamp(path: str) -> np.ndarray:
+    stat = os.stat(path)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def build_peaks_cache(path: str, window: int = 256, sample_rate: Optional[int] = None, channels: int = 1) -> str:
+    """Beräknar topparna och sparar dem bredvid ljudfilen (körs i en worker-process)."""
+    stamp = _source_stamp(path)
+    peaks = compute_peaks(path, window, sample_rate, channels)
+    arrays = {
+        "source": stamp,
+        "format": np.array([peaks["sample_rate"], peaks["channels"], peaks["frames"]], dtype=np.int64),
+        "samples_per_peak": np.array([spp for spp, _, _ in peaks["levels"]], dtype=np.int64),
+    }
+    for i, (_, mins, maxs) in enumerate(peaks["levels"]):
+        arrays[f"level{i}"] = np.stack([mins, maxs], axis=1)  # [min, max] per topp
+    target = peaks_path(path)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, target)
+    return target
+
+
+def load_peaks_cache(path: str) -> Optional[Dict]:
+    """Läser cachen om den finns och gäller för ljudfilens nuvarande storlek och ändringstid."""
+    try:
+        with np.load(peaks_path(path)) as data:
+            if not np.array_equal(data["source"], _source_stamp(path)):
+                return None
+            rate, channels, frames = (int(v) for v in data["format"])
+            spp = [int(v) for v in data["samples_per_peak"]]
+            return {
+                "sample_rate": rate,
+                "channels": channels,
+                "frames": frames,
+                "levels": [(s, data[f"level{i}"]) for i, s in enumerate(spp)],
+            }
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+class PeaksService:
+    """Toppar på begäran: läser cachen eller beräknar den lat i en processpool.
+
+    Samtidiga förfrågningar för samma fil delar på en och samma beräkning.
+    """
+
+    def __init__(self, workers: int = 2, window: int = 256):
+        self.workers = max(1, workers)
+        self.window = window
+        self.generated = 0
+        self.cache_hits = 0
+        self.failed = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: appen har trådar (loggning, loop-vakthund) som fork inte ska ärva
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def get(self, path: str, sample_rate: Optional[int] = None, channels: int = 1) -> Dict:
+        cached = await asyncio.to_thread(load_peaks_cache, path)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+        future = self._inflight.get(path)
+        owner = future is None
+        if owner:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self._executor(), build_peaks_cache, path, self.window, sample_rate, channels
+            )
+            self._inflight[path] = future
+            future.add_done_callback(lambda _: self._inflight.pop(path, None))
+        try:
+            await asyncio.shield(future)
+        except Exception as e:
+            if owner:
+                self.failed += 1
+                logger.warning("Failed to compute peaks for %s: %s", path, e)
+            raise
+        if owner:
+            self.generated += 1
+        return await asyncio.to_thread(load_peaks_cache, path)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": self.workers,
+            "window": self.window,
+            "generated": self.generated,
+            "cache_hits": self.cache_hits,
+            "failed": self.failed,
+            "in_flight": len(self._inflight),
+        }
+
+
+def select_level(levels: List[Tuple[int, np.ndarray]], width: int, span_frames: int) -> Tuple[int, np.ndarray]:
+    """Grövsta nivån som ger minst `width` toppar över `span_frames` sampel (annars den finaste)."""
+    for spp, peaks in reversed(levels):
+        if span_frames / spp >= width:
+            return spp, peaks
+    return levels[0]
+
+
+peaks_service = PeaksService(settings.PEAKS_WORKERS, settings.PEAKS_WINDOW)
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .audio_catalog import audio_catalog
+from .audio_peaks import PEAKS_SUFFIX
+from .config import settings
+from .tts.metrics import AUDIO_EVICTED_FILES, AUDIO_STORAGE_BYTES
+
+logger = logging.getLogger("stefan-api-test-3")
+
+
+class RetentionManager:
+    """Håller ljudkatalogen inom en bytebudget och en maxålder.
+
+    Kandidater hämtas ur ljudkatalogens index (äldst `order` först, accessed eller
+    modified) i omgångar om `batch` filer, och varje omgång tas bort i en tråd.
+    Mellan omgångarna släpps event-loopen, så en körning går aldrig igenom hela
+    katalogen i ett svep. 0 som budget eller ålder betyder ingen gräns.
+    """
+
+    def __init__(
+        self,
+        catalog,
+        max_bytes: int = 0,
+        max_age_sec: float = 0,
+        interval_sec: float = 300,
+        batch: int = 100,
+        order: str = "accessed",
+    ):
+        if order not in ("accessed", "modified"):
+            raise ValueError("Ogiltig ordning för gallring (accessed eller modified)")
+        self.catalog = catalog
+        self.max_bytes = max_bytes
+        self.max_age_sec = max_age_sec
+        self.interval_sec = interval_sec
+        self.batch = max(1, batch)
+        self.order = order
+        self.runs = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.evicted = {"age": 0, "size": 0}
+        self.failed = 0
+        self.disk_bytes = 0
+        self.disk_files = 0
+        self.last_run_at: Optional[float] = None
+        self.last_run_sec = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.max_age_sec > 0
+
+    def _remove_files(self, rows: List[Dict]) -> Tuple[List[Dict], int]:
+        """Tar bort filerna (med ev. toppcache) och deras rader; körs i tråd.
+
+        Returnerar (borttagna rader, antal misslyckade). Räknare och metrics uppdateras
+        av anroparen på event-loopen, eftersom metrics-registret inte är trådsäkert.
+        """
+        removed, failed = [], 0
+        for row in rows:
+            path = self.catalog.path_for(row["name"])
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Redan borta; raden ska bort ändå
+            except OSError as e:
+                failed += 1
+                logger.warning("Failed to evict %s: %s", path, e)
+                continue
+            try:
+                os.remove(path + PEAKS_SUFFIX)
+            except OSError:
+                pass
+            self.catalog.remove(row["name"])
+            removed.append(row)
+        return removed, failed
+
+    async def _evict(self, rows: List[Dict], reason: str) -> int:
+        """Gallrar en omgång i en tråd och räknar upp på loopen. Returnerar antal borttagna."""
+        removed, failed = await asyncio.to_thread(self._remove_files, rows)
+        self.failed += failed
+        for row in removed:
+            self.evicted_bytes += row["size"]
+        self.evicted_files += len(removed)
+        self.evicted[reason] += len(removed)
+        if removed:
+            AUDIO_EVICTED_FILES.labels_inc(reason, len(removed))
+        return len(removed)
+
+    async def _evict_by_age(self):
+        cutoff = time.time() - self.max_age_sec
+        while True:
+            rows = await asyncio.to_thread(self.catalog.oldest, "modified", self.batch, cutoff)
+            if not rows or not await self._evict(rows, "age"):
+                return
+            await asyncio.sleep(0)  # Släpp loopen mellan omgångarna
+
+    async def _evict_by_size(self):
+        excess = (await asyncio.to_thread(self.catalog.stats))["bytes"] - self.max_bytes
+        while excess > 0:
+            rows = await asyncio.to_thread(self.catalog.oldest, self.order, self.batch)
+            picked, total = [], 0
+            for row in rows:
+                if total >= excess:
+                    break
+                picked.append(row)
+                total += row["size"]
+            if not picked or not await self._evict(picked, "size"):
+                return
+            excess = (await asyncio.to_thread(self.catalog.stats))["bytes"] - self.max_bytes
+            await asyncio.sleep(0)
+
+    async def run_once(self) -> Dict:
+        """En gallringsrunda: först för gamla filer, sedan äldst/minst använda tills budgeten håller."""
+        started = time.perf_counter()
+        before = self.evicted_files
+        if self.max_age_sec > 0:
+            await self._evict_by_age()
+        if self.max_bytes > 0:
+            await self._evict_by_size()
+        stats = await asyncio.to_thread(self.catalog.stats)
+        self.disk_bytes, self.disk_files = stats["bytes"], stats["files"]
+        AUDIO_STORAGE_BYTES.set(self.disk_bytes)
+        self.runs += 1
+        self.last_run_at = time.time()
+        self.last_run_sec = time.perf_counter() - started
+        evicted = self.evicted_files - before
+        if evicted:
+            logger.info(
+                "Audio retention evicted %d files, %d bytes left in %d files", evicted, self.disk_bytes, self.disk_files
+            )
+        return {"evicted": evicted, "bytes": self.disk_bytes, "files": self.disk_files}
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning("Audio retention run failed: %s", e)
+            await asyncio.sleep(self.interval_sec)
+
+    def start(self):
+        """Startar gallringen i aktuell loop (bara om någon gräns är satt)."""
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="audio-retention")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_bytes": self.max_bytes,
+            "max_age_sec": self.max_age_sec,
+            "order": self.order,
+            "disk_bytes": self.disk_bytes,
+            "disk_files": self.disk_files,
+            "runs": self.runs,
+            "evicted_files": self.evicted_files,
+            "evicted_bytes": self.evicted_bytes,
+            "evicted_by_age": self.evicted["age"],
+            "evicted_by_size": self.evicted["size"],
+            "failed": self.failed,
+            "last_run_at": self.last_run_at,
+            "last_run_ms": round(self.last_run_sec * 1000, 3),
+        }
+
+
+audio_retention = RetentionManager(
+    audio_catalog,
+    settings.AUDIO_RETENTION_MAX_BYTES,
+    settings.AUDIO_RETENTION_MAX_AGE_HOURS * 3600,
+    settings.AUDIO_RETENTION_INTERVAL_SEC,
+    settings.AUDIO_RETENTION_BATCH,
+    settings.AUDIO_RETENTION_ORDER,
+)
@@ -8,4 +8,119 @@ class Settings(BaseModel):
         r"^https?://(localhost(:\d+)?|.*\.lovable\.app)$",
     )
 
+    # Schemaläggning: antal samtidiga uppströmsanslutningar till ElevenLabs
+    TTS_MAX_UPSTREAM_SLOTS: int = int(os.getenv("TTS_MAX_UPSTREAM_SLOTS", "4"))
+    # Minsta andel av tilldelningarna som köade bulk-jobb garanteras (0 = ingen garanti)
+    TTS_BULK_MIN_SHARE: float = float(os.getenv("TTS_BULK_MIN_SHARE", "0.1"))
+    # Prioritet när klienten inte anger någon (interactive, standard, bulk)
+    TTS_DEFAULT_PRIORITY: str = os.getenv("TTS_DEFAULT_PRIORITY", "standard")
+
+    # ElevenLabs-nycklar: en kommaseparerad lista sprider lasten över flera nycklar
+    ELEVENLABS_API_KEY: str = os.getenv("ELEVENLABS_API_KEY", "")
+    ELEVENLABS_API_KEYS: str = os.getenv("ELEVENLABS_API_KEYS", "")
+    # Bas-URL för stream-input (t.ex. ws://127.0.0.1:8765 för den lokala ersättningsservern)
+    ELEVENLABS_WS_BASE: str = os.getenv("ELEVENLABS_WS_BASE", "wss://api.elevenlabs.io")
+    # Kvot per nyckel: tecken per period (0 = ingen gräns) och samtidiga strömmar (0 = ingen gräns)
+    QUOTA_CHARS_PER_PERIOD: int = int(os.getenv("QUOTA_CHARS_PER_PERIOD", "0"))
+    QUOTA_PERIOD_SEC: float = float(os.getenv("QUOTA_PERIOD_SEC", "60"))
+    QUOTA_MAX_STREAMS_PER_KEY: int = int(os.getenv("QUOTA_MAX_STREAMS_PER_KEY", "4"))
+    # Hur länge en förfrågan får vänta på kvot innan den avvisas
+    QUOTA_MAX_WAIT_SEC: float = float(os.getenv("QUOTA_MAX_WAIT_SEC", "5"))
+
+    # Timeouts mot ElevenLabs: anslutning och max tystnad mellan ramar
+    UPSTREAM_OPEN_TIMEOUT_SEC: float = float(os.getenv("UPSTREAM_OPEN_TIMEOUT_SEC", "30"))
+    UPSTREAM_INACTIVITY_TIMEOUT_SEC: float = float(os.getenv("UPSTREAM_INACTIVITY_TIMEOUT_SEC", "12"))
+    # Max väntan på stängningshandskakningen när en trasig uppströmsanslutning överges
+    UPSTREAM_CLOSE_TIMEOUT_SEC: float = float(os.getenv("UPSTREAM_CLOSE_TIMEOUT_SEC", "2"))
+    # Circuit breaker: öppnas när andelen fel/timeouts i fönstret når gränsen
+    BREAKER_FAILURE_RATIO: float = float(os.getenv("BREAKER_FAILURE_RATIO", "0.5"))
+    BREAKER_MIN_CALLS: int = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+    BREAKER_WINDOW_SEC: float = float(os.getenv("BREAKER_WINDOW_SEC", "60"))
+    # Hur länge brytaren står öppen innan provanrop släpps igenom, och hur många
+    BREAKER_OPEN_SEC: float = float(os.getenv("BREAKER_OPEN_SEC", "15"))
+    BREAKER_HALF_OPEN_CALLS: int = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "1"))
+
+    # Hedging: starta en andra uppströmsström om första ljud dröjer längre än
+    # percentilen av uppmätt tid till första ljud (begränsad till [min, max])
+    TTS_HEDGE_ENABLED: bool = os.getenv("TTS_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+    TTS_HEDGE_PERCENTILE: float = float(os.getenv("TTS_HEDGE_PERCENTILE", "95"))
+    TTS_HEDGE_MIN_DELAY_SEC: float = float(os.getenv("TTS_HEDGE_MIN_DELAY_SEC", "0.3"))
+    TTS_HEDGE_MAX_DELAY_SEC: float = float(os.getenv("TTS_HEDGE_MAX_DELAY_SEC", "2.0"))
+    # Högsta andel sessioner som får hedgas (begränsar extra kvotkostnad)
+    TTS_HEDGE_MAX_RATE: float = float(os.getenv("TTS_HEDGE_MAX_RATE", "0.1"))
+
+    # Antal gånger en ström som tappas mitt i texten återupptas från nästa ej upplästa mening
+    TTS_MAX_RESUMES: int = int(os.getenv("TTS_MAX_RESUMES", "2"))
+
+    # Modellval: "modell:kvalitetsnivå" i prioritetsordning, den första är primär
+    TTS_MODEL_CANDIDATES: str = os.getenv(
+        "TTS_MODEL_CANDIDATES",
+        "eleven_flash_v2_5:1,eleven_turbo_v2_5:2,eleven_multilingual_v2:3",
+    )
+    # Lägsta kvalitetsnivå som en reservmodell måste ha
+    TTS_MIN_QUALITY_TIER: int = int(os.getenv("TTS_MIN_QUALITY_TIER", "1"))
+    # SLO för tid till första ljud, mätt som rullande percentil inom ett tidsfönster
+    TTS_TTFB_SLO_SEC: float = float(os.getenv("TTS_TTFB_SLO_SEC", "1.0"))
+    TTS_TTFB_SLO_PERCENTILE: float = float(os.getenv("TTS_TTFB_SLO_PERCENTILE", "90"))
+    TTS_TTFB_WINDOW_SEC: float = float(os.getenv("TTS_TTFB_WINDOW_SEC", "300"))
+
+    # Adaptivt chunk_length_schedule per textlängd (av = alltid det tidigare schemat [50, 90, 140])
+    TTS_SCHEDULE_TUNER_ENABLED: bool = os.getenv("TTS_SCHEDULE_TUNER_ENABLED", "false").lower() in ("1", "true", "yes")
+    # Andel förfrågningar som prövar ett annat schema än det hittills bästa
+    TTS_SCHEDULE_EXPLORE_RATE: float = float(os.getenv("TTS_SCHEDULE_EXPLORE_RATE", "0.1"))
+
+    # Röstprofiler som JSON-objekt {"namn": {"voice_id": ..., "model_id": ..., ...}}, direkt eller i en fil.
+    # Profilen "default" finns alltid och kan skrivas över.
+    TTS_VOICE_PROFILES: str = os.getenv("TTS_VOICE_PROFILES", "")
+    TTS_VOICE_PROFILES_FILE: str = os.getenv("TTS_VOICE_PROFILES_FILE", "")
+
+    # Spårning (spans) per session: andel sessioner som spåras (0 = av) och fil för OTLP-JSON-rader
+    TTS_TRACE_SAMPLE_RATE: float = float(os.getenv("TTS_TRACE_SAMPLE_RATE", "0"))
+    TTS_TRACE_FILE: str = os.getenv("TTS_TRACE_FILE", "traces.jsonl")
+    TTS_TRACE_FRAME_BATCH: int = int(os.getenv("TTS_TRACE_FRAME_BATCH", "10"))
+
+    # Inspelning av uppströmsramar med ankomsttider för uppspelning offline (tom katalog = av)
+    TTS_RECORD_DIR: str = os.getenv("TTS_RECORD_DIR", "")
+    TTS_RECORD_SAMPLE_RATE: float = float(os.getenv("TTS_RECORD_SAMPLE_RATE", "1"))
+    TTS_RECORD_MAX_BYTES: int = int(os.getenv("TTS_RECORD_MAX_BYTES", "20000000"))
+
+    # Sparar ljudet från en andel /ws/tts-sessioner i AUDIO_OUTPUT_DIR för QA (0 = av).
+    # Skrivkön rymmer högst så många bytes; resten tappas i stället för att strömmen väntar.
+    TTS_AUDIO_SINK_SAMPLE_RATE: float = float(os.getenv("TTS_AUDIO_SINK_SAMPLE_RATE", "0"))
+    TTS_AUDIO_SINK_BUFFER_BYTES: int = int(os.getenv("TTS_AUDIO_SINK_BUFFER_BYTES", "4000000"))
+
+    # Ljudfiler för audio viewer och deras metadataindex (tom = .catalog.sqlite3 i katalogen)
+    AUDIO_OUTPUT_DIR: str = os.getenv("AUDIO_OUTPUT_DIR", "test_output")
+    AUDIO_CATALOG_DB: str = os.getenv("AUDIO_CATALOG_DB", "")
+
+    # Gallring av ljudfiler: bytebudget och maxålder (0 = ingen gräns), hur ofta, hur många
+    # filer per omgång och om minst nyligen använda (accessed) eller äldsta (modified) tas först
+    AUDIO_RETENTION_MAX_BYTES: int = int(os.getenv("AUDIO_RETENTION_MAX_BYTES", "0"))
+    AUDIO_RETENTION_MAX_AGE_HOURS: float = float(os.getenv("AUDIO_RETENTION_MAX_AGE_HOURS", "0"))
+    AUDIO_RETENTION_INTERVAL_SEC: float = float(os.getenv("AUDIO_RETENTION_INTERVAL_SEC", "300"))
+    AUDIO_RETENTION_BATCH: int = int(os.getenv("AUDIO_RETENTION_BATCH", "100"))
+    AUDIO_RETENTION_ORDER: str = os.getenv("AUDIO_RETENTION_ORDER", "accessed")
+
+    # Vågformstoppar för audio viewer: worker-processer och sampel per topp på finaste nivån
+    PEAKS_WORKERS: int = int(os.getenv("PEAKS_WORKERS", "2"))
+    PEAKS_WINDOW: int = int(os.getenv("PEAKS_WINDOW", "256"))
+
+    # Loggning: nivå, format (json/text), nivå per logger ("namn=NIVÅ,...") och kö-baserad skrivning.
+    # Loggrader per ljud-chunk släpps igenom var N:te gång (0 = aldrig, 1 = alla).
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "websockets=INFO")
+    LOG_ASYNC: bool = os.getenv("LOG_ASYNC", "true").lower() in ("1", "true", "yes")
+    LOG_CHUNK_SAMPLE_EVERY: int = int(os.getenv("LOG_CHUNK_SAMPLE_EVERY", "50"))
+
+    # Event-loopens fördröjning: mätintervall, gräns för stackfångst och gräns för att
+    # avvisa nya /ws/tts-sessioner (0 = ingen shedding)
+    LOOP_LAG_INTERVAL_SEC: float = float(os.getenv("LOOP_LAG_INTERVAL_SEC", "0.1"))
+    LOOP_LAG_STALL_SEC: float = float(os.getenv("LOOP_LAG_STALL_SEC", "0.25"))
+    LOOP_LAG_SHED_SEC: float = float(os.getenv("LOOP_LAG_SHED_SEC", "0"))
+
+    # Admin-endpoints (profilering); tom token = avstängda
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    PROFILE_MAX_SECONDS: float = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+
 settings = Settings()
@@ -0,0 +1,62 @@
+import hmac
+import logging
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from ..config import settings
+from ..profiling import ProfilerBusyError, allocation_snapshot, profile
+
+logger = logging.getLogger("stefan-api-test-3")
+
+router = APIRouter()
+
+def _require_admin(token: Optional[str]):
+    """Släpper bara igenom anrop med rätt X-Admin-Token; utan ADMIN_TOKEN är endpoints avstängda."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin-endpoints är inte aktiverade")
+    if not token or not hmac.compare_digest(token.encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Ogiltig admin-token")
+
+def _check_duration(seconds: float):
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Max {settings.PROFILE_MAX_SECONDS:g} sekunder")
+
+@router.post("/admin/profile", response_class=PlainTextResponse)
+async def run_profiler(
+    mode: str = Query("wall", pattern="^(wall|cpu)$"),
+    seconds: float = Query(5.0, gt=0),
+    interval_ms: float = Query(10.0, ge=5),
+    x_admin_token: Optional[str] = Header(None),
+) -> PlainTextResponse:
+    """Samplar workerns stackar under en begränsad tid och returnerar collapsed stacks."""
+    _require_admin(x_admin_token)
+    _check_duration(seconds)
+    logger.warning("Admin profiling started: mode=%s seconds=%.1f interval_ms=%.1f", mode, seconds, interval_ms)
+    try:
+        profiler = await profile(mode, seconds, interval_ms / 1000)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail="En profilering pågår redan") from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={"X-Profile-Samples": str(profiler.samples), "X-Profile-Mode": mode},
+    )
+
+@router.post("/admin/allocations")
+async def run_allocation_snapshot(
+    seconds: float = Query(5.0, gt=0),
+    top: int = Query(25, ge=1, le=200),
+    frames: int = Query(1, ge=1, le=10),
+    x_admin_token: Optional[str] = Header(None),
+) -> Dict[str, Any]:
+    """Mäter minnesallokeringar med tracemalloc under en begränsad tid."""
+    _require_admin(x_admin_token)
+    _check_duration(seconds)
+    logger.warning("Admin allocation snapshot started: seconds=%.1f", seconds)
+    try:
+        return await allocation_snapshot(seconds, top=top, frames=frames)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail="En profilering pågår redan") from e
@@ -1,56 +1,125 @@
-import os
-import base64
+import asyncio
 from pathlib import Path
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import HTMLResponse, FileResponse
-from typing import Dict, Any, List, Optional
-import wave
-import time
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Dict, Any, Optional
+
+from ..audio_catalog import audio_catalog, AUDIO_SUFFIXES, DEFAULT_SAMPLE_RATE
+from ..audio_files import AudioFileResponse, wav_header
+from ..audio_peaks import peaks_service, select_level
 
 router = APIRouter()
 
 @router.get("/audio-files")
-async def list_audio_files() -> Dict[str, Any]:
-    """Returnerar lista över audio-filer för dropdown."""
-    output_dir = Path("test_output")
-    
-    if not output_dir.exists():
-        return {
-            "files": [],
-            "message": "Inga audio-filer hittades. Kör ett test först."
-        }
-    
-    # Hitta alla audio-filer
-    audio_files = []
-    for file_path in output_dir.glob("*"):
-        if file_path.is_file() and file_path.suffix.lower() in ['.pcm', '.wav']:
-            stat = file_path.stat()
-            audio_files.append({
-                'name': file_path.name,
-                'path': str(file_path),
-                'size': stat.st_size,
-                'modified': stat.st_mtime,
-                'type': file_path.suffix.lower()
-            })
-    
-    # Sortera efter senaste modifiering (nyaste först)
-    audio_files.sort(key=lambda x: x['modified'], reverse=True)
-    
-    return {
-        "files": audio_files,
-        "message": f"Hittade {len(audio_files)} audio-filer"
-    }
+async def list_audio_files(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    sort: str = Query("modified", description="modified, name, size eller duration"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    voice: Optional[str] = None,
+    type: Optional[str] = Query(None, description="pcm eller wav"),
+    q: Optional[str] = Query(None, description="Sök i texten"),
+    min_duration: Optional[float] = Query(None, ge=0),
+    max_duration: Optional[float] = Query(None, ge=0),
+    with_total: bool = False,
+) -> Dict[str, Any]:
+    """Returnerar en sida audio-filer ur katalogen, filtrerad och sorterad (nyaste först som standard)."""
+    try:
+        page = await asyncio.to_thread(
+            audio_catalog.query, limit, cursor, sort, order, voice, type, q, min_duration, max_duration, with_total,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not page["files"] and cursor is None:
+        page["message"] = "Inga audio-filer hittades. Kör ett test först."
+    else:
+        page["message"] = f"Hittade {len(page['files'])} audio-filer" + (" (fler finns)" if page["next_cursor"] else "")
+    return page
 
-@router.get("/download-audio/{filename}")
-async def download_audio(filename: str):
-    """Laddar ner en audio-fil."""
-    file_path = Path("test_output") / filename
-    
-    if not file_path.exists():
+@router.api_route("/download-audio/{filename}", methods=["GET", "HEAD"])
+async def download_audio(
+    request: Request,
+    filename: str,
+    format: str = Query("raw", pattern="^(raw|wav)$", description="wav = rå PCM med genererat WAV-huvud"),
+):
+    """Laddar ner en audio-fil, med stöd för Range; PCM kan hämtas som WAV utan konvertering."""
+    name = Path(filename).name
+    file_path = Path(audio_catalog.audio_dir) / name
+    # Bara ljudfiler; katalogdatabasen och toppcachen i samma katalog lämnas inte ut
+    if file_path.suffix.lower() not in AUDIO_SUFFIXES:
         raise HTTPException(status_code=404, detail="Filen hittades inte")
-    
-    return FileResponse(
-        path=str(file_path),
-        filename=filename,
-        media_type='application/octet-stream'
+    try:
+        # En och samma stat för WAV-huvudet och svaret, så att de stämmer även medan filen skrivs
+        stat = await asyncio.to_thread(file_path.stat)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Filen hittades inte")
+
+    entry = await asyncio.to_thread(audio_catalog.touch_and_get, name)
+    prefix, media_type, served_name = b"", "application/octet-stream", name
+    if file_path.suffix.lower() == ".wav":
+        media_type = "audio/wav"
+    elif format == "wav":
+        # WAV-huvudet genereras och skickas före filens bytes; filen läses aldrig in i minnet
+        size = stat.st_size
+        sample_rate = entry["sample_rate"] if entry else DEFAULT_SAMPLE_RATE
+        channels = entry["channels"] if entry else 1
+        prefix = wav_header(size, sample_rate, channels)
+        media_type, served_name = "audio/wav", file_path.with_suffix(".wav").name
+
+    return AudioFileResponse(
+        str(file_path),
+        media_type,
+        prefix=prefix,
+        filename=served_name,
+        range_header=request.headers.get("range"),
+        if_range=request.headers.get("if-range"),
+        method=request.method,
+        stat=stat,
     )
+
+@router.get("/audio-peaks/{filename}")
+async def audio_peaks(
+    filename: str,
+    width: int = Query(2000, ge=1, le=100000, description="Ungefärligt antal toppar (t.ex. pixlar)"),
+    start: float = Query(0.0, ge=0, description="Början i sekunder"),
+    end: Optional[float] = Query(None, ge=0, description="Slut i sekunder (standard: filens slut)"),
+) -> Dict[str, Any]:
+    """Min/max-toppar för vågformen; beräknas i bakgrunden första gången och cachas bredvid filen."""
+    name = Path(filename).name
+    file_path = Path(audio_catalog.audio_dir) / name
+    if file_path.suffix.lower() not in AUDIO_SUFFIXES or not file_path.exists():
+        raise HTTPException(status_code=404, detail="Filen hittades inte")
+
+    entry = await asyncio.to_thread(audio_catalog.get, name)
+    try:
+        peaks = await peaks_service.get(
+            str(file_path),
+            entry["sample_rate"] if entry else None,
+            entry["channels"] if entry else 1,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception:
+        raise HTTPException(status_code=500, detail="Kunde inte beräkna vågformen")
+    if peaks is None:
+        # Filen ändrades medan topparna beräknades
+        raise HTTPException(status_code=409, detail="Filen ändrades under beräkningen, försök igen")
+
+    rate, frames = peaks["sample_rate"], peaks["frames"]
+    first = min(int(start * rate), frames)
+    last = frames if end is None else min(int(end * rate), frames)
+    if last < first:
+        raise HTTPException(status_code=400, detail="end måste vara större än start")
+    spp, level = select_level(peaks["levels"], width, last - first)
+    window = level[first // spp:-(-last // spp)]
+    return {
+        "name": name,
+        "sample_rate": rate,
+        "channels": peaks["channels"],
+        "duration_sec": round(frames / rate, 3),
+        "levels": [s for s, _ in peaks["levels"]],
+        "samples_per_peak": spp,
+        "start_sec": round((first // spp) * spp / rate, 6),
+        # [min, max] per topp som int16; dela med 32768 för -1..1
+        "peaks": window.tolist(),
+    }
@@ -0,0 +1,42 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from typing import Dict, Any
+
+from ..tts.scheduler import scheduler
+from ..tts.quota import quota_manager
+from ..tts.circuit_breaker import upstream_breaker
+from ..tts.hedging import hedge_policy
+from ..tts.recovery import recovery_stats
+from ..tts.model_selector import model_selector
+from ..tts.schedule_tuner import schedule_tuner
+from ..tts.metrics import registry
+from ..tts.loop_monitor import loop_monitor
+from ..tts.recorder import recorder
+from ..tts.audio_sink import audio_sink
+from ..audio_peaks import peaks_service
+from ..audio_retention import audio_retention
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def pipeline_metrics() -> Dict[str, Any]:
+    """Returnerar driftstatistik för TTS-pipelinen (köer, kvot, circuit breaker m.m.)."""
+    return {
+        "scheduler": scheduler.snapshot(),
+        "quota": quota_manager.snapshot(),
+        "breaker": upstream_breaker.snapshot(),
+        "hedging": hedge_policy.snapshot(),
+        "recovery": recovery_stats.snapshot(),
+        "models": model_selector.snapshot(),
+        "schedules": schedule_tuner.snapshot(),
+        "event_loop": loop_monitor.snapshot(),
+        "recorder": recorder.snapshot(),
+        "audio_sink": audio_sink.snapshot(),
+        "peaks": peaks_service.snapshot(),
+        "retention": audio_retention.snapshot(),
+    }
+
+
+async def prometheus_metrics() -> PlainTextResponse:
+    """Returnerar histogram, mätare och räknare i Prometheus textformat."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -64,7 +64,9 @@ class TestRunner:
             else:
                 cmd.append(config["path"])
             
-            result = subprocess.run(
+            # I tråd: en pytest-körning tar sekunder och får inte blockera event-loopen
+            result = await asyncio.to_thread(
+                subprocess.run,
                 cmd,
                 capture_output=True,
                 text=True,
@@ -449,45 +451,60 @@ async def test_home() -> HTMLResponse:
             }
         }
         
-        async function loadAudioFiles() {
+        let nextAudioCursor = null;
+        
+        async function loadAudioFiles(append = false) {
             const audioDiv = document.getElementById('audioFiles');
-            audioDiv.innerHTML = '<div class="loading">⏳ Laddar filer...</div>';
+            if (!append) {
+                nextAudioCursor = null;
+                audioDiv.innerHTML = '<div class="loading">⏳ Laddar filer...</div>';
+            }
             
             try {
-                const response = await fetch('/api/audio-files');
+                const params = new URLSearchParams({ limit: '50' });
+                if (append && nextAudioCursor) params.set('cursor', nextAudioCursor);
+                const response = await fetch(`/api/audio-files?${params}`);
                 const data = await response.json();
                 
-                if (data.files.length === 0) {
+                if (!append && data.files.length === 0) {
                     audioDiv.innerHTML = '<div class="info">📂 Inga audio-filer hittades. Kör ett test först!</div>';
                     return;
                 }
                 
-                let html = '<div class="file-list">';
-                html += `<h4>📂 ${data.files.length} filer hittade:</h4>`;
-                
+                let html = '';
                 data.files.forEach(file => {
                     const fileSizeKB = (file.size / 1024).toFixed(1);
                     const modifiedTime = new Date(file.modified * 1000).toLocaleString('sv-SE');
+                    const duration = file.duration_sec ? `${file.duration_sec.toFixed(1)} s • ` : '';
                     
                     html += `
                         <div class="file-item">
                             <div>
                                 <strong>📁 ${file.name}</strong><br>
-                                <small>${fileSizeKB} KB • ${file.type.toUpperCase()} • ${modifiedTime}</small>
+                                <small>${duration}${fileSizeKB} KB • ${file.type.toUpperCase()} • ${modifiedTime}</small>
                             </div>
                             <div>
-                                ${file.type === '.wav' ? 
-                                    `<button class="play-button" onclick="playAudio('${file.name}')">▶️ Spela</button>` : 
-                                    `<span style="color: #6c757d;">PCM (ladda ner)</span>`
-                                }
+                                <button class="play-button" onclick="playAudio('${file.name}')">▶️ Spela</button>
                                 <button class="play-button" onclick="downloadFile('${file.name}')">📥 Ladda ner</button>
+                                <button class="play-button" onclick="showWaveform('${file.name}', this)">〰️ Vågform</button>
                             </div>
                         </div>
                     `;
                 });
                 
-                html += '</div>';
-                audioDiv.innerHTML = html;
+                if (!append) {
+                    audioDiv.innerHTML = '<div class="file-list"><h4>📂 Audio-filer (nyaste först):</h4><div id="audioFileItems"></div></div>';
+                }
+                document.getElementById('audioFileItems').insertAdjacentHTML('beforeend', html);
+                
+                // Nästa sida hämtas med cursor i stället för att alla filer listas på en gång
+                nextAudioCursor = data.next_cursor;
+                const oldMore = document.getElementById('moreAudioFiles');
+                if (oldMore) oldMore.remove();
+                if (nextAudioCursor) {
+                    audioDiv.insertAdjacentHTML('beforeend',
+                        '<button id="moreAudioFiles" class="play-button" onclick="loadAudioFiles(true)">⬇️ Visa fler</button>');
+                }
                 
             } catch (error) {
                 audioDiv.innerHTML = `<div class="error">❌ Fel: ${error.message}</div>`;
@@ -495,13 +512,40 @@ async def test_home() -> HTMLResponse:
         }
         
         function playAudio(filename) {
-            const audio = new Audio(`/api/download-audio/${filename}`);
+            // PCM spelas som WAV: servern lägger till huvudet i farten och stöder Range för spolning
+            const audio = new Audio(`/api/download-audio/${filename}?format=wav`);
             audio.play();
         }
         
         function downloadFile(filename) {
             window.open(`/api/download-audio/${filename}`, '_blank');
         }
+        
+        async function showWaveform(filename, button) {
+            // Servern skickar förberäknade min/max-toppar; ljudet hämtas aldrig för att rita vågformen
+            const item = button.closest('.file-item');
+            let canvas = item.nextElementSibling;
+            if (!canvas || canvas.tagName !== 'CANVAS') {
+                canvas = document.createElement('canvas');
+                canvas.height = 80;
+                canvas.style.width = '100%';
+                item.after(canvas);
+            }
+            canvas.width = canvas.clientWidth || 800;
+            const response = await fetch(`/api/audio-peaks/${filename}?width=${canvas.width}`);
+            if (!response.ok) return;
+            const data = await response.json();
+            const ctx = canvas.getContext('2d');
+            const mid = canvas.height / 2;
+            const step = canvas.width / Math.max(1, data.peaks.length);
+            ctx.clearRect(0, 0, canvas.width, canvas.height);
+            ctx.fillStyle = '#007bff';
+            data.peaks.forEach(([min, max], i) => {
+                const top = mid - (max / 32768) * mid;
+                const bottom = mid - (min / 32768) * mid;
+                ctx.fillRect(i * step, top, Math.max(1, step), Math.max(1, bottom - top));
+            });
+        }
         </script>
     </body>
     </html>
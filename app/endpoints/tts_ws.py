@@ -2,6 +2,7 @@ import asyncio
 import json
 import logging
 import time
+from contextlib import aclosing
 import orjson
 from fastapi import WebSocket, WebSocketDisconnect
 from websockets.exceptions import ConnectionClosedOK, ConnectionClosedError
@@ -9,6 +10,17 @@ from websockets.exceptions import ConnectionClosedOK, ConnectionClosedError
 from ..tts.receive_text_from_frontend import receive_and_validate_text
 from ..tts.text_to_audio import process_text_to_audio
 from ..tts.send_audio_to_frontend import send_audio_to_frontend
+from ..tts.quota import QuotaExceededError
+from ..tts.circuit_breaker import CircuitOpenError
+from ..tts.timings import SessionTimings
+from ..tts.tracing import NOOP_TRACE, tracer
+from ..tts.loop_monitor import loop_monitor
+from ..tts.audio_sink import NOOP_SESSION_AUDIO, audio_sink
+from ..tts.voice_profiles import voice_profiles
+from ..tts.metrics import (
+    ACTIVE_SESSIONS, ERRORS, SESSIONS, SESSION_AUDIO_BYTES, SESSION_DURATION_SECONDS,
+    TIME_TO_FIRST_AUDIO_SECONDS,
+)
 
 logger = logging.getLogger("stefan-api-test-3")
 
@@ -22,16 +34,48 @@ async def _send_json(ws, obj: dict):
 
 async def ws_tts(ws: WebSocket):
     await ws.accept()
-    started_at = time.time()
+    if loop_monitor.should_shed():
+        # Event-loopen ligger efter: ta inte in fler strömmar som skulle hacka tillsammans
+        logger.warning("Shedding TTS session, event loop lag %.3fs", loop_monitor.lag_ewma)
+        ERRORS.labels_inc("shed")
+        try:
+            await _send_json(ws, {"type": "error", "message": "Servern är överbelastad, försök igen om en stund"})
+            await ws.close(code=1013)  # Try again later
+        except Exception:
+            pass
+        return
+    timings = SessionTimings()
+    started_at = timings.started_at
+    ACTIVE_SESSIONS.inc()
+    audio_bytes_total = 0
+    trace = NOOP_TRACE
+    trace_error = None
+    session_audio = NOOP_SESSION_AUDIO
+    breakdown = None
     try:
         await _send_json(ws, {"type": "status", "stage": "ready"})
 
         # 1) Ta emot och validera text från frontend
         text_data = await receive_and_validate_text(ws)
         if text_data is None:
+            ERRORS.labels_inc("invalid_request")
             return  # receive_and_validate_text hanterar fel och stänger ws
-        
+        timings.mark("text_received")
+
         text = text_data["text"]
+        priority = text_data["priority"]
+        profile = text_data["voice"]
+
+        # Spårning med klientens trace-id om det finns; NOOP_TRACE om sessionen inte samplas
+        trace = tracer.start_trace(text_data["trace_id"], text_data["parent_span_id"], started_at=started_at)
+        if trace.sampled:
+            trace.root.set("priority", priority)
+            trace.root.set("voice", profile)
+            trace.root.set("text_chars", len(text))
+            trace.start_span("validate", start=started_at).end(at=timings.get("text_received"))
+
+        # Sparar en kopia av ljudet för en andel av sessionerna (QA); skrivs i bakgrunden
+        session_audio = audio_sink.open(text, profile, voice_profiles[profile].sample_rate)
 
         await _send_json(ws, {"type": "status", "stage": "connecting-elevenlabs"})
         logger.debug("Connecting to ElevenLabs")
@@ -39,31 +83,83 @@ async def ws_tts(ws: WebSocket):
         # 2) Hantera ElevenLabs API-kommunikation och audio-streaming
         await _send_json(ws, {"type": "status", "stage": "streaming"})
         
-        audio_bytes_total = 0
         last_chunk_ts = None
+        send_sec = 0.0
+        frames_sent = 0
         
-        async for server_msg, current_audio_bytes in process_text_to_audio(ws, text, started_at):
-            # Hantera audio-streaming till frontend
-            audio_bytes_total, last_chunk_ts, should_break = await send_audio_to_frontend(
-                ws, server_msg, current_audio_bytes, last_chunk_ts
-            )
-            
-            if should_break:
-                break
+        # aclosing: stäng uppströmsanslutningen direkt vid break i stället för vid GC
+        stream_span = trace.start_span("stream")
+        async with aclosing(process_text_to_audio(
+            ws, text, started_at, priority, profile=profile, timings=timings, trace=trace
+        )) as frames:
+            async for server_msg, _ in frames:
+                # Hantera audio-streaming till frontend (summan räknas här, generatorns räknare ser bara binära ramar)
+                first_chunk = last_chunk_ts is None
+                send_started = time.perf_counter() if trace.sampled else 0.0
+                audio_bytes_total, last_chunk_ts, should_break = await send_audio_to_frontend(
+                    ws, server_msg, audio_bytes_total, last_chunk_ts, session_audio
+                )
+                if trace.sampled:
+                    send_sec += time.perf_counter() - send_started
+                    frames_sent += 1
+                if first_chunk and last_chunk_ts is not None:
+                    timings.mark("first_audio_sent")
+                    TIME_TO_FIRST_AUDIO_SECONDS.observe(last_chunk_ts - started_at)
+
+                if should_break:
+                    break
+        stream_span.set("frames", frames_sent)
+        stream_span.set("audio_bytes", audio_bytes_total)
+        stream_span.set("send_ms", round(send_sec * 1000, 3))
+        stream_span.end()
         
+        elapsed_sec = round(time.perf_counter() - started_at, 3)
+        breakdown = timings.breakdown()
         await _send_json(ws, {
             "type": "status",
             "stage": "done",
             "audio_bytes_total": audio_bytes_total,
-            "elapsed_sec": round(time.time() - started_at, 3),
+            "elapsed_sec": elapsed_sec,
+            "timings": breakdown,
+            **({"trace_id": trace.trace_id} if trace.sampled else {}),
         })
+        logger.info(
+            "Session timings: %s",
+            orjson.dumps({"audio_bytes_total": audio_bytes_total, "elapsed_sec": elapsed_sec, **breakdown}).decode(),
+        )
+        SESSIONS.inc()
 
     except WebSocketDisconnect:
         logger.info("Client disconnected")
-    except (ConnectionClosedOK, ConnectionClosedError) as e:
-        logger.info("Upstream WS closed: %s", e)
+        ERRORS.labels_inc("client_disconnect")
+        trace_error = "client_disconnect"
+    except (QuotaExceededError, CircuitOpenError) as e:
+        logger.warning("Rejected TTS request: %s", e)
+        ERRORS.labels_inc("rejected")
+        trace_error = str(e)
+        try:
+            await _send_json(ws, {"type": "error", "message": str(e)})
+            await ws.close(code=1013)  # Try again later
+        except Exception:
+            pass
+    except (ConnectionClosedOK, ConnectionClosedError, asyncio.TimeoutError) as e:
+        # Uppströmsanslutningen bröts (efter eventuella återupptag) eller kunde inte öppnas i tid.
+        # tts_errors räknas redan per uppströmsförsök i _upstream_frames.
+        timed_out = isinstance(e, asyncio.TimeoutError)
+        logger.info("Upstream WS %s: %s", "timed out" if timed_out else "closed", e)
+        trace_error = "upstream timeout" if timed_out else str(e)
+        try:
+            await _send_json(ws, {
+                "type": "error",
+                "message": "TTS-leverantören svarade inte i tid" if timed_out else "Anslutningen till TTS-leverantören bröts",
+            })
+            await ws.close(code=1011)
+        except Exception:
+            pass
     except Exception as e:
         logger.exception("WS error: %s", e)
+        ERRORS.labels_inc("internal")
+        trace_error = str(e)
         try:
             await _send_json(ws, {"type": "error", "message": str(e)})
         except Exception:
@@ -72,3 +168,11 @@ async def ws_tts(ws: WebSocket):
             await ws.close(code=1011)
         except Exception:
             pass
+    finally:
+        session_audio.close(breakdown)
+        ACTIVE_SESSIONS.dec()
+        SESSION_DURATION_SECONDS.observe(time.perf_counter() - started_at)
+        SESSION_AUDIO_BYTES.observe(audio_bytes_total)
+        if trace.sampled:
+            trace.root.set("audio_bytes", audio_bytes_total)
+            trace.finish(error=trace_error)
@@ -0,0 +1,149 @@
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Dict, Optional
+
+import orjson
+
+from .config import settings
+
+# Standardattribut på LogRecord; allt annat kommer från extra={...} och följer med i JSON-loggen
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formaterar varje post som en JSON-rad med tid, nivå, logger, meddelande och extra-fält."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler som behåller undantaget i exc_text i stället för att baka in det i msg.
+
+    Standardversionen formaterar hela posten (med traceback) till msg och nollar
+    exc_info/exc_text, så JsonFormatter i lyssnartråden skulle aldrig se undantaget.
+    Här formateras bara meddelandet och undantaget var för sig; exc_info släpps
+    eftersom traceback-objekt inte ska leva vidare i kön.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class LogSampler:
+    """Släpper igenom var N:te händelse, för loggning per ljud-chunk.
+
+    `every` 0 stänger av loggningen helt och 1 loggar allt.
+    """
+
+    __slots__ = ("every", "_count")
+
+    def __init__(self, every: int):
+        self.every = every
+        self._count = 0
+
+    def sample(self) -> bool:
+        if self.every <= 0:
+            return False
+        self._count += 1
+        if self._count >= self.every:
+            self._count = 0
+            return True
+        return False
+
+
+def parse_logger_levels(spec: str) -> Dict[str, int]:
+    """Tolkar "logger=NIVÅ,logger=NIVÅ" till {logger: nivå}."""
+    levels = {}
+    for part in spec.split(","):
+        name, sep, level = part.strip().partition("=")
+        if not sep:
+            continue
+        value = logging.getLevelName(level.strip().upper())
+        if not isinstance(value, int):
+            raise ValueError(f"Okänd loggnivå för {name.strip()}: {level.strip()}")
+        levels[name.strip()] = value
+    return levels
+
+
+def configure_logging(
+    level: str = None,
+    fmt: str = None,
+    logger_levels: str = None,
+    use_queue: bool = None,
+    stream=None,
+) -> Optional[logging.handlers.QueueListener]:
+    """Sätter upp rotloggern: JSON- eller textformat och valfritt kö-baserad skrivning.
+
+    Med kö lägger event-loopen bara posten i en SimpleQueue; en QueueListener-tråd
+    formaterar och skriver till stderr, så loggning blockerar aldrig strömmarna.
+    """
+    global _listener
+    level = level or settings.LOG_LEVEL
+    fmt = fmt or settings.LOG_FORMAT
+    logger_levels = settings.LOG_LEVELS if logger_levels is None else logger_levels
+    use_queue = settings.LOG_ASYNC if use_queue is None else use_queue
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(level.upper())
+
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        root.addHandler(_QueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+    else:
+        root.addHandler(output)
+
+    for name, value in parse_logger_levels(logger_levels).items():
+        logging.getLogger(name).setLevel(value)
+    return _listener
+
+
+def stop_logging():
+    """Tömmer kön och stoppar lyssnartråden (vid avslut)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -3,6 +3,7 @@ import base64
 import json
 import logging
 import time
+from contextlib import asynccontextmanager
 from typing import Optional
 
 import orjson
@@ -21,11 +22,39 @@ from .endpoints.health import healthz, echo
 from .endpoints.tts_ws import ws_tts
 from .endpoints.test import router as test_router
 from .endpoints.audio_viewer import router as audio_router
+from .endpoints.metrics import router as metrics_router, prometheus_metrics
+from .endpoints.admin import router as admin_router
+from .logging_config import configure_logging
+from .tts.loop_monitor import loop_monitor
+from .audio_catalog import audio_catalog
+from .audio_peaks import peaks_service
+from .audio_retention import audio_retention
+from .tts.audio_sink import audio_sink
+from .tts.recorder import recorder
+from .tts.tracing import tracer
 
 logger = logging.getLogger("stefan-api-test-3")
-logging.basicConfig(level=logging.DEBUG)
-
-app = FastAPI(title="stefan-api-test-3", version="0.1.3")
+configure_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startar och stoppar bakgrundsövervakning."""
+    loop_monitor.start()
+    # Stäm av ljudkatalogen mot disken i bakgrunden (filer skrivna medan appen var nere)
+    catalog_sync = asyncio.create_task(asyncio.to_thread(audio_catalog.sync), name="audio-catalog-sync")
+    audio_retention.start()
+    yield
+    # Inspelningar som fortfarande står i kö skrivs klart innan något annat stängs
+    await recorder.drain()
+    await audio_retention.stop()
+    await asyncio.gather(catalog_sync, return_exceptions=True)
+    await audio_sink.stop()
+    await tracer.exporter.drain()
+    await loop_monitor.stop()
+    peaks_service.shutdown()
+    audio_catalog.close()
+
+app = FastAPI(title="stefan-api-test-3", version="0.1.3", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -39,9 +68,12 @@ app.add_middleware(
 # Registrera endpoints
 app.get("/healthz")(healthz)
 app.post("/echo")(echo)
+app.get("/metrics")(prometheus_metrics)
 app.websocket("/ws/tts")(ws_tts)
 app.include_router(test_router, prefix="/api")
 app.include_router(audio_router, prefix="/api")
+app.include_router(metrics_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
 
 
 
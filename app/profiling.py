@@ -0,0 +1,187 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, Optional
+
+# Gränser som håller overheaden nere när profileraren körs under produktionslast
+MIN_INTERVAL_SEC = 0.005
+MAX_DEPTH = 64
+MAX_TRACEMALLOC_FRAMES = 10
+
+_CPU_CLOCKS = hasattr(time, "pthread_getcpuclockid")
+
+
+class ProfilerBusyError(RuntimeError):
+    """En profilering pågår redan i den här workern."""
+
+
+_busy = threading.Lock()
+
+# Privat i asyncio (loop → körande task) och finns inte i alla Python-versioner;
+# saknas den letas den körande tasken upp bland asyncio.all_tasks() i stället
+_current_tasks = getattr(asyncio.tasks, "_current_tasks", None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _collapse(frame, max_depth: int) -> list:
+    stack = []
+    while frame is not None and len(stack) < max_depth:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()  # Rot först, som i collapsed-stack-formatet
+    return stack
+
+
+class SamplingProfiler:
+    """Tidsbegränsad samplande profilerare som körs i en egen tråd.
+
+    I läget "wall" räknas varje sampel; i läget "cpu" räknas bara trådar som har
+    förbrukat CPU-tid sedan förra samplet (via pthread_getcpuclockid). Stackar från
+    event-loopens tråd får den aktuella asyncio-tasken som rotram, så att tiden
+    kan hänföras till en viss session eller bakgrundstask.
+    """
+
+    def __init__(
+        self,
+        mode: str = "wall",
+        interval_sec: float = 0.01,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        loop_thread_id: Optional[int] = None,
+        max_depth: int = MAX_DEPTH,
+    ):
+        if mode not in ("wall", "cpu"):
+            raise ValueError(f"Okänt profileringsläge: {mode}")
+        if mode == "cpu" and not _CPU_CLOCKS:
+            raise ValueError("CPU-läget kräver pthread_getcpuclockid (Linux/Unix)")
+        self.mode = mode
+        self.interval_sec = max(MIN_INTERVAL_SEC, interval_sec)
+        self.loop = loop
+        self.loop_thread_id = loop_thread_id
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._cpu_last: Dict[int, float] = {}
+
+    def _cpu_advanced(self, thread_id: int) -> bool:
+        try:
+            now = time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+        except (OSError, OverflowError):
+            return False  # Tråden har hunnit avslutas
+        last = self._cpu_last.get(thread_id)
+        self._cpu_last[thread_id] = now
+        return last is not None and now > last
+
+    def _current_task(self) -> Optional[asyncio.Task]:
+        # Anropas från profilerarens tråd: bara läsning, ingen metod på loopen anropas
+        if _current_tasks is not None:
+            return _current_tasks.get(self.loop)
+        try:
+            tasks = asyncio.all_tasks(self.loop)
+        except RuntimeError:
+            return None  # Tasksetet ändrades under iterationen; hoppa över samplet
+        for task in tasks:
+            # Yttersta coroutinen kör medan taskens steg exekverar
+            if getattr(task.get_coro(), "cr_running", False):
+                return task
+        return None
+
+    def _task_label(self) -> Optional[str]:
+        if self.loop is None:
+            return None
+        task = self._current_task()
+        return f"task:{task.get_name()}" if task is not None else "task:<idle>"
+
+    def sample(self, own_thread_id: int):
+        """Tar ett sampel av alla trådar utom profilerarens egen."""
+        self.samples += 1
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id:
+                continue
+            if self.mode == "cpu" and not self._cpu_advanced(thread_id):
+                continue
+            stack = _collapse(frame, self.max_depth)
+            if thread_id == self.loop_thread_id:
+                label = self._task_label()
+                if label:
+                    stack.insert(0, label)
+            self.stacks[";".join(stack)] += 1
+
+    def run(self, duration_sec: float):
+        """Samplar i `duration_sec` sekunder; blockerar anropande tråd."""
+        own = threading.get_ident()
+        deadline = time.monotonic() + duration_sec
+        if self.mode == "cpu":
+            for thread_id in sys._current_frames():
+                if thread_id != own:
+                    self._cpu_advanced(thread_id)  # Nollpunkt för CPU-tiden
+        while True:
+            next_at = time.monotonic() + self.interval_sec
+            if next_at > deadline:
+                break
+            time.sleep(self.interval_sec)
+            self.sample(own)
+
+    def collapsed(self) -> str:
+        """Resultat i collapsed-stack-format ("ram;ram;ram antal"), för flamegraph.pl/speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+async def profile(mode: str, duration_sec: float, interval_sec: float) -> SamplingProfiler:
+    """Kör profileraren i en tråd medan event-loopen fortsätter som vanligt."""
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusyError("En profilering pågår redan")
+    try:
+        profiler = SamplingProfiler(
+            mode, interval_sec, loop=asyncio.get_running_loop(), loop_thread_id=threading.get_ident()
+        )
+        await asyncio.to_thread(profiler.run, duration_sec)
+        return profiler
+    finally:
+        _busy.release()
+
+
+async def allocation_snapshot(duration_sec: float, top: int = 25, frames: int = 1) -> dict:
+    """Jämför tracemalloc-snapshots före och efter `duration_sec` och returnerar största ökningarna.
+
+    tracemalloc startas bara för mätningen (om det inte redan var igång) och stoppas efteråt.
+    """
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusyError("En profilering pågår redan")
+    started_here = False
+    try:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(min(max(1, frames), MAX_TRACEMALLOC_FRAMES))
+            started_here = True
+        # Snapshot och jämförelse kan ta sekunder på en stor heap → i tråd, inte på loopen
+        before = await asyncio.to_thread(tracemalloc.take_snapshot)
+        await asyncio.sleep(duration_sec)
+        after = await asyncio.to_thread(tracemalloc.take_snapshot)
+        current, peak = tracemalloc.get_traced_memory()
+        stats = await asyncio.to_thread(after.compare_to, before, "traceback" if frames > 1 else "lineno")
+        return {
+            "duration_sec": duration_sec,
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "top": [
+                {
+                    "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                    "size_bytes": stat.size,
+                    "size_diff_bytes": stat.size_diff,
+                    "count": stat.count,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats[:top]
+            ],
+        }
+    finally:
+        if started_here:
+            tracemalloc.stop()
+        _busy.release()
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+import random
+import time
+import uuid
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from ..audio_catalog import audio_catalog
+from ..config import settings
+from .metrics import AUDIO_SINK_DROPPED_BYTES
+
+logger = logging.getLogger("stefan-api-test-3")
+
+PART_SUFFIX = ".part"  # Pågående inspelning; katalogen och avstämningen ignorerar dessa
+
+
+class SessionAudio:
+    """Ljudet från en /ws/tts-session som skrivs till en .pcm-fil i ljudkatalogen.
+
+    write() lägger bara chunken i skrivarens kö och väntar aldrig på disk. Får kön
+    inte plats tappas chunken; efter första tappade chunk tappas resten av sessionen
+    också, så att filen aldrig innehåller ihopskarvat ljud.
+    """
+
+    def __init__(self, sink, path: str, text: str, voice: str, sample_rate: int):
+        self.sink = sink
+        self.path = path
+        self.text = text
+        self.voice = voice
+        self.sample_rate = sample_rate
+        self.bytes = 0
+        self.dropped_bytes = 0
+        self.timings: Optional[dict] = None
+        self.failed = False
+        self._file = None  # Öppnas och används bara i skrivartråden
+
+    def write(self, chunk: bytes):
+        if self.dropped_bytes or not self.sink._offer(self, chunk):
+            self.dropped_bytes += len(chunk)
+            self.sink._dropped(len(chunk))
+            return
+        self.bytes += len(chunk)
+
+    def close(self, timings: Optional[dict] = None):
+        self.timings = timings
+        self.sink._offer(self, None)
+
+
+class _NoopSessionAudio:
+    def write(self, chunk: bytes):
+        pass
+
+    def close(self, timings: Optional[dict] = None):
+        pass
+
+
+NOOP_SESSION_AUDIO = _NoopSessionAudio()
+
+
+class AudioSink:
+    """Sparar ljudet för en andel `sample_rate` av sessionerna (0 = av) för QA.
+
+    En bakgrundsuppgift tömmer kön och skriver i en tråd. Kön rymmer högst
+    `max_buffer_bytes`; hinner disken inte med tappas chunkar i stället för att
+    websocket-sändningen bromsas, och antalet tappade bytes rapporteras.
+    Färdiga filer byter namn från .part till .pcm och registreras i audio_catalog.
+    """
+
+    def __init__(self, catalog, sample_rate: float = 0.0, max_buffer_bytes: int = 4_000_000):
+        self.catalog = catalog
+        self.sample_rate = sample_rate
+        self.max_buffer_bytes = max_buffer_bytes
+        self.sessions = 0
+        self.written_files = 0
+        self.written_bytes = 0
+        self.dropped_chunks = 0
+        self.dropped_bytes = 0
+        self.failed = 0
+        self.queued_bytes = 0
+        self._writing = False
+        self._queue: Deque[Tuple[SessionAudio, Optional[bytes]]] = deque()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def open(self, text: str, voice: str, sample_rate: int):
+        """Ny inspelning för sessionen, eller NOOP_SESSION_AUDIO om den inte samplas."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return NOOP_SESSION_AUDIO
+        self._ensure_writer()
+        self.sessions += 1
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        name = f"ws_tts_{stamp}_{uuid.uuid4().hex[:8]}.pcm"
+        return SessionAudio(self, self.catalog.path_for(name), text, voice, sample_rate)
+
+    def _ensure_writer(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._task = loop.create_task(self._run(), name="audio-sink-writer")
+            if self._queue:
+                self._wake.set()
+
+    def _offer(self, session: SessionAudio, chunk: Optional[bytes]) -> bool:
+        if chunk is not None:
+            if self.queued_bytes + len(chunk) > self.max_buffer_bytes:
+                return False
+            self.queued_bytes += len(chunk)
+        self._queue.append((session, chunk))
+        self._wake.set()
+        return True
+
+    def _dropped(self, size: int):
+        self.dropped_chunks += 1
+        self.dropped_bytes += size
+        AUDIO_SINK_DROPPED_BYTES.inc(size)
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self._queue:
+                batch = list(self._queue)
+                self._queue.clear()
+                self._writing = True
+                try:
+                    await asyncio.to_thread(self._write_batch, batch)
+                finally:
+                    self._writing = False
+                    # Bytes räknas mot gränsen tills de faktiskt är skrivna
+                    self.queued_bytes -= sum(len(chunk) for _, chunk in batch if chunk is not None)
+
+    def _write_batch(self, batch):
+        for session, chunk in batch:
+            if session.failed:
+                continue
+            try:
+                if chunk is None:
+                    self._finish(session)
+                    continue
+                if session._file is None:
+                    os.makedirs(os.path.dirname(session.path) or ".", exist_ok=True)
+                    session._file = open(session.path + PART_SUFFIX, "ab")
+                session._file.write(chunk)
+                self.written_bytes += len(chunk)
+            except Exception as e:
+                session.failed = True
+                self.failed += 1
+                logger.warning("Failed to write session audio %s: %s", session.path, e)
+                self._discard(session)
+
+    def _finish(self, session: SessionAudio):
+        if session._file is None:
+            return  # Inget ljud skickades
+        session._file.close()
+        session._file = None
+        os.replace(session.path + PART_SUFFIX, session.path)
+        if session.dropped_bytes:
+            logger.warning(
+                "Session audio %s incomplete: %d bytes dropped (disk too slow)", session.path, session.dropped_bytes
+            )
+        self.catalog.register(session.path, text=session.text, voice=session.voice,
+                              timings=session.timings, sample_rate=session.sample_rate)
+        self.written_files += 1
+
+    def _discard(self, session: SessionAudio):
+        if session._file is not None:
+            try:
+                session._file.close()
+            except OSError:
+                pass
+            session._file = None
+        try:
+            os.remove(session.path + PART_SUFFIX)
+        except OSError:
+            pass
+
+    async def drain(self):
+        """Väntar tills kön är skriven (tester, nedstängning)."""
+        while (self._queue or self._writing) and self._task is not None and not self._task.done():
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        await self.drain()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "sessions": self.sessions,
+            "written_files": self.written_files,
+            "written_bytes": self.written_bytes,
+            "queued_bytes": self.queued_bytes,
+            "max_buffer_bytes": self.max_buffer_bytes,
+            "dropped_chunks": self.dropped_chunks,
+            "dropped_bytes": self.dropped_bytes,
+            "failed": self.failed,
+        }
+
+
+audio_sink = AudioSink(audio_catalog, settings.TTS_AUDIO_SINK_SAMPLE_RATE, settings.TTS_AUDIO_SINK_BUFFER_BYTES)
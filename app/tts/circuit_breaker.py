@@ -0,0 +1,153 @@
+import logging
+import time
+from collections import deque
+from typing import Optional
+
+from ..config import settings
+
+logger = logging.getLogger("stefan-api-test-3")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Uppströmsleverantören bedöms vara nere; nya sessioner avvisas direkt."""
+
+
+class CircuitBreaker:
+    """Circuit breaker runt uppströmsanslutningen till ElevenLabs.
+
+    Utfall (ok, error, timeout) samlas i ett glidande tidsfönster. När andelen
+    misslyckade anrop når `failure_ratio` (med minst `min_calls` anrop i fönstret)
+    öppnas brytaren och nya sessioner avvisas direkt i `open_sec` sekunder. Därefter
+    släpps högst `half_open_max_calls` provanrop igenom; lyckas de stängs brytaren,
+    annars öppnas den igen.
+
+    before_call() returnerar tillståndets generation, som skickas med till record().
+    Utfall från anrop som startade under en tidigare generation (t.ex. ett långsamt
+    anrop från CLOSED som blir klart under HALF_OPEN) räknas som inaktuella och ignoreras.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_ratio: float,
+        min_calls: int,
+        window_sec: float,
+        open_sec: float,
+        half_open_max_calls: int,
+    ):
+        self.name = name
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window_sec = window_sec
+        self.open_sec = open_sec
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.reset()
+
+    def reset(self):
+        """Återställer brytaren till stängt läge utan historik."""
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._outcomes = deque()  # (tidpunkt, lyckades)
+        self._probes_in_flight = 0
+        self._generation = 0  # Ökar vid varje tillståndsbyte
+        self.rejected = 0
+        self.stale = 0
+        self.transitions = {CLOSED: 0, OPEN: 0, HALF_OPEN: 0}
+        self.outcomes_total = {"ok": 0, "error": 0, "timeout": 0}
+
+    def _transition(self, new_state: str):
+        if new_state == self.state:
+            return
+        logger.warning("Circuit breaker %s: %s -> %s", self.name, self.state, new_state)
+        self.state = new_state
+        self._generation += 1
+        self.transitions[new_state] += 1
+        if new_state == OPEN:
+            self._opened_at = time.monotonic()
+            self._probes_in_flight = 0
+        elif new_state == CLOSED:
+            self._outcomes.clear()
+
+    def _prune(self, now: float):
+        cutoff = now - self.window_sec
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    def before_call(self) -> int:
+        """Anropas innan en uppströmsanslutning öppnas. Kastar CircuitOpenError om den ska avvisas.
+
+        Returnerar generationen som anropet startade under; skickas till record().
+        """
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_sec:
+                self.rejected += 1
+                raise CircuitOpenError("TTS-leverantören är tillfälligt otillgänglig, försök igen senare")
+            self._transition(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_max_calls:
+                self.rejected += 1
+                raise CircuitOpenError("TTS-leverantören är tillfälligt otillgänglig, försök igen senare")
+            self._probes_in_flight += 1
+        return self._generation
+
+    def record(self, outcome: Optional[str], generation: int):
+        """Registrerar utfallet av ett anrop: "ok", "error", "timeout" eller None (inget utfall).
+
+        `generation` är värdet från before_call(); utfall från ett tidigare tillstånd ignoreras.
+        """
+        if generation != self._generation:
+            # Sent utfall från ett anrop som startade före senaste tillståndsbytet
+            if outcome is not None:
+                self.stale += 1
+            return
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+        if outcome is None:
+            return
+
+        self.outcomes_total[outcome] += 1
+        success = outcome == "ok"
+
+        if self.state == HALF_OPEN:
+            self._transition(CLOSED if success else OPEN)
+            return
+
+        now = time.monotonic()
+        self._outcomes.append((now, success))
+        self._prune(now)
+        calls = len(self._outcomes)
+        if calls >= self.min_calls:
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if failures / calls >= self.failure_ratio:
+                self._transition(OPEN)
+
+    def snapshot(self) -> dict:
+        """Returnerar brytarens tillstånd och statistik."""
+        self._prune(time.monotonic())
+        calls = len(self._outcomes)
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return {
+            "name": self.name,
+            "state": self.state,
+            "window_calls": calls,
+            "window_failure_ratio": round(failures / calls, 3) if calls else 0.0,
+            "rejected": self.rejected,
+            "stale_outcomes": self.stale,
+            "transitions": dict(self.transitions),
+            "outcomes": dict(self.outcomes_total),
+        }
+
+
+upstream_breaker = CircuitBreaker(
+    "elevenlabs",
+    failure_ratio=settings.BREAKER_FAILURE_RATIO,
+    min_calls=settings.BREAKER_MIN_CALLS,
+    window_sec=settings.BREAKER_WINDOW_SEC,
+    open_sec=settings.BREAKER_OPEN_SEC,
+    half_open_max_calls=settings.BREAKER_HALF_OPEN_CALLS,
+)
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+from collections import deque
+
+from ..config import settings
+
+logger = logging.getLogger("stefan-api-test-3")
+
+
+class HedgePolicy:
+    """Bestämmer när en andra uppströmsström ska startas och håller statistik.
+
+    Fördröjningen är percentilen `percentile` av de senaste uppmätta tiderna
+    till första ljud, begränsad till [min_delay_sec, max_delay_sec]. Andelen
+    hedgade sessioner begränsas av `max_rate` så att extra kvotkostnad hålls nere.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        percentile: float,
+        min_delay_sec: float,
+        max_delay_sec: float,
+        max_rate: float,
+        min_samples: int = 20,
+        window: int = 500,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay_sec = min_delay_sec
+        self.max_delay_sec = max_delay_sec
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.sessions = 0
+        self.hedges_started = 0
+        self.hedges_skipped = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+
+    def observe_first_audio(self, seconds: float):
+        """Registrerar uppmätt tid från anslutning till första ljud."""
+        self._samples.append(seconds)
+
+    def delay(self) -> float:
+        """Returnerar hur länge vi väntar på första ljud innan vi hedgar."""
+        if len(self._samples) < self.min_samples:
+            return self.max_delay_sec
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return min(self.max_delay_sec, max(self.min_delay_sec, ordered[index]))
+
+    def allow_hedge(self) -> bool:
+        """Begränsar andelen hedgade sessioner till max_rate."""
+        return self.hedges_started < self.max_rate * max(1, self.sessions)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "delay_sec": round(self.delay(), 4),
+            "samples": len(self._samples),
+            "sessions": self.sessions,
+            "hedges_started": self.hedges_started,
+            "hedges_skipped": self.hedges_skipped,
+            "hedge_rate": round(self.hedges_started / self.sessions, 4) if self.sessions else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+        }
+
+
+_END = object()
+
+
+async def _pump(attempt, frames, events: asyncio.Queue):
+    """Läser en uppströmsström i egen task och lägger ramarna i en gemensam kö."""
+    try:
+        async for item in frames:
+            events.put_nowait((attempt, item))
+        events.put_nowait((attempt, _END))
+    except asyncio.CancelledError:
+        raise
+    except BaseException as e:
+        events.put_nowait((attempt, e))
+    finally:
+        await frames.aclose()
+
+
+async def hedged_frames(policy: HedgePolicy, primary, open_frames, start_hedge, on_winner=None, on_loser=None):
+    """Lämnar ut ramar från den ström som först ger ljud.
+
+    `open_frames(attempt)` öppnar en uppströmsström och returnerar en async-generator
+    som ger `(server_msg, is_audio, voiced_chars)`. `start_hedge()` returnerar ett nytt försök eller
+    None om det inte finns kvot för en extra ström. Förloraren avbryts och
+    `on_winner(attempt)` anropas med vinnaren. `on_loser(attempt)` anropas direkt för
+    varje försök som avbryts eller dör före första ljud, så att dess resurser kan
+    lämnas tillbaka innan sessionen är slut.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    tasks = {primary: asyncio.create_task(_pump(primary, open_frames(primary), events))}
+    buffers = {primary: []}
+    hedge_at = asyncio.get_running_loop().time() + policy.delay()
+    hedged = False
+    winner = None
+
+    try:
+        # Vänta på första ljud från något försök; buffra allt annat under tiden
+        while winner is None:
+            timeout = None
+            if not hedged:
+                timeout = max(0.0, hedge_at - asyncio.get_running_loop().time())
+            try:
+                attempt, item = await asyncio.wait_for(events.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                hedged = True
+                hedge = start_hedge() if policy.allow_hedge() else None
+                if hedge is None:
+                    policy.hedges_skipped += 1
+                    continue
+                policy.hedges_started += 1
+                logger.info("No audio after %.3fs, starting hedged upstream stream", policy.delay())
+                buffers[hedge] = []
+                tasks[hedge] = asyncio.create_task(_pump(hedge, open_frames(hedge), events))
+                continue
+
+            if attempt not in tasks:
+                continue  # Redan avbrutet försök
+            if item is _END or isinstance(item, BaseException):
+                others = [a for a in tasks if a is not attempt and not tasks[a].done()]
+                if others:
+                    # Försöket dog eller tog slut innan ljud (t.ex. inaktivitets-timeout); låt det andra fortsätta
+                    if item is _END:
+                        logger.warning("Upstream attempt ended without audio, waiting for the other attempt")
+                    else:
+                        logger.warning("Upstream attempt failed before first audio: %s", item)
+                    del tasks[attempt]
+                    if on_loser is not None:
+                        on_loser(attempt)
+                    continue
+                winner = attempt
+                buffers[attempt].append(item)
+                break
+
+            buffers[attempt].append(item)
+            if item[1]:
+                winner = attempt
+
+        if winner is primary:
+            policy.primary_wins += 1
+        else:
+            policy.hedge_wins += 1
+        if on_winner is not None:
+            on_winner(winner)
+
+        # Avbryt förloraren
+        for attempt, task in list(tasks.items()):
+            if attempt is not winner:
+                task.cancel()
+                if on_loser is not None:
+                    on_loser(attempt)
+
+        for item in buffers[winner]:
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+        while True:
+            attempt, item = await events.get()
+            if attempt is not winner:
+                continue
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+
+hedge_policy = HedgePolicy(
+    enabled=settings.TTS_HEDGE_ENABLED,
+    percentile=settings.TTS_HEDGE_PERCENTILE,
+    min_delay_sec=settings.TTS_HEDGE_MIN_DELAY_SEC,
+    max_delay_sec=settings.TTS_HEDGE_MAX_DELAY_SEC,
+    max_rate=settings.TTS_HEDGE_MAX_RATE,
+)
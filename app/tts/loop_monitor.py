@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from ..config import settings
+from .metrics import registry, Gauge, Histogram
+
+logger = logging.getLogger("stefan-api-test-3")
+
+LOOP_LAG_SECONDS = registry.register(Histogram(
+    "tts_event_loop_lag_seconds", "Scheduling delay of the event loop",
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+))
+LOOP_LAG_CURRENT = registry.register(Gauge(
+    "tts_event_loop_lag_current_seconds", "Smoothed event loop lag",
+))
+LOOP_SHEDDING = registry.register(Gauge(
+    "tts_event_loop_shedding", "1 while /ws/tts admission is shed due to event loop lag",
+))
+
+
+class LoopLagMonitor:
+    """Mäter event-loopens schemaläggningsfördröjning och fångar stackar vid stopp.
+
+    En task sover `interval_sec` i taget; hur mycket senare än väntat den vaknar är
+    loopens fördröjning. En vakthundstråd ser när tasken inte har hunnit köra på
+    `stall_sec` och sparar då loop-trådens stack, dvs. koden som blockerar. Med
+    `shed_sec` > 0 avvisas nya /ws/tts-sessioner medan den utjämnade fördröjningen
+    överstiger gränsen (och tills den sjunkit under halva gränsen).
+    """
+
+    def __init__(self, interval_sec: float, stall_sec: float, shed_sec: float, alpha: float = 0.3, max_stalls: int = 20):
+        self.interval_sec = interval_sec
+        self.stall_sec = stall_sec
+        self.shed_sec = shed_sec
+        self.alpha = alpha
+        self.stalls = deque(maxlen=max_stalls)
+        self.lag_ewma = 0.0
+        self.lag_max = 0.0
+        self.shedding = False
+        self.shed_total = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def observe(self, lag: float):
+        """Registrerar en uppmätt fördröjning och uppdaterar shedding-läget."""
+        lag = max(0.0, lag)
+        LOOP_LAG_SECONDS.observe(lag)
+        self.lag_ewma += self.alpha * (lag - self.lag_ewma)
+        if lag > self.lag_max:
+            self.lag_max = lag
+        LOOP_LAG_CURRENT.value = self.lag_ewma
+
+        if self.shed_sec > 0:
+            if not self.shedding and self.lag_ewma > self.shed_sec:
+                self.shedding = True
+                logger.warning("Event loop lag %.3fs above %.3fs, shedding new TTS sessions", self.lag_ewma, self.shed_sec)
+            elif self.shedding and self.lag_ewma < self.shed_sec / 2:
+                self.shedding = False
+                logger.info("Event loop lag back to %.3fs, admitting TTS sessions", self.lag_ewma)
+            LOOP_SHEDDING.value = int(self.shedding)
+
+    def should_shed(self) -> bool:
+        """True om nya sessioner ska avvisas just nu."""
+        if self.shedding:
+            self.shed_total += 1
+        return self.shedding
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval_sec
+            await asyncio.sleep(self.interval_sec)
+            self._heartbeat = time.monotonic()
+            self.observe(loop.time() - expected)
+
+    def _watch(self):
+        """Körs i egen tråd: fångar loop-trådens stack när loopen står still."""
+        captured_for = None
+        while not self._stop.wait(self.interval_sec):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval_sec
+            if stalled < self.stall_sec or captured_for == heartbeat:
+                continue
+            captured_for = heartbeat  # En stack per stopp
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = traceback.format_stack(frame) if frame is not None else []
+            self.stalls.append({
+                "at": round(time.time(), 3),
+                "stalled_sec": round(stalled, 3),
+                "stack": [line.rstrip() for line in stack[-15:]],
+            })
+            logger.warning(
+                "Event loop blocked for %.3fs, stack:\n%s", stalled, "".join(stack[-15:]),
+            )
+
+    def start(self):
+        """Startar mät-tasken i aktuell loop och vakthundstråden."""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    def snapshot(self) -> dict:
+        return {
+            "interval_sec": self.interval_sec,
+            "stall_sec": self.stall_sec,
+            "shed_sec": self.shed_sec,
+            "lag_ewma_sec": round(self.lag_ewma, 4),
+            "lag_max_sec": round(self.lag_max, 4),
+            "shedding": self.shedding,
+            "shed_total": self.shed_total,
+            "recent_stalls": list(self.stalls),
+        }
+
+
+loop_monitor = LoopLagMonitor(
+    interval_sec=settings.LOOP_LAG_INTERVAL_SEC,
+    stall_sec=settings.LOOP_LAG_STALL_SEC,
+    shed_sec=settings.LOOP_LAG_SHED_SEC,
+)
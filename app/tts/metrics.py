@@ -0,0 +1,185 @@
+import bisect
+from typing import Dict, List, Sequence, Tuple
+
+# Enkel Prometheus-registry utan externa beroenden. All uppdatering sker i
+# event-loopens tråd, så räknarna är vanliga attribut utan lås, och observe()
+# allokerar ingenting: bucket-index söks med bisect i en förallokerad lista.
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0)
+GAP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.35, 0.5, 1.0, 2.0, 5.0)
+DURATION_BUCKETS = (0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0, 120.0)
+BYTES_BUCKETS = (1_000, 10_000, 32_000, 64_000, 128_000, 256_000, 512_000, 1_000_000, 4_000_000)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Counter:
+    """Monoton räknare, valfritt med en etikett (t.ex. feltyp)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label: str = None, initial_labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.value = 0
+        self.values: Dict[str, int] = {value: 0 for value in initial_labels}
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def labels_inc(self, label_value: str, amount: int = 1):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def reset(self):
+        self.value = 0
+        self.values = {value: 0 for value in self.values}
+
+    def samples(self) -> List[Tuple[str, list, float]]:
+        if self.label is None:
+            return [(self.name + "_total", [], self.value)]
+        return [(self.name + "_total", [(self.label, v)], n) for v, n in self.values.items()]
+
+
+class Gauge:
+    """Värde som kan gå upp och ner (t.ex. aktiva sessioner)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def dec(self, amount: int = 1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def reset(self):
+        self.value = 0
+
+    def samples(self) -> List[Tuple[str, list, float]]:
+        return [(self.name, [], self.value)]
+
+
+class Histogram:
+    """Histogram med fasta bucket-gränser."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help_text
+        self.bounds = tuple(sorted(buckets))
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)  # Sista platsen är +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # bisect_left ger första gränsen >= value, dvs. Prometheus le-semantik
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self) -> List[Tuple[str, list, float]]:
+        samples = []
+        cumulative = 0
+        for bound, n in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += n
+            samples.append((self.name + "_bucket", [("le", _format_value(float(bound)))], cumulative))
+        samples.append((self.name + "_sum", [], self.sum))
+        samples.append((self.name + "_count", [], self.count))
+        return samples
+
+
+class MetricsRegistry:
+    """Samling av mätvärden som kan renderas i Prometheus textformat."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def reset(self):
+        for metric in self._metrics:
+            metric.reset()
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+UPSTREAM_CONNECT_SECONDS = registry.register(Histogram(
+    "tts_upstream_connect_seconds", "Time to open the ElevenLabs websocket", LATENCY_BUCKETS,
+))
+TIME_TO_FIRST_AUDIO_SECONDS = registry.register(Histogram(
+    "tts_time_to_first_audio_seconds", "Time from session start to first audio byte sent to the client", LATENCY_BUCKETS,
+))
+INTER_CHUNK_GAP_SECONDS = registry.register(Histogram(
+    "tts_inter_chunk_gap_seconds", "Gap between consecutive audio chunks sent to the client", GAP_BUCKETS,
+))
+SESSION_DURATION_SECONDS = registry.register(Histogram(
+    "tts_session_duration_seconds", "Total duration of a /ws/tts session", DURATION_BUCKETS,
+))
+SESSION_AUDIO_BYTES = registry.register(Histogram(
+    "tts_session_audio_bytes", "Audio bytes sent to the client per session", BYTES_BUCKETS,
+))
+ACTIVE_SESSIONS = registry.register(Gauge(
+    "tts_active_sessions", "Open /ws/tts sessions",
+))
+UPSTREAM_CONNECTIONS = registry.register(Gauge(
+    "tts_upstream_connections", "Open websocket connections to ElevenLabs",
+))
+SESSIONS = registry.register(Counter(
+    "tts_sessions", "Completed /ws/tts sessions",
+))
+ERRORS = registry.register(Counter(
+    "tts_errors", "Errors by type", label="type",
+    initial_labels=(
+        "client_disconnect", "invalid_request", "rejected", "upstream_dropped",
+        "upstream_connect", "upstream_timeout", "provider_error", "shed", "internal",
+    ),
+))
+AUDIO_SINK_DROPPED_BYTES = registry.register(Counter(
+    "tts_audio_sink_dropped_bytes", "Session audio bytes not recorded because the write queue was full",
+))
+AUDIO_STORAGE_BYTES = registry.register(Gauge(
+    "audio_storage_bytes", "Bytes of cataloged audio files in AUDIO_OUTPUT_DIR",
+))
+AUDIO_EVICTED_FILES = registry.register(Counter(
+    "audio_evicted_files", "Audio files removed by the retention manager", label="reason",
+    initial_labels=("age", "size"),
+))
@@ -0,0 +1,165 @@
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger("stefan-api-test-3")
+
+
+def parse_model_candidates(spec: str) -> List[Tuple[str, int]]:
+    """Tolkar "modell:nivå,modell:nivå" till en lista (model_id, kvalitetsnivå)."""
+    candidates = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        model_id, _, tier = part.partition(":")
+        candidates.append((model_id.strip(), int(tier) if tier else 1))
+    return candidates
+
+
+class _LatencyWindow:
+    """Tid till första ljud för en modell/röst inom ett glidande tidsfönster."""
+
+    __slots__ = ("samples",)
+
+    def __init__(self, maxlen: int):
+        self.samples = deque(maxlen=maxlen)  # (tidpunkt, sekunder)
+
+    def recent(self, now: float, window_sec: float) -> List[float]:
+        cutoff = now - window_sec
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        return [seconds for _, seconds in self.samples]
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+class ModelSelector:
+    """Väljer ElevenLabs-modell utifrån uppmätt tid till första ljud (TTFB).
+
+    Den primära modellen (först i kandidatlistan) används så länge dess rullande
+    percentil håller SLO:n. Bryter den SLO:n väljs den snabbaste kandidaten som
+    uppfyller lägsta kvalitetsnivå och själv håller SLO:n. Mätningar äldre än
+    `window_sec` glöms bort, så en modell som saknar färska mätningar prövas igen.
+    """
+
+    def __init__(
+        self,
+        candidates: List[Tuple[str, int]],
+        min_quality_tier: int,
+        slo_sec: float,
+        percentile: float = 90,
+        window_sec: float = 300,
+        min_samples: int = 5,
+        max_samples: int = 200,
+    ):
+        if not candidates:
+            raise ValueError("Minst en modellkandidat krävs")
+        self.candidates = candidates
+        self.min_quality_tier = min_quality_tier
+        self.slo_sec = slo_sec
+        self.percentile = percentile
+        self.window_sec = window_sec
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.reset()
+
+    def reset(self):
+        self._latency: Dict[Tuple[str, str], _LatencyWindow] = {}
+        self.decisions = deque(maxlen=50)
+        self.selected_total = {model_id: 0 for model_id, _ in self.candidates}
+
+    @property
+    def primary(self) -> str:
+        return self.candidates[0][0]
+
+    def observe(self, model_id: str, voice_id: str, seconds: float):
+        """Registrerar tid till första ljud för en modell/röst."""
+        window = self._latency.get((model_id, voice_id))
+        if window is None:
+            window = self._latency[(model_id, voice_id)] = _LatencyWindow(self.max_samples)
+        window.samples.append((time.monotonic(), seconds))
+
+    def _stat(self, model_id: str, voice_id: str, now: float):
+        """Rullande percentil, eller None om det saknas tillräckligt med färska mätningar."""
+        window = self._latency.get((model_id, voice_id))
+        if window is None:
+            return None
+        recent = window.recent(now, self.window_sec)
+        if len(recent) < self.min_samples:
+            return None
+        return _percentile(recent, self.percentile)
+
+    def select(self, voice_id: str) -> str:
+        """Väljer modell för en ny förfrågan och loggar beslutet."""
+        now = time.monotonic()
+        primary_stat = self._stat(self.primary, voice_id, now)
+
+        if primary_stat is None or primary_stat <= self.slo_sec:
+            model_id, reason = self.primary, "primary-within-slo" if primary_stat is not None else "primary-no-data"
+        else:
+            eligible = [m for m, tier in self.candidates if tier >= self.min_quality_tier and m != self.primary]
+            stats = {m: self._stat(m, voice_id, now) for m in eligible}
+            healthy = [m for m in eligible if stats[m] is not None and stats[m] <= self.slo_sec]
+            untested = [m for m in eligible if stats[m] is None]
+            if healthy:
+                model_id, reason = min(healthy, key=lambda m: stats[m]), "fallback-fastest-within-slo"
+            elif untested:
+                model_id, reason = untested[0], "fallback-untested"
+            else:
+                # Alla bryter SLO:n → ta den snabbaste, inklusive primär
+                stats[self.primary] = primary_stat
+                model_id, reason = min(stats, key=lambda m: stats[m]), "all-breaching-fastest"
+            if model_id != self.primary:
+                logger.info(
+                    "Primary model %s breaches TTFB SLO (p%d=%.3fs > %.3fs), routing to %s",
+                    self.primary, self.percentile, primary_stat, self.slo_sec, model_id,
+                )
+
+        self.selected_total[model_id] = self.selected_total.get(model_id, 0) + 1
+        self.decisions.append({
+            "at": round(time.time(), 3),
+            "voice_id": voice_id,
+            "model_id": model_id,
+            "reason": reason,
+        })
+        return model_id
+
+    def snapshot(self) -> dict:
+        """Returnerar latensstatistik per modell/röst och de senaste besluten."""
+        now = time.monotonic()
+        latency = []
+        for (model_id, voice_id), window in self._latency.items():
+            recent = window.recent(now, self.window_sec)
+            stat = _percentile(recent, self.percentile) if recent else None
+            latency.append({
+                "model_id": model_id,
+                "voice_id": voice_id,
+                "samples": len(recent),
+                f"p{int(self.percentile)}_sec": round(stat, 4) if stat is not None else None,
+                "breaching_slo": len(recent) >= self.min_samples and stat > self.slo_sec,
+            })
+        return {
+            "primary": self.primary,
+            "slo_sec": self.slo_sec,
+            "min_quality_tier": self.min_quality_tier,
+            "candidates": [{"model_id": m, "quality_tier": tier} for m, tier in self.candidates],
+            "selected_total": dict(self.selected_total),
+            "latency": latency,
+            "recent_decisions": list(self.decisions),
+        }
+
+
+model_selector = ModelSelector(
+    parse_model_candidates(settings.TTS_MODEL_CANDIDATES),
+    min_quality_tier=settings.TTS_MIN_QUALITY_TIER,
+    slo_sec=settings.TTS_TTFB_SLO_SEC,
+    percentile=settings.TTS_TTFB_SLO_PERCENTILE,
+    window_sec=settings.TTS_TTFB_WINDOW_SEC,
+)
@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from ..config import settings
+
+logger = logging.getLogger("stefan-api-test-3")
+
+
+class QuotaExceededError(Exception):
+    """Förfrågan ryms inte inom leverantörens kvot (inte ens efter väntan)."""
+
+
+class _KeyState:
+    """Teckenhink och öppna strömmar för en API-nyckel."""
+
+    __slots__ = ("api_key", "headers", "tokens", "updated_at", "open_streams", "chars_used")
+
+    def __init__(self, api_key: str, capacity: float):
+        self.api_key = api_key
+        self.headers = [("xi-api-key", api_key)]  # Förberäknade headers för uppströmsanslutningen
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.open_streams = 0
+        self.chars_used = 0
+
+
+class QuotaLease:
+    """En tilldelad ström på en viss API-nyckel. Måste lämnas tillbaka med release()."""
+
+    __slots__ = ("_manager", "_state", "chars", "_released")
+
+    def __init__(self, manager: "QuotaManager", state: _KeyState, chars: int):
+        self._manager = manager
+        self._state = state
+        self.chars = chars
+        self._released = False
+
+    @property
+    def api_key(self) -> str:
+        return self._state.api_key
+
+    @property
+    def headers(self) -> list:
+        return self._state.headers
+
+    def mark_exhausted(self):
+        """Leverantören har rapporterat slut på kvoten → töm hinken för nyckeln."""
+        self._state.tokens = 0.0
+        self._state.updated_at = time.monotonic()
+        logger.warning("Provider reported quota exhausted for key %s", _mask(self._state.api_key))
+
+    def charge(self, chars: int):
+        """Drar ytterligare tecken från nyckelns hink, t.ex. när text skickas om på samma ström.
+
+        Hinken kan bli negativ; nästa förfrågan på nyckeln får då vänta på påfyllnad.
+        """
+        self._manager._charge(self._state, chars)
+        self.chars += chars
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._manager._release(self._state)
+
+
+def _mask(api_key: str) -> str:
+    """Visar bara de sista tecknen av en nyckel i loggar och metrics."""
+    if not api_key:
+        return "(ingen)"
+    return "…" + api_key[-4:]
+
+
+class QuotaManager:
+    """Håller koll på tecken per period och samtidiga strömmar per ElevenLabs-nyckel.
+
+    Tecknen modelleras som en token bucket som fylls på kontinuerligt med
+    `chars_per_period / period_sec` tecken per sekund. Förfrågningar fördelas på
+    den minst belastade nyckeln som har utrymme; finns inget utrymme väntar vi
+    högst `max_wait_sec` innan förfrågan avvisas.
+    """
+
+    def __init__(
+        self,
+        api_keys: List[str],
+        chars_per_period: int,
+        period_sec: float,
+        max_streams_per_key: int,
+        max_wait_sec: float,
+    ):
+        self.capacity = float(chars_per_period)  # 0 = ingen teckengräns
+        self.rate = self.capacity / period_sec if chars_per_period > 0 and period_sec > 0 else 0.0
+        self.max_streams_per_key = max_streams_per_key  # 0 = ingen gräns
+        self.period_sec = period_sec
+        self.max_wait_sec = max_wait_sec
+        self.rejected = 0
+        self._keys = [_KeyState(key, self.capacity) for key in (api_keys or [""])]
+        self._waiters = set()
+
+    def _refill(self, state: _KeyState, now: float):
+        if self.rate and state.tokens < self.capacity:
+            state.tokens = min(self.capacity, state.tokens + (now - state.updated_at) * self.rate)
+        state.updated_at = now
+
+    def _admits(self, state: _KeyState, chars: int) -> bool:
+        if self.max_streams_per_key and state.open_streams >= self.max_streams_per_key:
+            return False
+        return not self.capacity or state.tokens >= chars
+
+    def try_acquire(self, chars: int) -> Optional[QuotaLease]:
+        """Tilldelar en nyckel direkt om någon har utrymme, annars None."""
+        now = time.monotonic()
+        best = None
+        for state in self._keys:
+            self._refill(state, now)
+            if not self._admits(state, chars):
+                continue
+            # Minst belastad: färst öppna strömmar, därefter mest kvar i hinken
+            if best is None or (state.open_streams, -state.tokens) < (best.open_streams, -best.tokens):
+                best = state
+        if best is None:
+            return None
+        if self.capacity:
+            best.tokens -= chars
+        best.open_streams += 1
+        best.chars_used += chars
+        return QuotaLease(self, best, chars)
+
+    def _wait_hint(self, chars: int):
+        """Returnerar (kortaste påfyllnadstid, om en release kan hjälpa)."""
+        hint = None
+        release_may_help = False
+        for state in self._keys:
+            if self.max_streams_per_key and state.open_streams >= self.max_streams_per_key:
+                release_may_help = release_may_help or not self.capacity or state.tokens >= chars
+            elif self.rate:
+                wait = max(0.0, (chars - state.tokens) / self.rate)
+                hint = wait if hint is None else min(hint, wait)
+        return hint, release_may_help
+
+    async def acquire(self, chars: int) -> QuotaLease:
+        """Väntar på kvot för `chars` tecken eller kastar QuotaExceededError."""
+        if self.capacity and chars > self.capacity:
+            self.rejected += 1
+            raise QuotaExceededError(f"Texten ({chars} tecken) överskrider kvoten per period")
+
+        deadline = time.monotonic() + self.max_wait_sec
+        while True:
+            lease = self.try_acquire(chars)
+            if lease is not None:
+                return lease
+
+            remaining = deadline - time.monotonic()
+            hint, release_may_help = self._wait_hint(chars)
+            if remaining <= 0 or (not release_may_help and (hint is None or hint > remaining)):
+                # Ingen nyckel hinner få utrymme inom väntetiden → avvisa direkt
+                self.rejected += 1
+                logger.warning("Quota exhausted for %d chars, rejecting request", chars)
+                raise QuotaExceededError("TTS-kvoten är slut, försök igen senare")
+
+            timeout = min(remaining, hint) if hint is not None else remaining
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.add(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._waiters.discard(waiter)
+
+    @asynccontextmanager
+    async def lease(self, chars: int):
+        lease = await self.acquire(chars)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+    def _charge(self, state: _KeyState, chars: int):
+        self._refill(state, time.monotonic())
+        if self.capacity:
+            state.tokens -= chars
+        state.chars_used += chars
+
+    def _release(self, state: _KeyState):
+        state.open_streams = max(0, state.open_streams - 1)
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def snapshot(self) -> dict:
+        """Returnerar kvarvarande budget per nyckel."""
+        now = time.monotonic()
+        keys = []
+        for state in self._keys:
+            self._refill(state, now)
+            keys.append({
+                "key": _mask(state.api_key),
+                "chars_remaining": round(state.tokens) if self.capacity else None,
+                "open_streams": state.open_streams,
+                "streams_remaining": (
+                    self.max_streams_per_key - state.open_streams if self.max_streams_per_key else None
+                ),
+                "chars_used": state.chars_used,
+            })
+        return {
+            "chars_per_period": int(self.capacity),
+            "period_sec": self.period_sec,
+            "max_streams_per_key": self.max_streams_per_key,
+            "rejected": self.rejected,
+            "keys": keys,
+        }
+
+
+def _configured_keys() -> List[str]:
+    keys = [k.strip() for k in settings.ELEVENLABS_API_KEYS.split(",") if k.strip()]
+    return keys or [settings.ELEVENLABS_API_KEY]
+
+
+quota_manager = QuotaManager(
+    _configured_keys(),
+    chars_per_period=settings.QUOTA_CHARS_PER_PERIOD,
+    period_sec=settings.QUOTA_PERIOD_SEC,
+    max_streams_per_key=settings.QUOTA_MAX_STREAMS_PER_KEY,
+    max_wait_sec=settings.QUOTA_MAX_WAIT_SEC,
+)
@@ -2,6 +2,11 @@
 import json
 from typing import Optional
 
+from ..config import settings
+from .scheduler import PRIORITY_CLASSES
+from .voice_profiles import voice_profiles, DEFAULT_PROFILE
+from .tracing import parse_trace_context
+
 # Text-validering inställningar
 MAX_TEXT_CHARS = 1000  # Max antal tecken för text-input
 
@@ -34,7 +39,28 @@ async def receive_and_validate_text(ws):
         await ws.close(code=1009)
         return
 
-    return {"text": text}
+    priority = data.get("priority") or settings.TTS_DEFAULT_PRIORITY
+    if not isinstance(priority, str) or priority not in PRIORITY_CLASSES:
+        await _send_error_json(ws, f"Ogiltig prioritet (tillåtna: {', '.join(PRIORITY_CLASSES)})")
+        await ws.close(code=1003)
+        return
+
+    profile = data.get("voice") or DEFAULT_PROFILE
+    # Listor och objekt är inte hashbara och skulle annars krascha uppslagningen
+    if not isinstance(profile, str) or profile not in voice_profiles:
+        await _send_error_json(ws, f"Okänd röstprofil: {profile}")
+        await ws.close(code=1003)
+        return
+
+    trace_id, parent_span_id = parse_trace_context(data)
+
+    return {
+        "text": text,
+        "priority": priority,
+        "voice": profile,
+        "trace_id": trace_id,
+        "parent_span_id": parent_span_id,
+    }
 
 
 
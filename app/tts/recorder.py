@@ -0,0 +1,190 @@
+import asyncio
+import base64
+import gzip
+import logging
+import os
+import random
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+import orjson
+
+from ..config import settings
+
+logger = logging.getLogger("stefan-api-test-3")
+
+FORMAT_VERSION = 1
+SUFFIX = ".jsonl.gz"
+
+
+class UpstreamRecording:
+    """Ramar från en uppströmsanslutning med ankomsttid, relativt när flush skickades.
+
+    Filen är gzip-komprimerade JSON-rader: först ett huvud med metadata, sedan en rad
+    per ram, `[t, ram]` för textramar och `[t, base64, 1]` för binära ramar.
+    """
+
+    def __init__(self, recorder, meta: dict):
+        self.recorder = recorder
+        self.meta = meta
+        self.frames: List[list] = []
+        self.bytes = 0
+        self.truncated = False
+        self.connected_at = time.perf_counter()
+        self.flushed_at: Optional[float] = None
+
+    def mark_flushed(self):
+        self.flushed_at = time.perf_counter()
+
+    def frame(self, server_msg):
+        if self.truncated:
+            return
+        t = round(time.perf_counter() - (self.flushed_at or self.connected_at), 4)
+        if isinstance(server_msg, (bytes, bytearray)):
+            entry = [t, base64.b64encode(server_msg).decode(), 1]
+        else:
+            entry = [t, server_msg]
+        self.bytes += len(entry[1])
+        if self.bytes > self.recorder.max_bytes:
+            self.truncated = True  # Hellre en avkortad inspelning än obegränsat minne
+            return
+        self.frames.append(entry)
+
+    def finish(self, outcome: Optional[str]):
+        self.meta.update(outcome=outcome or "cancelled", frames=len(self.frames), truncated=self.truncated)
+        self.recorder._write_behind(self)
+
+
+class _NoopRecording:
+    def mark_flushed(self):
+        pass
+
+    def frame(self, server_msg):
+        pass
+
+    def finish(self, outcome):
+        pass
+
+
+NOOP_RECORDING = _NoopRecording()
+
+
+class UpstreamRecorder:
+    """Spelar in uppströmssessioner till `directory` (tom = av) för en andel `sample_rate` av anslutningarna.
+
+    Ramarna samlas i minnet och filen skrivs i en tråd när anslutningen stängs,
+    så strömmen aldrig väntar på disk.
+    """
+
+    def __init__(self, directory: str, sample_rate: float = 1.0, max_bytes: int = 20_000_000):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.recorded = 0
+        self.written = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self._pending = set()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.sample_rate > 0
+
+    def start(self, profile, attempt, text: str, connect_sec: float):
+        """Ny inspelning för en uppkopplad ström, eller NOOP_RECORDING om den inte samplas."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return NOOP_RECORDING
+        self.recorded += 1
+        return UpstreamRecording(self, {
+            "version": FORMAT_VERSION,
+            "recorded_at": round(time.time(), 3),
+            "voice_id": profile.voice_id,
+            "model_id": attempt.model_id,
+            "output_format": profile.output_format,
+            "schedule": attempt.schedule,
+            "hedge": attempt.hedge,
+            "text": text,
+            "connect_sec": round(connect_sec, 4),
+        })
+
+    def _path(self, meta: dict) -> str:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(meta["recorded_at"]))
+        return os.path.join(self.directory, f"{stamp}-{meta['voice_id']}-{uuid.uuid4().hex[:8]}{SUFFIX}")
+
+    def _write(self, path: str, recording: UpstreamRecording) -> int:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        lines = [orjson.dumps(recording.meta)] + [orjson.dumps(entry) for entry in recording.frames]
+        data = gzip.compress(b"\n".join(lines) + b"\n", compresslevel=5)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)  # Läsare ser aldrig en halvskriven fil
+        return len(data)
+
+    def _done(self, path: str, future):
+        self._pending.discard(future)
+        try:
+            self.bytes_written += future.result()
+            self.written += 1
+            logger.debug("Upstream session recorded to %s", path)
+        except Exception as e:
+            self.failed += 1
+            logger.warning("Failed to write upstream recording %s: %s", path, e)
+
+    def _write_behind(self, recording: UpstreamRecording):
+        path = self._path(recording.meta)
+        try:
+            future = asyncio.get_running_loop().run_in_executor(None, self._write, path, recording)
+        except RuntimeError:
+            # Ingen loop (t.ex. vid nedstängning): skriv direkt
+            try:
+                self.bytes_written += self._write(path, recording)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning("Failed to write upstream recording %s: %s", path, e)
+            return
+        self._pending.add(future)
+        future.add_done_callback(lambda f: self._done(path, f))
+
+    async def drain(self):
+        """Väntar tills alla påbörjade skrivningar är klara (tester, nedstängning)."""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "sample_rate": self.sample_rate,
+            "recorded": self.recorded,
+            "written": self.written,
+            "failed": self.failed,
+            "pending": len(self._pending),
+            "bytes_written": self.bytes_written,
+        }
+
+
+def load_recording(path: str) -> Tuple[dict, List[Tuple[float, object]]]:
+    """Läser en inspelning: (metadata, [(sekunder efter flush, ram)]) med binära ramar som bytes."""
+    with gzip.open(path, "rb") as f:
+        lines = f.read().splitlines()
+    meta = orjson.loads(lines[0])
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Okänd inspelningsversion: {meta.get('version')}")
+    frames = []
+    for line in lines[1:]:
+        entry = orjson.loads(line)
+        frames.append((entry[0], base64.b64decode(entry[1]) if len(entry) > 2 else entry[1]))
+    return meta, frames
+
+
+def list_recordings(directory: str) -> List[str]:
+    """Inspelningar i katalogen, äldst först."""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(SUFFIX)
+    )
+
+
+recorder = UpstreamRecorder(settings.TTS_RECORD_DIR, settings.TTS_RECORD_SAMPLE_RATE, settings.TTS_RECORD_MAX_BYTES)
@@ -0,0 +1,78 @@
+import re
+import logging
+
+from ..config import settings
+
+logger = logging.getLogger("stefan-api-test-3")
+
+# Meningsslut: skiljetecken följt av blanksteg
+_SENTENCE_END = re.compile(r"[.!?…]+[\"”')\]]*\s+")
+
+
+def sentence_starts(text: str):
+    """Returnerar startoffset för varje mening i texten."""
+    return [0] + [m.end() for m in _SENTENCE_END.finditer(text) if m.end() < len(text)]
+
+
+def resume_offset(text: str, voiced_chars: int) -> int:
+    """Offset där syntesen ska återupptas: början av första mening som inte är helt uppläst.
+
+    En mening som bara hunnit läsas upp delvis läses om från början, så att
+    ljudet skarvas vid en naturlig paus i stället för mitt i ett ord. Ljudet för den
+    redan upplästa delen av meningen hoppas över av anroparen.
+    """
+    if voiced_chars >= len(text.rstrip()):
+        return len(text)
+    offset = 0
+    for start in sentence_starts(text):
+        if start > voiced_chars:
+            break
+        offset = start
+    return offset
+
+
+def alignment_chars(payload: dict) -> int:
+    """Antal tecken som en ElevenLabs-ram har levererat ljud för."""
+    alignment = payload.get("alignment") or payload.get("normalizedAlignment")
+    if not alignment:
+        return 0
+    chars = alignment.get("chars")
+    return len(chars) if chars else 0
+
+
+class RecoveryStats:
+    """Statistik över återupptagna strömmar efter avbrott mitt i en text."""
+
+    def __init__(self, max_resumes: int):
+        self.max_resumes = max_resumes
+        self.reset()
+
+    def reset(self):
+        self.resumes = 0
+        self.sessions_recovered = 0
+        self.sessions_failed = 0
+        self.skipped_chars = 0  # Tecken vars ljud klienten redan hade fått före avbrottet
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_count = 0
+
+    def observe_latency(self, seconds: float):
+        """Tid från avbrott till första ljud i den återupptagna strömmen."""
+        self.latency_count += 1
+        self.latency_total += seconds
+        if seconds > self.latency_max:
+            self.latency_max = seconds
+
+    def snapshot(self) -> dict:
+        return {
+            "max_resumes": self.max_resumes,
+            "resumes": self.resumes,
+            "sessions_recovered": self.sessions_recovered,
+            "sessions_failed": self.sessions_failed,
+            "skipped_chars": self.skipped_chars,
+            "latency_avg_sec": round(self.latency_total / self.latency_count, 4) if self.latency_count else 0.0,
+            "latency_max_sec": round(self.latency_max, 4),
+        }
+
+
+recovery_stats = RecoveryStats(settings.TTS_MAX_RESUMES)
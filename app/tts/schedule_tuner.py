@@ -0,0 +1,119 @@
+import logging
+import random
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger("stefan-api-test-3")
+
+# Kandidater: namn → (chunk_length_schedule, try_trigger_generation)
+SCHEDULE_CANDIDATES: Dict[str, Tuple[List[int], bool]] = {
+    "fast": ([50, 90, 140], True),  # Tidigare hårdkodat värde
+    "fast-no-trigger": ([50, 90, 140], False),
+    "eager": ([50, 60, 80, 120], True),
+    "balanced": ([80, 120, 200, 260], True),
+    "provider-default": ([120, 160, 250, 290], False),
+}
+DEFAULT_SCHEDULE = "fast"
+
+# Textlängdsgrupper (övre gräns i tecken)
+LENGTH_BUCKETS = (("short", 80), ("medium", 300), ("long", None))
+
+
+def length_bucket(text_length: int) -> str:
+    for name, upper in LENGTH_BUCKETS:
+        if upper is None or text_length <= upper:
+            return name
+    return LENGTH_BUCKETS[-1][0]
+
+
+class _ArmStats:
+    """Exponentiellt viktade medelvärden för ett schema i en längdgrupp."""
+
+    __slots__ = ("n", "ttfb", "gap")
+
+    def __init__(self):
+        self.n = 0
+        self.ttfb = 0.0
+        self.gap = 0.0
+
+    def update(self, ttfb: float, gap: float, alpha: float):
+        if self.n == 0:
+            self.ttfb, self.gap = ttfb, gap
+        else:
+            self.ttfb += alpha * (ttfb - self.ttfb)
+            self.gap += alpha * (gap - self.gap)
+        self.n += 1
+
+    @property
+    def score(self) -> float:
+        # Lägre är bättre: tid till första ljud plus typiskt glapp mellan chunkar
+        return self.ttfb + self.gap
+
+
+class ScheduleTuner:
+    """Väljer chunk_length_schedule per textlängd utifrån uppmätt latens.
+
+    Epsilon-greedy: oftast väljs schemat med lägst poäng (TTFB + glapp mellan
+    chunkar) i textens längdgrupp, men med sannolikhet `explore_rate` prövas ett
+    annat så att mätningarna hålls färska. Scheman utan mätningar prövas först.
+    """
+
+    def __init__(self, enabled: bool, explore_rate: float, alpha: float = 0.2, seed: Optional[int] = None):
+        self.enabled = enabled
+        self.explore_rate = explore_rate
+        self.alpha = alpha
+        self._random = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        self._stats = {
+            bucket: {name: _ArmStats() for name in SCHEDULE_CANDIDATES}
+            for bucket, _ in LENGTH_BUCKETS
+        }
+
+    def select(self, text_length: int) -> str:
+        """Väljer schema för en text med given längd."""
+        if not self.enabled:
+            return DEFAULT_SCHEDULE
+        arms = self._stats[length_bucket(text_length)]
+        untried = [name for name, stats in arms.items() if stats.n == 0]
+        if untried:
+            return untried[0]
+        if self._random.random() < self.explore_rate:
+            return self._random.choice(list(arms))
+        return min(arms, key=lambda name: arms[name].score)
+
+    def observe(self, text_length: int, schedule: str, ttfb: float, mean_gap: float):
+        """Registrerar uppmätt TTFB och medelglapp mellan chunkar för ett schema."""
+        arms = self._stats[length_bucket(text_length)]
+        if schedule in arms:
+            arms[schedule].update(ttfb, mean_gap, self.alpha)
+
+    def snapshot(self) -> dict:
+        buckets = {}
+        for bucket, arms in self._stats.items():
+            tried = {name: stats for name, stats in arms.items() if stats.n}
+            buckets[bucket] = {
+                "best": min(tried, key=lambda name: tried[name].score) if tried else None,
+                "schedules": {
+                    name: {
+                        "samples": stats.n,
+                        "ttfb_sec": round(stats.ttfb, 4),
+                        "inter_chunk_sec": round(stats.gap, 4),
+                    }
+                    for name, stats in tried.items()
+                },
+            }
+        return {
+            "enabled": self.enabled,
+            "explore_rate": self.explore_rate,
+            "candidates": {
+                name: {"chunk_length_schedule": schedule, "try_trigger_generation": trigger}
+                for name, (schedule, trigger) in SCHEDULE_CANDIDATES.items()
+            },
+            "buckets": buckets,
+        }
+
+
+schedule_tuner = ScheduleTuner(settings.TTS_SCHEDULE_TUNER_ENABLED, settings.TTS_SCHEDULE_EXPLORE_RATE)
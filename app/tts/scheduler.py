@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from ..config import settings
+
+logger = logging.getLogger("stefan-api-test-3")
+
+# Prioritetsklasser i fallande prioritet
+PRIORITY_CLASSES = ("interactive", "standard", "bulk")
+
+
+class _ClassStats:
+    """Kötidsstatistik för en prioritetsklass."""
+
+    __slots__ = ("granted", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.granted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait_sec: float):
+        self.granted += 1
+        self.wait_total += wait_sec
+        if wait_sec > self.wait_max:
+            self.wait_max = wait_sec
+
+
+class PriorityScheduler:
+    """Delar ut uppströmsplatser till ElevenLabs efter prioritetsklass.
+
+    Interaktiva förfrågningar går alltid före köad standard- och bulk-trafik,
+    men så länge bulk-jobb väntar får de minst `bulk_min_share` av tilldelningarna
+    så att de aldrig svälts helt.
+    """
+
+    def __init__(self, max_slots: int, bulk_min_share: float):
+        self.max_slots = max(1, max_slots)
+        self.bulk_min_share = bulk_min_share
+        # Var N:te tilldelning går till bulk om bulk väntar
+        self._bulk_every = math.ceil(1 / bulk_min_share) if bulk_min_share > 0 else 0
+        self._in_use = 0
+        self._grants_since_bulk = 0
+        self._queues = {cls: deque() for cls in PRIORITY_CLASSES}
+        self._stats = {cls: _ClassStats() for cls in PRIORITY_CLASSES}
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _next_class(self):
+        """Väljer vilken klass som får nästa lediga plats."""
+        bulk_waiting = bool(self._queues["bulk"])
+        if bulk_waiting and self._bulk_every and self._grants_since_bulk >= self._bulk_every - 1:
+            return "bulk"
+        for cls in PRIORITY_CLASSES:
+            if self._queues[cls]:
+                return cls
+        return None
+
+    def _grant(self, cls: str, enqueued_at: float):
+        self._in_use += 1
+        self._stats[cls].record(time.perf_counter() - enqueued_at)
+        if cls == "bulk" or not self._queues["bulk"]:
+            self._grants_since_bulk = 0
+        else:
+            self._grants_since_bulk += 1
+
+    def _dispatch(self):
+        while self._in_use < self.max_slots:
+            cls = self._next_class()
+            if cls is None:
+                return
+            fut, enqueued_at = self._queues[cls].popleft()
+            if fut.done():
+                continue  # Avbruten medan den stod i kö
+            self._grant(cls, enqueued_at)
+            fut.set_result(None)
+
+    async def acquire(self, priority: str):
+        """Väntar tills en uppströmsplats är ledig för given prioritet."""
+        if priority not in self._queues:
+            raise ValueError(f"Okänd prioritet: {priority}")
+
+        enqueued_at = time.perf_counter()
+        if self._in_use < self.max_slots and not self._queued():
+            self._grant(priority, enqueued_at)
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        entry = (fut, enqueued_at)
+        self._queues[priority].append(entry)
+        logger.debug("Queued %s request (queued=%d, in_use=%d)", priority, self._queued(), self._in_use)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Platsen hann delas ut innan vi avbröts → lämna tillbaka den
+                self.release()
+            else:
+                try:
+                    self._queues[priority].remove(entry)
+                except ValueError:
+                    pass
+            raise
+
+    def try_slot(self, priority: str) -> bool:
+        """Tar en plats direkt om en är ledig och ingen står i kö, annars False (väntar aldrig)."""
+        if priority not in self._queues:
+            raise ValueError(f"Okänd prioritet: {priority}")
+        if self._in_use < self.max_slots and not self._queued():
+            self._grant(priority, time.perf_counter())
+            return True
+        return False
+
+    def release(self):
+        """Lämnar tillbaka en plats och släpper fram nästa i kön."""
+        self._in_use = max(0, self._in_use - 1)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> dict:
+        """Returnerar köstatistik per prioritetsklass."""
+        classes = {}
+        for cls in PRIORITY_CLASSES:
+            stats = self._stats[cls]
+            classes[cls] = {
+                "queued": len(self._queues[cls]),
+                "granted": stats.granted,
+                "wait_avg_sec": round(stats.wait_total / stats.granted, 6) if stats.granted else 0.0,
+                "wait_max_sec": round(stats.wait_max, 6),
+                "wait_total_sec": round(stats.wait_total, 6),
+            }
+        return {
+            "max_slots": self.max_slots,
+            "slots_in_use": self._in_use,
+            "bulk_min_share": self.bulk_min_share,
+            "classes": classes,
+        }
+
+
+scheduler = PriorityScheduler(settings.TTS_MAX_UPSTREAM_SLOTS, settings.TTS_BULK_MIN_SHARE)
@@ -3,8 +3,21 @@ import json
 import logging
 import time
 
+from ..config import settings
+from ..logging_config import LogSampler
+from .metrics import INTER_CHUNK_GAP_SECONDS, ERRORS
+from .audio_sink import NOOP_SESSION_AUDIO
+
 logger = logging.getLogger("stefan-api-test-3")
 
+# Loggrader per ram/chunk samplas så att DEBUG inte kostar I/O för varje ram
+_frame_log = LogSampler(settings.LOG_CHUNK_SAMPLE_EVERY)
+_chunk_log = LogSampler(settings.LOG_CHUNK_SAMPLE_EVERY)
+
+
+def _should_log(sampler: LogSampler) -> bool:
+    return logger.isEnabledFor(logging.DEBUG) and sampler.sample()
+
 async def _send_debug_json(ws, obj: dict):
     """Skicka JSON (utf-8) till frontend för debug-meddelanden."""
     try:
@@ -12,8 +25,8 @@ async def _send_debug_json(ws, obj: dict):
     except Exception as e:
         logger.error("Failed to send debug JSON: %s", e)
 
-async def send_audio_to_frontend(ws, server_msg, audio_bytes_total, last_chunk_ts):
-    """Hanterar audio-streaming till frontend."""
+async def send_audio_to_frontend(ws, server_msg, audio_bytes_total, last_chunk_ts, sink=NOOP_SESSION_AUDIO):
+    """Hanterar audio-streaming till frontend; `sink` får en kopia av varje chunk (för QA-inspelning)."""
     
     # ElevenLabs skickar (vanligen) JSON‐text
     try:
@@ -22,9 +35,14 @@ async def send_audio_to_frontend(ws, server_msg, audio_bytes_total, last_chunk_t
         # Om binärt (ovanligt), skicka vidare
         if isinstance(server_msg, (bytes, bytearray)):
             await ws.send_bytes(server_msg)
+            sink.write(server_msg)
             audio_bytes_total += len(server_msg)
-            last_chunk_ts = time.time()
-            logger.debug("Forwarded binary frame: %d bytes", len(server_msg))
+            now = time.perf_counter()
+            if last_chunk_ts is not None:
+                INTER_CHUNK_GAP_SECONDS.observe(now - last_chunk_ts)
+            last_chunk_ts = now
+            if _should_log(_chunk_log):
+                logger.debug("Forwarded binary frame: %d bytes (1 of %d)", len(server_msg), _chunk_log.every)
         else:
             logger.debug("Non-JSON non-bytes frame received (ignored)")
         return audio_bytes_total, last_chunk_ts, False
@@ -32,12 +50,14 @@ async def send_audio_to_frontend(ws, server_msg, audio_bytes_total, last_chunk_t
     # Debug: skicka upp event/meta till frontend (utan base64-datan)
     meta = {k: v for k, v in payload.items() if k not in ("audio", "normalizedAlignment", "alignment")}
     await _send_debug_json(ws, {"type": "debug", "provider": "elevenlabs", "payload": meta})
-    logger.debug("ElevenLabs frame keys=%s", list(payload.keys()))
+    if _should_log(_frame_log):
+        logger.debug("ElevenLabs frame keys=%s (1 of %d)", list(payload.keys()), _frame_log.every)
 
     # Fel från ElevenLabs?
     if payload.get("event") == "error" or "error" in payload:
         err_msg = payload.get("message") or payload.get("error") or "Okänt fel från TTS-leverantören"
         logger.error("ElevenLabs error: %s", err_msg)
+        ERRORS.labels_inc("provider_error")
         await _send_debug_json(ws, {"type": "error", "message": err_msg})
         return audio_bytes_total, last_chunk_ts, True  # Signal to break
 
@@ -48,9 +68,16 @@ async def send_audio_to_frontend(ws, server_msg, audio_bytes_total, last_chunk_t
             b = base64.b64decode(audio_b64)
             if b:
                 await ws.send_bytes(b)
+                sink.write(b)
                 audio_bytes_total += len(b)
-                last_chunk_ts = time.time()
-                logger.debug("Forwarded audio chunk: %d bytes (total=%d)", len(b), audio_bytes_total)
+                now = time.perf_counter()
+                if last_chunk_ts is not None:
+                    INTER_CHUNK_GAP_SECONDS.observe(now - last_chunk_ts)
+                last_chunk_ts = now
+                if _should_log(_chunk_log):
+                    logger.debug(
+                        "Forwarded audio chunk: %d bytes (total=%d, 1 of %d)", len(b), audio_bytes_total, _chunk_log.every
+                    )
         except Exception as e:
             logger.warning("Kunde inte dekoda audio-chunk: %s", e)
 
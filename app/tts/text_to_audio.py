@@ -1,114 +1,374 @@
 import asyncio
 import logging
 import time
-import os
 from websockets.client import connect as ws_connect
+from websockets.exceptions import ConnectionClosed
 import orjson
 
+from ..config import settings
+from .scheduler import scheduler
+from .quota import quota_manager, QuotaExceededError
+from .circuit_breaker import upstream_breaker, CLOSED
+from .hedging import hedge_policy, hedged_frames
+from .recovery import recovery_stats, resume_offset, alignment_chars
+from .model_selector import model_selector
+from .schedule_tuner import schedule_tuner, SCHEDULE_CANDIDATES
+from .voice_profiles import voice_profiles, DEFAULT_PROFILE
+from .metrics import UPSTREAM_CONNECT_SECONDS, UPSTREAM_CONNECTIONS, ERRORS
+from .timings import SessionTimings
+from .tracing import NOOP_TRACE, KIND_CLIENT
+from .recorder import NOOP_RECORDING, recorder
+
 logger = logging.getLogger("stefan-api-test-3")
 
-# TTS-specifika inställningar
-DEFAULT_VOICE_ID = "Vo4adEN1y46b0ufuysRe"  # Sätt ditt voice-ID här
-DEFAULT_MODEL_ID = "eleven_flash_v2_5"
-ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY", "")  # Hämtas från .env
+# TTS-specifika inställningar (röst, format och init-meddelanden finns i voice_profiles)
+DEFAULT_MODEL_ID = model_selector.primary  # Första modellen i TTS_MODEL_CANDIDATES
 
+# Flush-meddelandet är alltid detsamma
+_FLUSH_MSG = orjson.dumps({"text": "", "flush": True}).decode()
 
-async def process_text_to_audio(ws, text, started_at):
-    """Hanterar ElevenLabs API-kommunikation och returnerar rå data."""
-    
-    # 2) Anslut till ElevenLabs
-    query = f"?model_id={DEFAULT_MODEL_ID}&output_format=pcm_16000"
-    eleven_ws_url = f"wss://api.elevenlabs.io/v1/text-to-speech/{DEFAULT_VOICE_ID}/stream-input{query}"
-    headers = [("xi-api-key", ELEVENLABS_API_KEY)]
+
+class _UpstreamAttempt:
+    """En uppströmsström mot ElevenLabs (primär eller hedge)."""
+
+    __slots__ = ("lease", "model_id", "schedule", "hedge", "outcome", "started_at", "connected")
+
+    def __init__(self, lease, model_id, schedule, hedge=False):
+        self.lease = lease
+        self.model_id = model_id
+        self.schedule = schedule  # Namn i SCHEDULE_CANDIDATES
+        self.hedge = hedge
+        self.outcome = None  # Utfall för circuit breakern: "ok", "error", "timeout" eller None
+        self.started_at = time.perf_counter()
+        self.connected = False
+
+
+async def _upstream_frames(ws, profile, text, attempt, timings, trace):
+    """Ansluter till ElevenLabs, skickar init och text och lämnar ut (server_msg, is_audio, voiced_chars)."""
+    inactivity_timeout_sec = settings.UPSTREAM_INACTIVITY_TIMEOUT_SEC  # intern timeout efter att vi sagt "streaming"
+    lease = attempt.lease
+    try_trigger = SCHEDULE_CANDIDATES[attempt.schedule][1]
+    first_audio = True
+    ttfb = 0.0
+    last_audio_at = None
+    gap_total = 0.0
+    gap_count = 0
+    stream_span = batch_span = None
+    batch_frames = batch_audio = 0
+    recording = NOOP_RECORDING
+    is_final = False
+
+    try:
+        connect_started = time.perf_counter()
+        connect_span = trace.start_span(
+            "upstream.connect", kind=KIND_CLIENT, start=connect_started,
+            model_id=attempt.model_id, schedule=attempt.schedule, hedge=attempt.hedge,
+        )
+        async with ws_connect(
+            profile.url(attempt.model_id), extra_headers=lease.headers,
+            open_timeout=settings.UPSTREAM_OPEN_TIMEOUT_SEC, close_timeout=settings.UPSTREAM_CLOSE_TIMEOUT_SEC,
+        ) as eleven:
+            attempt.connected = True
+            timings.mark("upstream_connected")
+            UPSTREAM_CONNECT_SECONDS.observe(time.perf_counter() - connect_started)
+            recording = recorder.start(profile, attempt, text, time.perf_counter() - connect_started)
+            UPSTREAM_CONNECTIONS.inc()
+            connect_span.end()
+            stream_span = trace.start_span("upstream.stream", hedge=attempt.hedge, text_chars=len(text))
+            # 3) Initiera session med förserialiserat init-meddelande för profil och schema
+            await eleven.send(profile.init_message(attempt.schedule))
+            timings.mark("init_sent")
+            logger.debug("Sent init message to ElevenLabs (hedge=%s)", attempt.hedge)
+
+            # Skicka init-meddelandet till frontend för debugging (bara för primär ström)
+            if not attempt.hedge:
+                try:
+                    await ws.send_text(profile.debug_init_message(attempt.schedule))
+                except Exception as e:
+                    logger.warning("Failed to send init debug info to frontend: %s", e)
+
+            # 4) Skicka text och trigga generering direkt
+            await eleven.send(orjson.dumps({"text": text, "try_trigger_generation": try_trigger}).decode())
+            logger.debug("Sent user text (%d chars) with try_trigger_generation=%s", len(text), try_trigger)
+
+            # 5) Avsluta inmatning (förhindra deras 20s-timeout)
+            await eleven.send(_FLUSH_MSG)
+            recording.mark_flushed()
+            logger.debug("Sent flush message to ElevenLabs")
+
+            # 6) Läs streamen och returnera rå data
+            while True:
+                try:
+                    server_msg = await asyncio.wait_for(eleven.recv(), timeout=inactivity_timeout_sec)
+                except asyncio.TimeoutError:
+                    # Vi har inte fått något på N sekunder → ge upp snyggt
+                    logger.warning("No data from ElevenLabs for %ss, aborting stream", inactivity_timeout_sec)
+                    ERRORS.labels_inc("upstream_timeout")
+                    attempt.outcome = "timeout"
+                    if first_audio:
+                        # Inget ljud alls → räkna väntetiden som modellens TTFB
+                        model_selector.observe(attempt.model_id, profile.voice_id, time.perf_counter() - attempt.started_at)
+                    return
+                timings.mark("first_upstream_frame")
+                recording.frame(server_msg)
+
+                # Tolka ramen innan den lämnas ut: konsumenten kan avbryta direkt efter ett felmeddelande
+                is_final = False
+                is_audio = isinstance(server_msg, (bytes, bytearray))
+                voiced_chars = 0
+                if isinstance(server_msg, str):
+                    try:
+                        payload = orjson.loads(server_msg)
+                        is_final = payload.get("isFinal") is True or payload.get("event") == "finalOutput"
+                        is_audio = bool(payload.get("audio"))
+                        voiced_chars = alignment_chars(payload)
+                        err = payload.get("error") or (payload.get("event") == "error" and payload.get("message"))
+                        if err:
+                            if "quota" in str(err).lower():
+                                # Kvotfel från leverantören → markera nyckeln som tömd (inget avbrott)
+                                lease.mark_exhausted()
+                            else:
+                                attempt.outcome = "error"
+                    except Exception:
+                        pass
+
+                if is_audio:
+                    now = time.perf_counter()
+                    if first_audio:
+                        first_audio = False
+                        ttfb = now - attempt.started_at
+                        hedge_policy.observe_first_audio(ttfb)
+                        model_selector.observe(attempt.model_id, profile.voice_id, ttfb)
+                    else:
+                        gap_total += now - last_audio_at
+                        gap_count += 1
+                    last_audio_at = now
+
+                if is_final:
+                    timings.mark("final_frame")  # Före yield: konsumenten avbryter ofta vid final-ramen
+
+                if trace.sampled:
+                    # En span per batch av ramar i stället för per ram
+                    if batch_span is None:
+                        batch_span = trace.start_span("upstream.frames", parent=stream_span)
+                    batch_frames += 1
+                    batch_audio += is_audio
+                    if batch_frames >= trace.tracer.frame_batch or is_final:
+                        batch_span.set("frames", batch_frames)
+                        batch_span.set("audio_frames", batch_audio)
+                        batch_span.end()
+                        batch_span, batch_frames, batch_audio = None, 0, 0
+
+                # Returnera rå data från ElevenLabs
+                yield server_msg, is_audio, voiced_chars
+
+                # Slut?
+                if is_final:
+                    logger.debug("Final frame from ElevenLabs received")
+                    if attempt.outcome is None:
+                        attempt.outcome = "ok"
+                        if not first_audio:
+                            schedule_tuner.observe(
+                                len(text), attempt.schedule, ttfb, gap_total / gap_count if gap_count else 0.0
+                            )
+                    return
+    except QuotaExceededError:
+        raise  # Vårt eget avslag, inte ett fel hos leverantören
+    except asyncio.TimeoutError:
+        attempt.outcome = "timeout"  # open_timeout vid anslutning
+        ERRORS.labels_inc("upstream_timeout")
+        raise
+    except Exception:
+        attempt.outcome = "error"
+        ERRORS.labels_inc("upstream_dropped" if attempt.connected else "upstream_connect")
+        raise
+    finally:
+        if attempt.connected:
+            UPSTREAM_CONNECTIONS.dec()
+        # Konsumenten avbryter ofta vid final-ramen, innan utfallet hunnit sättas
+        recording.finish(attempt.outcome or ("ok" if is_final else None))
+        if trace.sampled:
+            connect_span.end(error=attempt.outcome if not attempt.connected else None)
+            if batch_span is not None:
+                batch_span.set("frames", batch_frames)
+                batch_span.set("audio_frames", batch_audio)
+                batch_span.end()
+            if stream_span is not None:
+                stream_span.set("outcome", attempt.outcome or "cancelled")
+                stream_span.end(error=attempt.outcome if attempt.outcome in ("error", "timeout") else None)
+
+
+async def process_text_to_audio(
+    ws, text, started_at, priority="standard", schedule=None, profile=DEFAULT_PROFILE, timings=None, trace=NOOP_TRACE
+):
+    """Hanterar ElevenLabs API-kommunikation och returnerar rå data.
+
+    `started_at` är en time.perf_counter()-tidpunkt. `profile` väljer röstprofil
+    (se voice_profiles). `schedule` tvingar ett namngivet chunk_length_schedule
+    (används av experimentverktyget), annars väljer profilen eller schedule_tuner.
+    `timings` (SessionTimings) får tidsstämplar för uppströmsstegen och `trace`
+    spans för kö, anslutning och ramar.
+    """
+    voice_profile = voice_profiles[profile]
+    timings = timings if timings is not None else SessionTimings()
+
+    # 2) Anslut till ElevenLabs med profilens modell eller den som just nu håller TTFB-SLO:n
+    model_id = voice_profile.model_id or model_selector.select(voice_profile.voice_id)
+    schedule = schedule or voice_profile.schedule or schedule_tuner.select(len(text))
     
     # Logga API-detaljer i terminalen
-    logger.info("Connecting to ElevenLabs with voice_id=%s, model_id=%s", DEFAULT_VOICE_ID, DEFAULT_MODEL_ID)
+    logger.info(
+        "Connecting to ElevenLabs with profile=%s, voice_id=%s, model_id=%s",
+        profile, voice_profile.voice_id, model_id,
+    )
     
     # Skicka API-detaljer till frontend för debugging
-    import json
     try:
-        await ws.send_text(json.dumps({
-            "type": "debug", 
-            "provider": "elevenlabs", 
-            "api_details": {
-                "voice_id": DEFAULT_VOICE_ID,
-                "model_id": DEFAULT_MODEL_ID,
-                "url": eleven_ws_url,
-                "has_api_key": bool(ELEVENLABS_API_KEY)
-            }
-        }))
+        await ws.send_text(voice_profile.debug_api_details(model_id))
     except Exception as e:
         logger.warning("Failed to send debug info to frontend: %s", e)
 
     audio_bytes_total = 0
-    inactivity_timeout_sec = 12  # intern timeout efter att vi sagt "streaming"
-
-    async with ws_connect(eleven_ws_url, extra_headers=headers, open_timeout=30) as eleven:
-        # 3) Initiera session
-        init_msg = {
-            "text": " ",  # kickstart
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.8,
-                "use_speaker_boost": False,
-                "speed": 1.0,
-            },
-            "generation_config": {
-                # Lägre trösklar → snabbare start på kort text
-                "chunk_length_schedule": [50, 90, 140]
-            },
-            "xi_api_key": ELEVENLABS_API_KEY,
-        }
-        await eleven.send(orjson.dumps(init_msg).decode())
-        logger.debug("Sent init message to ElevenLabs")
-        
-        # Skicka init-meddelandet till frontend för debugging
-        try:
-            await ws.send_text(json.dumps({
-                "type": "debug",
-                "provider": "elevenlabs", 
-                "init_message": {
-                    "text": init_msg["text"],
-                    "voice_settings": init_msg["voice_settings"],
-                    "generation_config": init_msg["generation_config"],
-                    "has_api_key": bool(init_msg["xi_api_key"])
-                }
-            }))
-        except Exception as e:
-            logger.warning("Failed to send init debug info to frontend: %s", e)
-
-        # 4) Skicka text och trigga generering direkt
-        await eleven.send(orjson.dumps({"text": text, "try_trigger_generation": True}).decode())
-        logger.debug("Sent user text (%d chars) with try_trigger_generation=True", len(text))
-
-        # 5) Avsluta inmatning (förhindra deras 20s-timeout)
-        await eleven.send(orjson.dumps({"text": "", "flush": True}).decode())
-        logger.debug("Sent flush message to ElevenLabs")
-
-        # 6) Läs streamen och returnera rå data
-        while True:
-            try:
-                server_msg = await asyncio.wait_for(eleven.recv(), timeout=inactivity_timeout_sec)
-            except asyncio.TimeoutError:
-                # Vi har inte fått något på N sekunder → ge upp snyggt
-                logger.warning("No data from ElevenLabs for %ss, aborting stream", inactivity_timeout_sec)
-                break
-
-            # Returnera rå data från ElevenLabs
-            yield server_msg, audio_bytes_total
-
-            # Uppdatera audio_bytes_total för binary frames
-            if isinstance(server_msg, (bytes, bytearray)):
-                audio_bytes_total += len(server_msg)
-
-            # Slut?
-            if isinstance(server_msg, str):
+
+    # Avvisa direkt om brytaren är öppen i stället för att vänta på timeouts
+    breaker_generation = upstream_breaker.before_call()
+    primary = None
+    hedges = []
+    resumes = []
+    released_slots = 0  # Uppströmsplatser som lämnats tillbaka i förtid för förlorande försök
+
+    def _start_hedge():
+        # Hedga bara när leverantören bedöms frisk och det finns både en ledig
+        # uppströmsplats och kvot för en extra ström; hedgen väntar aldrig i kö
+        if upstream_breaker.state != CLOSED:
+            return None
+        if not scheduler.try_slot(priority):
+            return None
+        lease = quota_manager.try_acquire(len(text))
+        if lease is None:
+            scheduler.release()
+            return None
+        hedge = _UpstreamAttempt(lease, model_id, schedule, hedge=True)
+        hedges.append(hedge)
+        return hedge
+
+    queue_span = trace.start_span("queue", priority=priority)
+    try:
+        # Vänta på en ledig uppströmsplats enligt prioritetsklass och på kvot för nyckeln
+        async with scheduler.slot(priority), quota_manager.lease(len(text)) as lease:
+            queue_span.end()
+            primary = current = _UpstreamAttempt(lease, model_id, schedule)
+
+            def _on_winner(attempt):
+                nonlocal current
+                current = attempt
+
+            def _on_loser(attempt):
+                # Förloraren avbryts nu; lämna tillbaka dess plats och kvotström direkt i stället
+                # för vid sessionens slut, annars håller varje hedgad session två platser.
+                # Lånet får släppas flera gånger, platserna räknas i released_slots.
+                nonlocal released_slots
+                attempt.lease.release()
+                scheduler.release()
+                released_slots += 1
+
+            if hedge_policy.enabled:
+                hedge_policy.sessions += 1
+                frames = hedged_frames(
+                    hedge_policy,
+                    primary,
+                    lambda attempt: _upstream_frames(ws, voice_profile, text, attempt, timings, trace),
+                    _start_hedge,
+                    on_winner=_on_winner,
+                    on_loser=_on_loser,
+                )
+            else:
+                frames = _upstream_frames(ws, voice_profile, text, primary, timings, trace)
+
+            stream_text = text
+            base = 0  # Offset för aktuell ströms text i originaltexten
+            voiced = 0  # Tecken i aktuell ström som har fått ljud enligt alignment
+            skip = 0  # Tecken i början av aktuell ström som klienten redan har hört
+            failed_at = None
+            while True:
+                failure = None
+                try:
+                    async for server_msg, is_audio, voiced_chars in frames:
+                        voiced += voiced_chars
+                        if skip and is_audio:
+                            if voiced_chars and voiced <= skip:
+                                # Meningen läses om från början; hoppa över ljudet som redan skickats
+                                recovery_stats.skipped_chars += voiced_chars
+                                continue
+                            skip = 0  # Ramen som går över gränsen skickas hellre dubbelt än tappas
+                        if failed_at is not None and is_audio:
+                            recovery_stats.observe_latency(time.perf_counter() - failed_at)
+                            failed_at = None
+
+                        # Returnera rå data från ElevenLabs
+                        yield server_msg, audio_bytes_total
+
+                        # Uppdatera audio_bytes_total för binary frames
+                        if isinstance(server_msg, (bytes, bytearray)):
+                            audio_bytes_total += len(server_msg)
+                except (ConnectionClosed, OSError) as e:
+                    failure = e
+                finally:
+                    await frames.aclose()
+
+                if failure is None:
+                    # Även en inaktivitets-timeout avslutar strömmen direkt: anslutningen lever och
+                    # vi vet inte vad som är på väg, så ett återupptag riskerar att läsa upp samma text igen
+                    break
+                # Återuppta bara strömmar som kom igång och där alignment visar hur långt
+                # klienten har hört; annars skulle ett återupptag skicka samma ljud en gång till
+                if not current.connected or not voiced:
+                    if resumes:
+                        recovery_stats.sessions_failed += 1
+                    raise failure
+                offset = base + resume_offset(stream_text, voiced)
+                if offset >= len(text):
+                    break  # Allt var redan uppläst, bara final-ramen saknades
+                if len(resumes) >= recovery_stats.max_resumes:
+                    recovery_stats.sessions_failed += 1
+                    raise failure
+
+                logger.warning(
+                    "Upstream stream dropped after %d/%d chars (%s), resuming from offset %d",
+                    base + voiced, len(text), failure, offset,
+                )
+                failed_at = time.perf_counter()
+                recovery_stats.resumes += 1
+                lease = current.lease  # Hedgen kan ha vunnit; återuppta på vinnarens nyckel
+                current = _UpstreamAttempt(lease, model_id, schedule)
+                resumes.append(current)
+                skip = base + voiced - offset
+                stream_text, base, voiced = text[offset:], offset, 0
+                # Den omskickade texten kostar tecken hos leverantören precis som första gången
+                lease.charge(len(stream_text))
                 try:
-                    payload = orjson.loads(server_msg)
-                    if payload.get("isFinal") is True or payload.get("event") == "finalOutput":
-                        logger.debug("Final frame from ElevenLabs received")
-                        break
-                except:
-                    pass
-
-        logger.info("Stream done: audio_bytes_total=%d elapsed=%.3fs", audio_bytes_total, time.time() - started_at)
+                    await ws.send_text(orjson.dumps({
+                        "type": "debug",
+                        "provider": "elevenlabs",
+                        "resume": {"offset": offset, "attempt": len(resumes), "skip_chars": skip},
+                    }).decode())
+                except Exception as e:
+                    logger.warning("Failed to send resume debug info to frontend: %s", e)
+                frames = _upstream_frames(ws, voice_profile, stream_text, current, timings, trace)
+
+            if resumes and current.outcome == "ok":
+                recovery_stats.sessions_recovered += 1
+
+            logger.info("Stream done: audio_bytes_total=%d elapsed=%.3fs", audio_bytes_total, time.perf_counter() - started_at)
+    finally:
+        queue_span.end()
+        for hedge in hedges:
+            hedge.lease.release()
+        # En plats per hedge, minus de som redan lämnats tillbaka för förlorare
+        for _ in range(len(hedges) - released_slots):
+            scheduler.release()
+        # Sessionen räknas som lyckad om någon av strömmarna gick hela vägen
+        outcome = primary.outcome if primary else None
+        if any(attempt.outcome == "ok" for attempt in hedges + resumes):
+            outcome = "ok"
+        upstream_breaker.record(outcome, breaker_generation)
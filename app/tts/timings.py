@@ -0,0 +1,53 @@
+import time
+from typing import Dict, Optional
+
+# Steg i en /ws/tts-session, i den ordning de normalt inträffar
+STAGES = (
+    "accepted",
+    "text_received",
+    "upstream_connected",
+    "init_sent",
+    "first_upstream_frame",
+    "first_audio_sent",
+    "final_frame",
+)
+
+
+class SessionTimings:
+    """Monotona tidsstämplar (time.perf_counter) för varje steg i en session.
+
+    Bara första förekomsten av ett steg sparas, så hedgade eller återupptagna
+    strömmar skriver inte över den ursprungliga tidpunkten.
+    """
+
+    __slots__ = ("_marks",)
+
+    def __init__(self):
+        self._marks: Dict[str, float] = {"accepted": time.perf_counter()}
+
+    @property
+    def started_at(self) -> float:
+        return self._marks["accepted"]
+
+    def mark(self, stage: str):
+        if stage not in self._marks:
+            self._marks[stage] = time.perf_counter()
+
+    def get(self, stage: str) -> Optional[float]:
+        return self._marks.get(stage)
+
+    def breakdown(self) -> dict:
+        """Millisekunder från accept till varje steg och mellan på varandra följande steg."""
+        start = self.started_at
+        since_accept = {}
+        deltas = {}
+        previous = None
+        for stage in STAGES:
+            at = self._marks.get(stage)
+            if at is None:
+                continue
+            since_accept[stage] = round((at - start) * 1000, 2)
+            if previous is not None:
+                deltas[f"{previous}->{stage}"] = round((at - self._marks[previous]) * 1000, 2)
+            previous = stage
+        return {"since_accept_ms": since_accept, "stage_ms": deltas}
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+import orjson
+
+from ..config import settings
+
+logger = logging.getLogger("stefan-api-test-3")
+
+SERVICE_NAME = "stefan-api-test-3"
+
+# OTLP SpanKind
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+_SPAN_ID = re.compile(r"^[0-9a-f]{16}$")
+
+
+def parse_trace_context(data: dict):
+    """Läser klientens trace-id ur första meddelandet.
+
+    Stöder `traceparent` (W3C, "00-<trace-id>-<span-id>-<flaggor>") och ett bart
+    `trace_id`. Returnerar (trace_id, parent_span_id); ogiltiga värden ignoreras.
+    """
+    traceparent = data.get("traceparent")
+    if isinstance(traceparent, str):
+        parts = traceparent.strip().lower().split("-")
+        if len(parts) == 4 and _TRACE_ID.match(parts[1]) and _SPAN_ID.match(parts[2]) and parts[1] != "0" * 32:
+            return parts[1], parts[2]
+    trace_id = data.get("trace_id")
+    if isinstance(trace_id, str):
+        trace_id = trace_id.strip().lower().replace("-", "")
+        if _TRACE_ID.match(trace_id) and trace_id != "0" * 32:
+            return trace_id, None
+    return None, None
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    """Ett tidsintervall i en trace; tider i time.perf_counter, konverteras vid export."""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "kind", "start", "end_at", "attributes", "error")
+
+    def __init__(self, trace, name, parent_id, kind, start, attributes):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start = start
+        self.end_at = None
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self, error: Optional[str] = None, at: Optional[float] = None):
+        if self.end_at is None:
+            self.end_at = at if at is not None else time.perf_counter()
+            if error:
+                self.error = error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(error=f"{exc_type.__name__}: {exc}" if exc_type is not None else None)
+        return False
+
+
+class Trace:
+    """Samlade spans för en /ws/tts-session som exporteras när sessionen är klar."""
+
+    sampled = True
+
+    def __init__(self, trace_id: str, tracer, parent_span_id: Optional[str] = None, started_at: Optional[float] = None):
+        self.trace_id = trace_id
+        self.tracer = tracer
+        self.exporter = tracer.exporter
+        # Ankare för att räkna om perf_counter till epoch-nanosekunder vid export
+        self._anchor_ns = time.time_ns()
+        self._anchor_pc = time.perf_counter()
+        self.spans = []
+        self.root = self.start_span("ws_tts", parent=parent_span_id, kind=KIND_SERVER, start=started_at)
+
+    def start_span(self, name: str, parent=None, kind: int = KIND_INTERNAL, start: Optional[float] = None, **attributes) -> Span:
+        """Startar en span; `parent` är en Span, ett span-id eller None (= rot-spanen)."""
+        if parent is None and self.spans:
+            parent = self.root
+        parent_id = parent.span_id if isinstance(parent, Span) else parent
+        span = Span(self, name, parent_id, kind, start if start is not None else time.perf_counter(), attributes)
+        self.spans.append(span)
+        return span
+
+    span = start_span
+
+    def _unix_ns(self, at: float) -> str:
+        return str(self._anchor_ns + int((at - self._anchor_pc) * 1e9))
+
+    def to_otlp(self) -> dict:
+        now = time.perf_counter()
+        spans = []
+        for span in self.spans:
+            otlp = {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": span.kind,
+                "startTimeUnixNano": self._unix_ns(span.start),
+                "endTimeUnixNano": self._unix_ns(span.end_at if span.end_at is not None else now),
+                "attributes": [_attribute(k, v) for k, v in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            }
+            if span.parent_id:
+                otlp["parentSpanId"] = span.parent_id
+            spans.append(otlp)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{"scope": {"name": "app.tts.tracing"}, "spans": spans}],
+            }]
+        }
+
+    def finish(self, error: Optional[str] = None):
+        """Avslutar rot-spanen och exporterar hela tracen."""
+        self.root.end(error=error)
+        try:
+            self.exporter.export(self.to_otlp())
+        except Exception as e:
+            logger.warning("Failed to export trace %s: %s", self.trace_id, e)
+
+
+class _NoopSpan:
+    """Span som inte gör något; används när sessionen inte samplas."""
+
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def end(self, error=None, at=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _NoopTrace:
+    sampled = False
+    trace_id = None
+    root = NOOP_SPAN
+
+    def start_span(self, name, parent=None, kind=KIND_INTERNAL, start=None, **attributes):
+        return NOOP_SPAN
+
+    span = start_span
+
+    def finish(self, error=None):
+        pass
+
+
+NOOP_TRACE = _NoopTrace()
+
+
+class JsonLinesExporter:
+    """Skriver en OTLP-JSON-rad per trace till en lokal fil (ersättning för en collector).
+
+    Raden skrivs i en tråd så att event-loopen aldrig väntar på disk; utan
+    körande loop (t.ex. vid nedstängning) skrivs den direkt.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.exported = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    def _write(self, line: bytes):
+        with self._lock, open(self.path, "ab") as f:
+            f.write(line)
+
+    def _done(self, future):
+        self._pending.discard(future)
+        try:
+            future.result()
+            self.exported += 1
+        except Exception as e:
+            self.failed += 1
+            logger.warning("Failed to write trace to %s: %s", self.path, e)
+
+    def export(self, payload: dict):
+        line = orjson.dumps(payload) + b"\n"
+        try:
+            future = asyncio.get_running_loop().run_in_executor(None, self._write, line)
+        except RuntimeError:
+            self._write(line)
+            self.exported += 1
+            return
+        self._pending.add(future)
+        future.add_done_callback(self._done)
+
+    async def drain(self):
+        """Väntar tills alla påbörjade skrivningar är klara (tester, nedstängning)."""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+
+class Tracer:
+    """Bestämmer vilka sessioner som spåras och skapar deras traces.
+
+    Samplingen avgörs av trace-id:t (som OpenTelemetrys TraceIdRatioBased), så en
+    klient som skickar samma trace-id till flera tjänster får samma beslut överallt.
+    Med `sample_rate` 0 returneras alltid NOOP_TRACE och inget mäts.
+    """
+
+    def __init__(self, sample_rate: float, exporter, frame_batch: int = 10):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.frame_batch = max(1, frame_batch)
+        self._threshold = int(min(1.0, max(0.0, sample_rate)) * (1 << 64))
+
+    def start_trace(self, trace_id: Optional[str] = None, parent_span_id: Optional[str] = None, started_at: Optional[float] = None):
+        if self._threshold == 0:
+            return NOOP_TRACE
+        trace_id = trace_id or os.urandom(16).hex()
+        if int(trace_id[16:], 16) >= self._threshold:
+            return NOOP_TRACE
+        return Trace(trace_id, self, parent_span_id=parent_span_id, started_at=started_at)
+
+
+tracer = Tracer(settings.TTS_TRACE_SAMPLE_RATE, JsonLinesExporter(settings.TTS_TRACE_FILE), settings.TTS_TRACE_FRAME_BATCH)
@@ -0,0 +1,160 @@
+import json
+import logging
+from typing import Dict, Iterable, Optional
+
+import orjson
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+from ..config import settings
+from .model_selector import model_selector
+from .schedule_tuner import SCHEDULE_CANDIDATES
+
+logger = logging.getLogger("stefan-api-test-3")
+
+DEFAULT_PROFILE = "default"
+DEFAULT_VOICE_ID = "Vo4adEN1y46b0ufuysRe"  # Sätt ditt voice-ID här
+
+
+class VoiceSettings(BaseModel):
+    stability: float = Field(0.5, ge=0, le=1)
+    similarity_boost: float = Field(0.8, ge=0, le=1)
+    use_speaker_boost: bool = False
+    speed: float = Field(1.0, ge=0.7, le=1.2)
+
+
+class VoiceProfileConfig(BaseModel):
+    """Konfiguration för en röstprofil, valideras vid uppstart."""
+
+    model_config = ConfigDict(protected_namespaces=(), extra="forbid")
+
+    voice_id: str = Field(..., min_length=1)
+    model_id: Optional[str] = None  # None = adaptivt modellval (model_selector)
+    output_format: str = "pcm_16000"
+    voice_settings: VoiceSettings = VoiceSettings()
+    schedule: Optional[str] = None  # None = schedule_tuner väljer
+
+    @field_validator("output_format")
+    @classmethod
+    def _pcm_only(cls, value: str) -> str:
+        # Pipelinen och audio-viewern förutsätter rå PCM
+        if not value.startswith("pcm_") or not value[4:].isdigit():
+            raise ValueError("output_format måste vara pcm_<samplerate>")
+        return value
+
+    @field_validator("schedule")
+    @classmethod
+    def _known_schedule(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None and value not in SCHEDULE_CANDIDATES:
+            raise ValueError(f"Okänt schema: {value} (tillgängliga: {', '.join(SCHEDULE_CANDIDATES)})")
+        return value
+
+
+class VoiceProfile:
+    """Validerad röstprofil med förberäknade URL:er och serialiserade meddelanden.
+
+    Allt som inte beror på texten byggs en gång vid uppstart: URL per modell,
+    init-meddelandet per schema och debug-meddelandena till frontend.
+    """
+
+    __slots__ = (
+        "name", "voice_id", "model_id", "output_format", "sample_rate", "schedule", "base_url",
+        "_has_api_key", "_urls", "_init_messages", "_debug_api", "_debug_init",
+    )
+
+    def __init__(self, name: str, config: VoiceProfileConfig, model_ids: Iterable[str], base_url: str = None):
+        self.name = name
+        self.base_url = (base_url or settings.ELEVENLABS_WS_BASE).rstrip("/")
+        self.voice_id = config.voice_id
+        self.model_id = config.model_id
+        self.output_format = config.output_format
+        self.sample_rate = int(config.output_format[4:])
+        self.schedule = config.schedule
+        self._has_api_key = bool(settings.ELEVENLABS_API_KEY or settings.ELEVENLABS_API_KEYS)
+        voice_settings = config.voice_settings.model_dump()
+
+        self._urls: Dict[str, str] = {}
+        self._debug_api: Dict[str, str] = {}
+        for model_id in set(model_ids) | ({config.model_id} if config.model_id else set()):
+            self._add_model(model_id)
+
+        self._init_messages: Dict[str, str] = {}
+        self._debug_init: Dict[str, str] = {}
+        for schedule, (chunk_length_schedule, _) in SCHEDULE_CANDIDATES.items():
+            init_msg = {
+                "text": " ",  # kickstart
+                "voice_settings": voice_settings,
+                "generation_config": {"chunk_length_schedule": chunk_length_schedule},
+            }
+            # Nyckeln skickas i xi-api-key-headern, så init-meddelandet är detsamma för alla nycklar
+            self._init_messages[schedule] = orjson.dumps(init_msg).decode()
+            self._debug_init[schedule] = json.dumps({
+                "type": "debug",
+                "provider": "elevenlabs",
+                "init_message": {**init_msg, "has_api_key": self._has_api_key},
+            })
+
+    def _add_model(self, model_id: str):
+        url = (
+            f"{self.base_url}/v1/text-to-speech/{self.voice_id}/stream-input"
+            f"?model_id={model_id}&output_format={self.output_format}"
+        )
+        self._urls[model_id] = url
+        self._debug_api[model_id] = json.dumps({
+            "type": "debug",
+            "provider": "elevenlabs",
+            "api_details": {
+                "profile": self.name,
+                "voice_id": self.voice_id,
+                "model_id": model_id,
+                "url": url,
+                "has_api_key": self._has_api_key,
+            },
+        })
+
+    def _ensure_model(self, model_id: str):
+        if model_id not in self._urls:
+            self._add_model(model_id)
+
+    def url(self, model_id: str) -> str:
+        self._ensure_model(model_id)
+        return self._urls[model_id]
+
+    def debug_api_details(self, model_id: str) -> str:
+        self._ensure_model(model_id)
+        return self._debug_api[model_id]
+
+    def init_message(self, schedule: str) -> str:
+        return self._init_messages[schedule]
+
+    def debug_init_message(self, schedule: str) -> str:
+        return self._debug_init[schedule]
+
+
+def load_voice_profiles(raw: str, model_ids: Iterable[str], base_url: str = None) -> Dict[str, VoiceProfile]:
+    """Validerar profilkonfigurationen (JSON-objekt namn → profil) och bygger profilerna.
+
+    `base_url` ersätter ELEVENLABS_WS_BASE, t.ex. för att peka på en lokal ersättningsserver.
+    """
+    configs = {DEFAULT_PROFILE: {"voice_id": DEFAULT_VOICE_ID}}
+    if raw.strip():
+        parsed = json.loads(raw)
+        if not isinstance(parsed, dict):
+            raise ValueError("TTS_VOICE_PROFILES måste vara ett JSON-objekt")
+        configs.update(parsed)
+    model_ids = list(model_ids)
+    profiles = {
+        name: VoiceProfile(name, VoiceProfileConfig.model_validate(config), model_ids, base_url)
+        for name, config in configs.items()
+    }
+    logger.info("Loaded voice profiles: %s", ", ".join(profiles))
+    return profiles
+
+
+def _profiles_source() -> str:
+    if settings.TTS_VOICE_PROFILES_FILE:
+        with open(settings.TTS_VOICE_PROFILES_FILE, encoding="utf-8") as f:
+            return f.read()
+    return settings.TTS_VOICE_PROFILES
+
+
+voice_profiles = load_voice_profiles(_profiles_source(), (m for m, _ in model_selector.candidates))
@@ -13,3 +13,26 @@ def mock_websocket():
     ws.send_bytes = AsyncMock()
     ws.close = AsyncMock()
     return ws
+
+@pytest.fixture(autouse=True)
+def reset_upstream_breaker():
+    """Nollställ circuit breakern så att avsiktliga fel inte läcker mellan tester."""
+    from app.tts.circuit_breaker import upstream_breaker
+    upstream_breaker.reset()
+    yield
+    upstream_breaker.reset()
+
+@pytest.fixture
+async def fake_elevenlabs():
+    """Startar en lokal ElevenLabs-ersättning och pekar röstprofilerna mot den."""
+    from unittest.mock import patch
+    from app.tts.voice_profiles import load_voice_profiles
+    from app.tts.model_selector import model_selector
+    from tests.utils.fake_elevenlabs import FakeElevenLabsServer
+
+    server = FakeElevenLabsServer()
+    await server.start()
+    profiles = load_voice_profiles("", (m for m, _ in model_selector.candidates), base_url=server.url)
+    with patch.dict('app.tts.text_to_audio.voice_profiles', profiles):
+        yield server
+    await server.stop()
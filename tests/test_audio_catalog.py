@@ -0,0 +1,117 @@
+import pytest
+import os
+import time
+import wave
+from fastapi import HTTPException
+from unittest.mock import patch
+from app.audio_catalog import AudioCatalog
+from app.endpoints.audio_viewer import list_audio_files
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = AudioCatalog(str(tmp_path))
+    yield catalog
+    catalog.close()
+
+def _write_pcm(catalog, name, seconds, mtime=None):
+    path = catalog.path_for(name)
+    with open(path, "wb") as f:
+        f.write(b"\0\0" * int(16000 * seconds))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+def _write_wav(catalog, name, seconds, sample_rate=22050):
+    path = catalog.path_for(name)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(b"\0\0" * int(sample_rate * seconds))
+    return path
+
+def test_register_stores_metadata(catalog):
+    """Testar att längd, samplerate, text, röst och tider sparas vid registrering."""
+    catalog.register(_write_pcm(catalog, "a.pcm", 1.5), text="Hej", voice="default", timings={"stage_ms": {"x": 1}})
+    catalog.register(_write_wav(catalog, "b.wav", 2.0))
+
+    pcm = catalog.get("a.pcm")
+    assert pcm["duration_sec"] == 1.5
+    assert pcm["sample_rate"] == 16000
+    assert pcm["text"] == "Hej" and pcm["voice"] == "default"
+    assert pcm["timings"] == {"stage_ms": {"x": 1}}
+    wav = catalog.get("b.wav")
+    assert wav["duration_sec"] == 2.0
+    assert wav["sample_rate"] == 22050
+
+    # Ny registrering utan metadata behåller texten
+    catalog.register(catalog.path_for("a.pcm"))
+    assert catalog.get("a.pcm")["text"] == "Hej"
+
+def test_cursor_pagination_covers_all_files_in_order(catalog):
+    """Testar att sidorna tillsammans ger alla filer exakt en gång, sorterade."""
+    base = time.time() - 1000
+    for i in range(23):
+        # Några filer med samma ändringstid så att namnet måste avgöra ordningen
+        catalog.register(_write_pcm(catalog, f"f{i:02d}.pcm", 0.1 + i / 100, mtime=base + i // 2))
+
+    names, cursor = [], None
+    while True:
+        page = catalog.query(limit=5, cursor=cursor)
+        names += [f["name"] for f in page["files"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(names) == len(set(names)) == 23
+    expected = sorted((f for f in names), key=lambda n: (catalog.get(n)["modified"], n), reverse=True)
+    assert names == expected
+
+    by_duration = catalog.query(limit=3, sort="duration", order="asc")
+    assert [f["name"] for f in by_duration["files"]] == ["f00.pcm", "f01.pcm", "f02.pcm"]
+
+def test_filters_and_total(catalog):
+    """Testar filter på röst, typ, text och längd samt totalsumma."""
+    catalog.register(_write_pcm(catalog, "sv.pcm", 1.0), text="Hej världen 100%", voice="sv")
+    catalog.register(_write_pcm(catalog, "en.pcm", 3.0), text="Hello world", voice="en")
+    catalog.register(_write_wav(catalog, "sv.wav", 1.0), text="Hej igen", voice="sv")
+
+    assert {f["name"] for f in catalog.query(voice="sv")["files"]} == {"sv.pcm", "sv.wav"}
+    assert [f["name"] for f in catalog.query(type="wav")["files"]] == ["sv.wav"]
+    assert [f["name"] for f in catalog.query(text="100%")["files"]] == ["sv.pcm"]
+    assert [f["name"] for f in catalog.query(min_duration=2)["files"]] == ["en.pcm"]
+    assert catalog.query(voice="sv", with_total=True)["total"] == 2
+    with pytest.raises(ValueError):
+        catalog.query(sort="random")
+
+def test_sync_reconciles_with_disk(catalog):
+    """Testar att avstämningen lägger till okända filer och tar bort försvunna."""
+    catalog.register(_write_pcm(catalog, "gone.pcm", 0.5))
+    os.remove(catalog.path_for("gone.pcm"))
+    _write_pcm(catalog, "new.pcm", 0.5)
+    _write_wav(catalog, "new.wav", 0.5)
+    with open(catalog.path_for("notes.txt"), "w") as f:
+        f.write("inte ljud")
+
+    assert catalog.sync() == {"added": 2, "removed": 1}
+    assert catalog.stats()["files"] == 2
+    assert catalog.sync() == {"added": 0, "removed": 0}
+
+async def test_list_endpoint_pages_through_catalog(catalog):
+    """Testar att /api/audio-files returnerar sidor med cursor och avvisar ogiltig sortering."""
+    for i in range(3):
+        catalog.register(_write_pcm(catalog, f"s{i}.pcm", 0.2))
+
+    with patch('app.endpoints.audio_viewer.audio_catalog', catalog):
+        first = await list_audio_files(limit=2, cursor=None, sort="name", order="asc", voice=None, type=None,
+                                       q=None, min_duration=None, max_duration=None, with_total=True)
+        assert [f["name"] for f in first["files"]] == ["s0.pcm", "s1.pcm"]
+        assert first["total"] == 3
+        second = await list_audio_files(limit=2, cursor=first["next_cursor"], sort="name", order="asc", voice=None,
+                                        type=None, q=None, min_duration=None, max_duration=None, with_total=False)
+        assert [f["name"] for f in second["files"]] == ["s2.pcm"]
+        assert second["next_cursor"] is None
+
+        with pytest.raises(HTTPException) as exc:
+            await list_audio_files(limit=2, cursor="trasig", sort="name", order="asc", voice=None, type=None,
+                                   q=None, min_duration=None, max_duration=None, with_total=False)
+        assert exc.value.status_code == 400
@@ -0,0 +1,151 @@
+import pytest
+import io
+import os
+import wave
+from fastapi import HTTPException
+from starlette.requests import Request
+from unittest.mock import patch
+from app.audio_catalog import AudioCatalog
+from app.audio_files import AudioFileResponse, parse_range, RangeNotSatisfiable, wav_header
+from app.endpoints.audio_viewer import download_audio
+
+PCM = bytes(range(256)) * 400  # 102 400 bytes
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = AudioCatalog(str(tmp_path))
+    with open(catalog.path_for("rec.pcm"), "wb") as f:
+        f.write(PCM)
+    catalog.register(catalog.path_for("rec.pcm"), sample_rate=22050)
+    with patch('app.endpoints.audio_viewer.audio_catalog', catalog):
+        yield catalog
+    catalog.close()
+
+def _request(method="GET", **headers):
+    return Request({
+        "type": "http", "method": method, "path": "/", "query_string": b"",
+        "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()],
+    })
+
+async def _serve(response, extensions=None):
+    """Kör ASGI-svaret och returnerar (status, headers, body, meddelanden)."""
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+    await response({"type": "http", "extensions": extensions or {}}, None, send)
+    start = messages[0]
+    headers = {k.decode(): v.decode() for k, v in start["headers"]}
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return start["status"], headers, body, messages
+
+def test_parse_range():
+    """Testar tolkning av Range-huvuden, inklusive suffix och ogiltiga intervall."""
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None  # Flera intervall → hela filen
+    assert parse_range("items=0-1", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=-10", 0)  # Suffix på en tom fil
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=-0", 100)
+
+async def test_pcm_served_as_wav_is_playable(catalog):
+    """Testar att PCM med genererat huvud blir en giltig WAV med katalogens samplerate."""
+    response = await download_audio(_request(), "rec.pcm", format="wav")
+    status, headers, body, _ = await _serve(response)
+
+    assert status == 200
+    assert headers["content-type"] == "audio/wav"
+    assert headers["accept-ranges"] == "bytes"
+    assert int(headers["content-length"]) == len(body) == 44 + len(PCM)
+    with wave.open(io.BytesIO(body)) as w:
+        assert w.getframerate() == 22050
+        assert w.getnchannels() == 1
+        assert w.readframes(w.getnframes()) == PCM
+
+async def test_range_spanning_header_and_file(catalog):
+    """Testar intervall som börjar i det genererade huvudet och fortsätter in i filen."""
+    full = wav_header(len(PCM), 22050) + PCM
+    for range_header, (start, end) in [("bytes=40-99", (40, 99)), ("bytes=70000-", (70000, len(full) - 1)),
+                                       ("bytes=-5", (len(full) - 5, len(full) - 1)), ("bytes=0-10", (0, 10))]:
+        response = await download_audio(_request(range=range_header), "rec.pcm", format="wav")
+        status, headers, body, _ = await _serve(response)
+        assert status == 206
+        assert headers["content-range"] == f"bytes {start}-{end}/{len(full)}"
+        assert body == full[start:end + 1]
+
+async def test_raw_download_and_unsatisfiable_range(catalog):
+    """Testar rå nedladdning med Range, 416 utanför filen och HEAD utan kropp."""
+    response = await download_audio(_request(range="bytes=100-199"), "rec.pcm", format="raw")
+    status, headers, body, _ = await _serve(response)
+    assert status == 206
+    assert headers["content-type"] == "application/octet-stream"
+    assert body == PCM[100:200]
+
+    response = await download_audio(_request(range=f"bytes={len(PCM)}-"), "rec.pcm", format="raw")
+    status, headers, body, _ = await _serve(response)
+    assert status == 416
+    assert headers["content-range"] == f"bytes */{len(PCM)}"
+
+    response = await download_audio(_request("HEAD"), "rec.pcm", format="wav")
+    status, headers, body, _ = await _serve(response)
+    assert status == 200 and body == b""
+    assert int(headers["content-length"]) == 44 + len(PCM)
+
+async def test_if_range_mismatch_returns_full_file(catalog):
+    """Testar att en inaktuell If-Range ger hela filen i stället för intervallet."""
+    response = await download_audio(_request(range="bytes=0-9", if_range='"gammal"'), "rec.pcm", format="raw")
+    status, _, body, _ = await _serve(response)
+    assert status == 200
+    assert body == PCM
+
+async def test_streams_in_chunks_and_uses_zerocopy_when_offered(catalog):
+    """Testar att filen skickas i bitar, och med zerocopysend när servern erbjuder det."""
+    response = AudioFileResponse(catalog.path_for("rec.pcm"), "audio/wav", prefix=b"H" * 44)
+    _, _, body, messages = await _serve(response)
+    assert body == b"H" * 44 + PCM
+    assert max(len(m.get("body", b"")) for m in messages[1:]) <= 64 * 1024
+    assert len(messages) > 2
+
+    response = AudioFileResponse(catalog.path_for("rec.pcm"), "audio/wav", prefix=b"H" * 44, range_header="bytes=10-")
+    _, _, body, messages = await _serve(response, extensions={"http.response.zerocopysend": {}})
+    assert body == b"H" * 34
+    assert messages[-1]["type"] == "http.response.zerocopysend"
+    assert messages[-1]["offset"] == 0 and messages[-1]["count"] == len(PCM)
+
+async def test_download_rejects_missing_and_traversal(catalog, tmp_path):
+    """Testar 404 för saknade filer och att sökvägar utanför katalogen inte kan nås."""
+    with open(os.path.join(tmp_path.parent, "secret.pcm"), "wb") as f:
+        f.write(b"x")
+    for name in ("nope.pcm", "../secret.pcm"):
+        with pytest.raises(HTTPException) as exc:
+            await download_audio(_request(), name, format="raw")
+        assert exc.value.status_code == 404
+
+async def test_download_only_serves_audio_files(catalog):
+    """Testar att katalogdatabasen och toppcachen i ljudkatalogen inte kan laddas ner."""
+    with open(catalog.path_for("rec.pcm.peaks.npz"), "wb") as f:
+        f.write(b"x")
+    for name in (os.path.basename(catalog.db_path), "rec.pcm.peaks.npz"):
+        assert os.path.exists(catalog.path_for(name))
+        with pytest.raises(HTTPException) as exc:
+            await download_audio(_request(), name, format="raw")
+        assert exc.value.status_code == 404
+
+async def test_wav_header_and_length_agree_while_file_grows(catalog):
+    """Testar att WAV-huvudet och Content-Length bygger på samma stat även om filen växer."""
+    response = await download_audio(_request(), "rec.pcm", format="wav")
+    with open(catalog.path_for("rec.pcm"), "ab") as f:
+        f.write(b"\x00" * 1000)  # Inspelningen fortsätter efter att huvudet byggts
+    status, headers, body, _ = await _serve(response)
+
+    assert status == 200
+    assert int(headers["content-length"]) == len(body) == 44 + len(PCM)
+    with wave.open(io.BytesIO(body)) as wav:
+        assert wav.getnframes() * 2 == len(PCM)
@@ -0,0 +1,97 @@
+import pytest
+import asyncio
+import os
+import wave
+import numpy as np
+from fastapi import HTTPException
+from unittest.mock import patch
+from app.audio_catalog import AudioCatalog
+from app.audio_peaks import PeaksService, compute_peaks, load_peaks_cache, peaks_path, pcm_layout
+from app.endpoints.audio_viewer import audio_peaks
+
+def _naive(samples, window):
+    """Referens: min/max per fönster med hela filen i minnet."""
+    return np.array([[samples[i:i + window].min(), samples[i:i + window].max()]
+                     for i in range(0, len(samples), window)])
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = AudioCatalog(str(tmp_path))
+    service = PeaksService(workers=1, window=64)
+    with patch('app.endpoints.audio_viewer.audio_catalog', catalog), \
+         patch('app.endpoints.audio_viewer.peaks_service', service):
+        yield catalog, service
+    service.shutdown()
+    catalog.close()
+
+def test_compute_peaks_matches_reference_across_chunks(tmp_path):
+    """Testar att min/max per nivå stämmer även när fönster och bitar inte går jämnt ut."""
+    rng = np.random.default_rng(1)
+    samples = rng.integers(-32768, 32767, 64 * 1000 + 17, dtype=np.int16)
+    path = str(tmp_path / "rec.pcm")
+    samples.tofile(path)
+
+    with patch('app.audio_peaks.CHUNK_WINDOWS', 7):  # Många små minnesmappade bitar
+        peaks = compute_peaks(path, window=64)
+    assert peaks["frames"] == len(samples)
+    spp, level0 = peaks["levels"][0][0], np.stack(peaks["levels"][0][1:], axis=1)
+    assert spp == 64
+    assert np.array_equal(level0, _naive(samples, 64))
+    for spp, mins, maxs in peaks["levels"][1:]:
+        assert np.array_equal(np.stack([mins, maxs], axis=1), _naive(samples, spp))
+    assert len(peaks["levels"][-1][1]) <= 256
+
+def test_wav_layout_and_stereo(tmp_path):
+    """Testar att WAV-huvudet tolkas och att båda kanalerna ingår i topparna."""
+    path = str(tmp_path / "st.wav")
+    left = np.full(1000, 100, dtype=np.int16)
+    right = np.full(1000, -200, dtype=np.int16)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(22050)
+        w.writeframes(np.stack([left, right], axis=1).tobytes())
+
+    offset, data_bytes, rate, channels = pcm_layout(path)
+    assert (offset, data_bytes, rate, channels) == (44, 4000, 22050, 2)
+    peaks = compute_peaks(path, window=100)
+    assert peaks["frames"] == 1000
+    _, mins, maxs = peaks["levels"][0]
+    assert len(mins) == 10
+    assert (mins == -200).all() and (maxs == 100).all()
+
+async def test_endpoint_generates_lazily_once_and_caches(catalog):
+    """Testar att första anropen delar en beräkning, att cachen sparas bredvid filen och återanvänds."""
+    catalog, service = catalog
+    samples = (np.sin(np.arange(16000 * 3) / 20) * 10000).astype(np.int16)
+    path = catalog.path_for("tone.pcm")
+    samples.tofile(path)
+    catalog.register(path, sample_rate=16000)
+
+    first, second = await asyncio.gather(audio_peaks("tone.pcm", width=100, start=0.0, end=None),
+                                         audio_peaks("tone.pcm", width=100, start=0.0, end=None))
+    assert first == second
+    assert service.generated == 1 and len(service._inflight) == 0
+    assert os.path.exists(peaks_path(path))
+    assert first["duration_sec"] == 3.0
+    assert first["samples_per_peak"] >= 64 and len(first["peaks"]) >= 100
+    assert max(p[1] for p in first["peaks"]) > 9000
+
+    await audio_peaks("tone.pcm", width=100, start=1.0, end=2.0)
+    assert service.cache_hits == 1
+
+    # Ändrad fil gör cachen ogiltig
+    samples[:10].tofile(path)
+    assert load_peaks_cache(path) is None
+    small = await audio_peaks("tone.pcm", width=100, start=0.0, end=None)
+    assert small["duration_sec"] == round(10 / 16000, 3)
+
+async def test_endpoint_rejects_missing_and_non_audio(catalog):
+    """Testar 404 för saknade filer, sökvägar utanför katalogen och filer som inte är ljud."""
+    catalog, _ = catalog
+    with open(catalog.path_for("notes.txt"), "w") as f:
+        f.write("x")
+    for name in ("nope.pcm", "../secret.pcm", "notes.txt"):
+        with pytest.raises(HTTPException) as exc:
+            await audio_peaks(name, width=100, start=0.0, end=None)
+        assert exc.value.status_code == 404
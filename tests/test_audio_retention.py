@@ -0,0 +1,126 @@
+import pytest
+import asyncio
+import os
+import time
+from unittest.mock import patch
+from app.audio_catalog import AudioCatalog
+from app.audio_peaks import PEAKS_SUFFIX
+from app.audio_retention import RetentionManager
+from app.tts.metrics import AUDIO_STORAGE_BYTES
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = AudioCatalog(str(tmp_path))
+    yield catalog
+    catalog.close()
+
+def _add(catalog, name, size=1000, modified=None, accessed=None):
+    """Skriver och registrerar en fil med angiven ändrings- och åtkomsttid."""
+    path = catalog.path_for(name)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    if modified is not None:
+        os.utime(path, (modified, modified))
+    with patch('app.audio_catalog.time.time', return_value=accessed or time.time()):
+        catalog.register(path)
+    return path
+
+async def test_evicts_files_older_than_max_age(catalog):
+    """Testar att filer äldre än maxåldern tas bort tillsammans med sin toppcache."""
+    now = time.time()
+    old = _add(catalog, "old.pcm", modified=now - 7200)
+    with open(old + PEAKS_SUFFIX, "wb") as f:
+        f.write(b"cache")
+    _add(catalog, "new.pcm", modified=now - 60)
+
+    manager = RetentionManager(catalog, max_age_sec=3600)
+    result = await manager.run_once()
+
+    assert result == {"evicted": 1, "bytes": 1000, "files": 1}
+    assert not os.path.exists(old) and not os.path.exists(old + PEAKS_SUFFIX)
+    assert catalog.get("old.pcm") is None and catalog.get("new.pcm") is not None
+    assert manager.snapshot()["evicted_by_age"] == 1
+    assert AUDIO_STORAGE_BYTES.value == 1000
+
+async def test_byte_budget_evicts_least_accessed_first(catalog):
+    """Testar att budgeten hålls genom att ta bort de minst nyligen använda filerna först."""
+    now = time.time()
+    for i, name in enumerate(["a.pcm", "b.pcm", "c.pcm", "d.pcm"]):
+        # a är äldst men användes senast
+        _add(catalog, name, modified=now - 100 + i, accessed=now - (0 if name == "a.pcm" else 50 - i))
+
+    manager = RetentionManager(catalog, max_bytes=2500)
+    await manager.run_once()
+    assert sorted(f["name"] for f in catalog.query()["files"]) == ["a.pcm", "d.pcm"]
+    snapshot = manager.snapshot()
+    assert snapshot["evicted_by_size"] == 2
+    assert snapshot["evicted_bytes"] == 2000
+    assert snapshot["disk_bytes"] == 2000
+
+    by_modified = RetentionManager(catalog, max_bytes=1500, order="modified")
+    await by_modified.run_once()
+    assert [f["name"] for f in catalog.query()["files"]] == ["d.pcm"]
+
+async def test_runs_in_small_batches_and_yields(catalog):
+    """Testar att gallringen hämtar högst `batch` filer per omgång och släpper loopen emellan."""
+    now = time.time()
+    for i in range(20):
+        _add(catalog, f"f{i:02d}.pcm", size=100, modified=now - 7200)
+    os.remove(catalog.path_for("f00.pcm"))  # Redan borta från disk: bara raden tas bort
+
+    batches = []
+    oldest = catalog.oldest
+
+    def spy(*args):
+        rows = oldest(*args)
+        batches.append(len(rows))
+        return rows
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0)
+
+    manager = RetentionManager(catalog, max_age_sec=3600, batch=3)
+    task = asyncio.create_task(ticker())
+    with patch.object(catalog, "oldest", spy):
+        await manager.run_once()
+    task.cancel()
+
+    assert catalog.stats()["files"] == 0
+    assert max(batches) == 3 and len(batches) >= 7
+    assert ticks >= len(batches)
+    assert manager.evicted_files == 20
+
+async def test_disabled_without_limits(catalog):
+    """Testar att gallringen inte startar utan budget eller maxålder."""
+    manager = RetentionManager(catalog)
+    manager.start()
+    assert not manager.enabled and manager._task is None
+    with pytest.raises(ValueError):
+        RetentionManager(catalog, order="random")
+
+async def test_eviction_metrics_updated_on_loop_thread(catalog):
+    """Testar att metrics för gallringen uppdateras på event-loopens tråd, inte i arbetstråden."""
+    import threading
+    from app.tts.metrics import AUDIO_EVICTED_FILES
+
+    now = time.time()
+    for name in ("a.pcm", "b.pcm", "c.pcm"):
+        _add(catalog, name, modified=now - 7200)
+    calls = []
+    original = AUDIO_EVICTED_FILES.labels_inc
+
+    def _labels_inc(label, amount=1):
+        calls.append((threading.get_ident(), label, amount))
+        original(label, amount)
+
+    manager = RetentionManager(catalog, max_age_sec=3600)
+    with patch.object(AUDIO_EVICTED_FILES, "labels_inc", _labels_inc):
+        await manager.run_once()
+
+    assert calls == [(threading.get_ident(), "age", 3)]
+    assert manager.snapshot()["evicted_files"] == 3
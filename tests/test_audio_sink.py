@@ -0,0 +1,89 @@
+import pytest
+import json
+import os
+from unittest.mock import AsyncMock, patch
+from app.audio_catalog import AudioCatalog
+from app.endpoints.tts_ws import ws_tts
+from app.tts.audio_sink import NOOP_SESSION_AUDIO, PART_SUFFIX, AudioSink
+from app.tts.metrics import AUDIO_SINK_DROPPED_BYTES
+
+TEXT = "Den här sessionen sparas för QA."
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = AudioCatalog(str(tmp_path))
+    yield catalog
+    catalog.close()
+
+@pytest.fixture
+async def sink(catalog):
+    sink = AudioSink(catalog, sample_rate=1.0)
+    with patch('app.endpoints.tts_ws.audio_sink', sink):
+        yield sink
+    await sink.stop()
+
+def _audio_sent(mock_websocket) -> bytes:
+    return b"".join(call.args[0] for call in mock_websocket.send_bytes.call_args_list)
+
+async def test_session_audio_written_and_registered(sink, catalog, fake_elevenlabs, mock_websocket):
+    """Testar att ljudet från ws_tts sparas i bakgrunden och registreras i katalogen med text och tider."""
+    mock_websocket.receive_text = AsyncMock(return_value=json.dumps({"text": TEXT}))
+    await ws_tts(mock_websocket)
+    await sink.drain()
+
+    sent = _audio_sent(mock_websocket)
+    assert sent
+    files = catalog.query()["files"]
+    assert len(files) == 1
+    entry = files[0]
+    assert entry["text"] == TEXT
+    assert entry["voice"] == "default"
+    assert entry["sample_rate"] == 16000
+    assert "stage_ms" in entry["timings"]
+    with open(entry["path"], "rb") as f:
+        assert f.read() == sent
+    assert not [n for n in os.listdir(catalog.audio_dir) if n.endswith(PART_SUFFIX)]
+    assert sink.snapshot()["written_files"] == 1
+    assert sink.snapshot()["dropped_chunks"] == 0
+
+async def test_full_buffer_drops_instead_of_blocking(catalog):
+    """Testar att chunkar tappas och räknas när kön är full, och att filen inte skarvas ihop."""
+    sink = AudioSink(catalog, sample_rate=1.0, max_buffer_bytes=3000)
+    dropped_before = AUDIO_SINK_DROPPED_BYTES.value
+    session = sink.open(TEXT, "default", 16000)
+    # Ingen await mellan skrivningarna: skrivaren hinner aldrig köra, precis som med en för långsam disk
+    for i in range(10):
+        assert session.write(bytes([i]) * 1000) is None
+    session.close()
+    await sink.drain()
+
+    assert sink.dropped_chunks == 7
+    assert sink.dropped_bytes == 7000
+    assert AUDIO_SINK_DROPPED_BYTES.value - dropped_before == 7000
+    assert sink.queued_bytes == 0
+    with open(session.path, "rb") as f:
+        assert f.read() == b"\0" * 1000 + b"\1" * 1000 + b"\2" * 1000
+
+    # Kön har tömts: nästa session skrivs utan förluster
+    second = sink.open(TEXT, "default", 16000)
+    second.write(b"\5" * 1000)
+    second.close()
+    await sink.drain()
+    assert sink.dropped_chunks == 7
+    assert catalog.stats()["files"] == 2
+    await sink.stop()
+
+async def test_sampling_and_write_errors(catalog, tmp_path):
+    """Testar att osamplade sessioner inte spelas in och att skrivfel räknas utan att sprida sig."""
+    assert AudioSink(catalog, sample_rate=0).open(TEXT, "default", 16000) is NOOP_SESSION_AUDIO
+
+    blocker = tmp_path / "blocker"
+    blocker.write_text("inte en katalog")
+    broken = AudioSink(AudioCatalog(str(blocker / "audio")), sample_rate=1.0)
+    session = broken.open(TEXT, "default", 16000)
+    session.write(b"\0" * 100)
+    session.close()
+    await broken.drain()
+    assert broken.failed == 1
+    assert broken.written_files == 0
+    await broken.stop()
@@ -0,0 +1,21 @@
+from tools.bench_hotpath import CASES, FRAME_MS, check_thresholds, load_thresholds, run_benchmarks
+
+def test_thresholds_cover_every_case():
+    """Testar att gränsfilen i repot har en gräns för varje fall och ramstorlek."""
+    thresholds = load_thresholds()
+    expected = {f"{case}@{ms}ms" for ms in FRAME_MS for case, _ in CASES}
+    assert set(thresholds["cases"]) == expected
+    assert all(limit > 0 for limit in thresholds["cases"].values())
+
+def test_check_thresholds_reports_slower_cases():
+    """Testar att bara fall över sin gräns rapporteras som regressioner."""
+    results = {"cases": {"a@20ms": {"relative": 1.2}, "b@20ms": {"relative": 3.0}}}
+    thresholds = {"cases": {"a@20ms": 1.5, "b@20ms": 2.0, "c@20ms": 1.0}}
+    assert check_thresholds(results, thresholds) == [("b@20ms", 3.0, 2.0)]
+
+def test_run_benchmarks_smoke():
+    """Testar att alla fall går att köra (få ramar, inga tidskrav)."""
+    results = run_benchmarks(number=5, repeats=1, name_filter="@20ms")
+    assert set(results["cases"]) == {f"{case}@20ms" for case, _ in CASES}
+    assert all(r["ns_per_frame"] > 0 and r["relative"] > 0 for r in results["cases"].values())
+    assert results["calibration_ns"] > 0
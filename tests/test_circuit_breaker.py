@@ -0,0 +1,101 @@
+import pytest
+import asyncio
+import time
+from unittest.mock import patch
+from app.tts.circuit_breaker import CircuitBreaker, CircuitOpenError, upstream_breaker
+from app.tts.text_to_audio import process_text_to_audio
+
+def _breaker(**overrides):
+    kwargs = dict(
+        name="test",
+        failure_ratio=0.5,
+        min_calls=4,
+        window_sec=60,
+        open_sec=0.05,
+        half_open_max_calls=1,
+    )
+    kwargs.update(overrides)
+    return CircuitBreaker(**kwargs)
+
+def test_trips_on_failure_ratio():
+    """Testar att brytaren öppnas när andelen fel når gränsen."""
+    breaker = _breaker()
+    for outcome in ("ok", "error", "ok", "timeout"):
+        breaker.record(outcome, breaker.before_call())
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.snapshot()["rejected"] == 1
+
+def test_needs_min_calls_before_tripping():
+    """Testar att få anrop inte räcker för att öppna brytaren."""
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record("error", breaker.before_call())
+
+    assert breaker.state == "closed"
+
+def test_half_open_probe_closes_on_success():
+    """Testar att ett lyckat provanrop stänger brytaren."""
+    breaker = _breaker(min_calls=1)
+    breaker.record("error", breaker.before_call())
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    probe = breaker.before_call()
+    assert breaker.state == "half_open"
+
+    # Bara ett provanrop åt gången
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record("ok", probe)
+    assert breaker.state == "closed"
+    assert breaker.snapshot()["transitions"] == {"closed": 1, "open": 1, "half_open": 1}
+
+def test_half_open_probe_reopens_on_failure():
+    """Testar att ett misslyckat provanrop öppnar brytaren igen."""
+    breaker = _breaker(min_calls=1)
+    breaker.record("timeout", breaker.before_call())
+
+    time.sleep(0.06)
+    breaker.record("error", breaker.before_call())
+    assert breaker.state == "open"
+
+def test_late_outcome_from_closed_is_ignored_in_half_open():
+    """Testar att ett sent utfall från ett anrop som startade i CLOSED inte påverkar provanropet."""
+    breaker = _breaker(min_calls=2)
+    slow = breaker.before_call()  # Långsamt anrop som startar medan brytaren är stängd
+    breaker.record("error", breaker.before_call())
+    breaker.record("error", breaker.before_call())
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    probe = breaker.before_call()
+    assert breaker.state == "half_open"
+
+    breaker.record("ok", slow)
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # Provplatsen är fortfarande upptagen
+
+    breaker.record("error", probe)
+    assert breaker.state == "open"
+    assert breaker.snapshot()["stale_outcomes"] == 1
+
+def test_open_breaker_fails_fast_without_connecting(mock_websocket):
+    """Testar att process_text_to_audio avvisar direkt när brytaren är öppen."""
+
+    async def _run_test():
+        for _ in range(upstream_breaker.min_calls):
+            upstream_breaker.record("error", upstream_breaker.before_call())
+        assert upstream_breaker.state == "open"
+
+        with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
+            with pytest.raises(CircuitOpenError):
+                async for _ in process_text_to_audio(mock_websocket, "Test", time.perf_counter()):
+                    pass
+            mock_connect.assert_not_called()
+
+    asyncio.run(_run_test())
@@ -0,0 +1,61 @@
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock
+from app.tts.text_to_audio import process_text_to_audio
+from app.endpoints.tts_ws import ws_tts
+
+TEXT = "Hej! Det här är ett test mot den lokala servern."
+
+async def test_protocol_roundtrip(fake_elevenlabs, mock_websocket):
+    """Testar att pipelinen pratar samma protokoll som ElevenLabs mot ersättningsservern."""
+    frames = [msg async for msg, _ in process_text_to_audio(mock_websocket, TEXT, time.perf_counter())]
+
+    session = fake_elevenlabs.sessions[0]
+    assert session.init["text"] == " "
+    assert "chunk_length_schedule" in session.init["generation_config"]
+    assert "".join(session.texts) == TEXT
+    assert session.flushed
+    assert session.output_format == "pcm_16000"
+    assert json.loads(frames[-1])["isFinal"] is True
+
+    # Alignment täcker hela texten
+    payloads = [json.loads(frame) for frame in frames[:-1]]
+    assert "".join("".join(p["alignment"]["chars"]) for p in payloads) == TEXT
+
+async def test_ws_tts_end_to_end(fake_elevenlabs, mock_websocket):
+    """Testar hela /ws/tts mot ersättningsservern: allt ljud når klienten och anslutningen stängs."""
+    fake_elevenlabs.ttfb_sec = 0.1
+    fake_elevenlabs.chunk_ms = 100
+    mock_websocket.receive_text = AsyncMock(return_value=json.dumps({"text": TEXT}))
+
+    await ws_tts(mock_websocket)
+
+    session = fake_elevenlabs.sessions[0]
+    sent = sum(len(call.args[0]) for call in mock_websocket.send_bytes.call_args_list)
+    assert sent == session.audio_bytes_sent > 0
+    assert len(mock_websocket.send_bytes.call_args_list) == session.frames_sent
+
+    done = [json.loads(c.args[0]) for c in mock_websocket.send_text.call_args_list]
+    done = next(msg for msg in done if msg.get("stage") == "done")
+    assert done["audio_bytes_total"] == sent
+    assert done["timings"]["stage_ms"]["init_sent->first_upstream_frame"] >= 100
+
+    await asyncio.sleep(0.05)
+    assert fake_elevenlabs.active_connections == 0
+
+async def test_realtime_factor_paces_chunks(fake_elevenlabs, mock_websocket):
+    """Testar att realtidsfaktorn styr hur snabbt ljudet levereras."""
+    fake_elevenlabs.ttfb_sec = 0
+    fake_elevenlabs.rtf = 0.5
+    fake_elevenlabs.chunk_ms = 200
+    fake_elevenlabs.chars_per_sec = 20  # 10 tecken = 0.5 s ljud
+
+    started = time.perf_counter()
+    async for _ in process_text_to_audio(mock_websocket, "0123456789", time.perf_counter()):
+        pass
+    elapsed = time.perf_counter() - started
+
+    # 0.5 s ljud i 200 ms-chunkar: två pauser på 0.1 s innan sista chunken
+    assert fake_elevenlabs.sessions[0].frames_sent == 3
+    assert 0.2 <= elapsed < 0.6
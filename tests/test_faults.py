@@ -0,0 +1,67 @@
+import pytest
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, patch
+from app.config import settings
+from app.endpoints.tts_ws import ws_tts
+from app.tts.metrics import ACTIVE_SESSIONS, ERRORS, UPSTREAM_CONNECTIONS
+from app.tts.model_selector import model_selector
+from app.tts.quota import quota_manager
+from app.tts.scheduler import scheduler
+from app.tts.voice_profiles import load_voice_profiles
+from tests.utils.fault_injection import FaultyElevenLabsServer, load_scenarios
+
+SCENARIOS = load_scenarios()
+TEXT = "Första meningen är här. Andra meningen kommer sen. Tredje meningen avslutar."
+
+@pytest.mark.parametrize("name", sorted(SCENARIOS))
+async def test_fault_scenario(name, mock_websocket):
+    """Testar att /ws/tts håller tidsgränsen, ger rätt utfall och städar upp vid varje fel."""
+    scenario = SCENARIOS[name]
+    expect = scenario.expect
+    tasks_before = asyncio.all_tasks()
+    errors_before = dict(ERRORS.values)
+    server = FaultyElevenLabsServer(scenario, chunk_ms=200)
+    await server.start()
+    profiles = load_voice_profiles("", (m for m, _ in model_selector.candidates), base_url=server.url)
+    mock_websocket.receive_text = AsyncMock(return_value=json.dumps({"text": TEXT}))
+
+    try:
+        with patch.dict('app.tts.text_to_audio.voice_profiles', profiles), \
+                patch.object(settings, "UPSTREAM_OPEN_TIMEOUT_SEC", 0.5), \
+                patch.object(settings, "UPSTREAM_INACTIVITY_TIMEOUT_SEC", 0.5), \
+                patch.object(settings, "UPSTREAM_CLOSE_TIMEOUT_SEC", 0.2):
+            started = time.perf_counter()
+            await asyncio.wait_for(ws_tts(mock_websocket), timeout=expect["max_session_sec"] + 2)
+            elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.05)
+
+        # Tidsgräns och utfall
+        assert elapsed < expect["max_session_sec"], f"{name}: {elapsed:.2f}s"
+        sent = [json.loads(c.args[0]) for c in mock_websocket.send_text.call_args_list]
+        errors = [msg for msg in sent if msg.get("type") == "error"]
+        done = [msg for msg in sent if msg.get("stage") == "done"]
+        if expect["outcome"] == "done":
+            assert done and not errors
+            assert done[0]["audio_bytes_total"] > 0
+        else:
+            assert errors
+        assert len(server.sessions) == expect["connections"]
+        # Varje fel räknas exakt en gång i tts_errors
+        error_delta = {k: v - errors_before.get(k, 0) for k, v in ERRORS.values.items() if v != errors_before.get(k, 0)}
+        assert error_delta == expect["errors"], f"{name}: {error_delta}"
+        assert server.injected
+
+        # Städning: inga öppna anslutningar, platser, kvotströmmar eller mätare kvar
+        assert server.active_connections == 0
+        assert UPSTREAM_CONNECTIONS.value == 0
+        assert ACTIVE_SESSIONS.value == 0
+        assert scheduler.snapshot()["slots_in_use"] == 0
+        assert all(key["open_streams"] == 0 for key in quota_manager.snapshot()["keys"])
+    finally:
+        await server.stop()
+
+    # Inga kvarglömda tasks när servern är stängd
+    leaked = asyncio.all_tasks() - tasks_before - {asyncio.current_task()}
+    assert not leaked, leaked
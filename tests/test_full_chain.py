@@ -10,6 +10,8 @@ from app.tts.receive_text_from_frontend import receive_and_validate_text
 from app.tts.text_to_audio import process_text_to_audio
 from app.tts.send_audio_to_frontend import send_audio_to_frontend
 from tests.utils.pcm_to_wav import pcm_to_wav
+from app.audio_catalog import audio_catalog
+from app.tts.voice_profiles import DEFAULT_PROFILE
 
 def test_full_chain_with_real_elevenlabs():
     """Testar HELA kedjan från frontend till audio-fil som skickas till frontend."""
@@ -40,7 +42,7 @@ def test_full_chain_with_real_elevenlabs():
         
         # 3. Skicka text till ElevenLabs (andra steget i kedjan)
         print("\n🎵 STEG 2: Ansluter till ElevenLabs API")
-        started_at = time.time()
+        started_at = time.perf_counter()
         
         audio_chunks = []
         audio_bytes_total = 0
@@ -112,7 +114,7 @@ def test_full_chain_with_real_elevenlabs():
         
         if all_audio_data:
             # Skapa output-filer
-            output_dir = "test_output"
+            output_dir = audio_catalog.audio_dir
             os.makedirs(output_dir, exist_ok=True)
             
             timestamp = time.strftime("%Y%m%d_%H%M%S")
@@ -135,6 +137,11 @@ def test_full_chain_with_real_elevenlabs():
                 print(f"⚠️  Kunde inte konvertera till WAV: {e}")
                 wav_path = None
             
+            # Registrera filerna i ljudkatalogen så att audio viewer hittar dem direkt
+            for path in (pcm_file, wav_path):
+                if path:
+                    audio_catalog.register(str(path), text=test_text, voice=DEFAULT_PROFILE)
+            
             print(f"🌐 Öppna i webbläsaren för att spela upp:")
             print(f"   http://localhost:8080/api/audio-files")
             print(f"   Eller på Render: https://din-app.onrender.com/api/audio-files")
@@ -154,7 +161,7 @@ def test_full_chain_with_real_elevenlabs():
         print("✅ Audio skickades till frontend")
         
         # 7. Sammanfattning
-        elapsed_time = time.time() - started_at
+        elapsed_time = time.perf_counter() - started_at
         print(f"\n🎯 HELA KEDJAN KLAR!")
         print(f"⏱️  Total tid: {elapsed_time:.2f} sekunder")
         print(f"📊 Resultat: {len(audio_chunks)} chunks, {len(all_audio_data)} bytes")
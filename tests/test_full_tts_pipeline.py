@@ -12,7 +12,7 @@ def test_full_pipeline_with_mock_elevenlabs(mock_websocket):
     
     async def _run_test():
         test_text = "Det här är ett test av hela systemet"
-        started_at = time.time()
+        started_at = time.perf_counter()
         
         # Simulera att frontend skickar text
         mock_websocket.receive_text = AsyncMock(return_value=json.dumps({"text": test_text}))
@@ -96,7 +96,7 @@ def test_pipeline_performance(mock_websocket):
     
     async def _run_test():
         test_text = "Kort test för prestanda"
-        started_at = time.time()
+        started_at = time.perf_counter()
         
         # Simulera snabb ElevenLabs response
         with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
@@ -141,7 +141,7 @@ def test_pipeline_with_empty_response(mock_websocket):
     
     async def _run_test():
         test_text = "Test"
-        started_at = time.time()
+        started_at = time.perf_counter()
         
         with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
             mock_eleven_ws = AsyncMock()
@@ -179,7 +179,7 @@ def test_pipeline_status_messages(mock_websocket):
     
     async def _run_test():
         test_text = "Test för status-meddelanden"
-        started_at = time.time()
+        started_at = time.perf_counter()
         
         # Simulera att vi skickar status-meddelanden
         await mock_websocket.send_text(json.dumps({"type": "status", "stage": "ready"}))
@@ -0,0 +1,184 @@
+import pytest
+import asyncio
+from app.tts.hedging import HedgePolicy, hedged_frames
+
+def _policy(**overrides):
+    kwargs = dict(enabled=True, percentile=95, min_delay_sec=0.01, max_delay_sec=0.05, max_rate=1.0)
+    kwargs.update(overrides)
+    return HedgePolicy(**kwargs)
+
+class _Attempt:
+    def __init__(self, name, first_audio_delay, fail=False, empty=False):
+        self.name = name
+        self.first_audio_delay = first_audio_delay
+        self.fail = fail
+        self.empty = empty
+        self.cancelled = False
+
+async def _frames(attempt):
+    """Simulerad uppströmsström: ett start-event, ljud efter en fördröjning, sedan final (server_msg, is_audio, voiced_chars)."""
+    try:
+        yield f'{{"event": "start", "from": "{attempt.name}"}}', False, 0
+        await asyncio.sleep(attempt.first_audio_delay)
+        if attempt.fail:
+            raise ConnectionError("upstream dropped")
+        if attempt.empty:
+            return  # T.ex. inaktivitets-timeout: strömmen tar slut utan ljud
+        yield attempt.name.encode(), True, len(attempt.name)
+        yield '{"isFinal": true}', False, 0
+    except asyncio.CancelledError:
+        attempt.cancelled = True
+        raise
+
+async def _collect(policy, primary, hedge):
+    started = []
+
+    def start_hedge():
+        if hedge is None:
+            return None
+        started.append(hedge)
+        return hedge
+
+    items = [msg async for msg, _, _ in hedged_frames(policy, primary, _frames, start_hedge)]
+    return items, started
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    """Testar att ingen hedge startas när primär ström ger ljud i tid."""
+    policy = _policy()
+    primary = _Attempt("primary", 0)
+    hedge = _Attempt("hedge", 0)
+
+    items, started = await _collect(policy, primary, hedge)
+
+    assert b"primary" in items
+    assert started == []
+    assert policy.primary_wins == 1
+    assert policy.hedges_started == 0
+
+@pytest.mark.asyncio
+async def test_slow_primary_loses_to_hedge():
+    """Testar att hedge vinner och att primär ström avbryts när den är långsam."""
+    policy = _policy()
+    primary = _Attempt("primary", 1.0)
+    hedge = _Attempt("hedge", 0)
+
+    items, started = await _collect(policy, primary, hedge)
+
+    assert b"hedge" in items
+    assert b"primary" not in items
+    assert started == [hedge]
+    assert primary.cancelled
+    assert policy.hedge_wins == 1
+    assert policy.snapshot()["hedges_started"] == 1
+
+@pytest.mark.asyncio
+async def test_failed_primary_falls_back_to_hedge():
+    """Testar att ett fel i primär ström före ljud inte avbryter sessionen när hedge lever."""
+    policy = _policy()
+    primary = _Attempt("primary", 0.1, fail=True)
+    hedge = _Attempt("hedge", 0.2)
+
+    items, _ = await _collect(policy, primary, hedge)
+
+    assert b"hedge" in items
+    assert policy.hedge_wins == 1
+
+@pytest.mark.asyncio
+async def test_primary_ending_without_audio_falls_back_to_hedge():
+    """Testar att en primär ström som tar slut utan ljud inte vinner över en levande hedge."""
+    policy = _policy()
+    primary = _Attempt("primary", 0.1, empty=True)
+    hedge = _Attempt("hedge", 0.2)
+
+    items, started = await _collect(policy, primary, hedge)
+
+    assert started == [hedge]
+    assert b"hedge" in items
+    assert not hedge.cancelled
+    assert policy.hedge_wins == 1 and policy.primary_wins == 0
+
+@pytest.mark.asyncio
+async def test_hedge_skipped_without_quota():
+    """Testar att sessionen fortsätter på primär ström när hedge inte får kvot."""
+    policy = _policy()
+    primary = _Attempt("primary", 0.1)
+
+    items, _ = await _collect(policy, primary, None)
+
+    assert b"primary" in items
+    assert policy.hedges_skipped == 1
+    assert policy.primary_wins == 1
+
+def test_delay_uses_percentile_within_bounds():
+    """Testar att fördröjningen följer percentilen och begränsas till min/max."""
+    policy = _policy(min_delay_sec=0.1, max_delay_sec=1.0, percentile=90)
+    assert policy.delay() == 1.0  # För få mätningar → max
+
+    for i in range(100):
+        policy.observe_first_audio(i / 100)
+    assert policy.delay() == pytest.approx(0.9)
+
+    policy = _policy(min_delay_sec=0.1, max_delay_sec=1.0)
+    for _ in range(50):
+        policy.observe_first_audio(0.01)
+    assert policy.delay() == 0.1
+
+def test_hedge_rate_is_bounded():
+    """Testar att andelen hedgade sessioner begränsas."""
+    policy = _policy(max_rate=0.1)
+    policy.sessions = 10
+    assert policy.allow_hedge()
+    policy.hedges_started = 1
+    assert not policy.allow_hedge()
+
+async def test_hedge_needs_free_upstream_slot(fake_elevenlabs, mock_websocket):
+    """Testar att en hedge hoppas över när alla uppströmsplatser är upptagna."""
+    from unittest.mock import patch
+    from app.tts.scheduler import PriorityScheduler
+    from app.tts.text_to_audio import process_text_to_audio
+
+    fake_elevenlabs.ttfb_sec = 0.2
+    policy = _policy(max_delay_sec=0.02)
+    slots = PriorityScheduler(max_slots=1, bulk_min_share=0.1)
+    with patch('app.tts.text_to_audio.scheduler', slots), patch('app.tts.text_to_audio.hedge_policy', policy):
+        async for _ in process_text_to_audio(mock_websocket, "Hej hedge.", asyncio.get_running_loop().time()):
+            assert slots.snapshot()["slots_in_use"] <= 1
+
+    assert policy.hedges_skipped == 1 and policy.hedges_started == 0
+    assert len(fake_elevenlabs.sessions) == 1
+    assert slots.snapshot()["slots_in_use"] == 0
+
+async def test_hedge_slot_released_after_session(fake_elevenlabs, mock_websocket):
+    """Testar att hedgen tar en egen uppströmsplats och att förloraren lämnar tillbaka sin direkt."""
+    from unittest.mock import patch
+    from app.tts.quota import QuotaManager
+    from app.tts.scheduler import PriorityScheduler
+    from app.tts.text_to_audio import process_text_to_audio
+
+    fake_elevenlabs.ttfb_sec = 0.2
+    policy = _policy(max_delay_sec=0.02)
+    slots = PriorityScheduler(max_slots=2, bulk_min_share=0.1)
+    quota = QuotaManager(["key-aaaa"], chars_per_period=0, period_sec=60, max_streams_per_key=0, max_wait_sec=1)
+    try_slot = slots.try_slot
+    at_hedge_start = []
+
+    def _try_slot(priority):
+        granted = try_slot(priority)
+        at_hedge_start.append(slots.snapshot()["slots_in_use"])
+        return granted
+
+    in_use, open_streams = [], []
+    with patch('app.tts.text_to_audio.scheduler', slots), patch('app.tts.text_to_audio.hedge_policy', policy), \
+            patch('app.tts.text_to_audio.quota_manager', quota), patch.object(slots, "try_slot", _try_slot):
+        async for _ in process_text_to_audio(mock_websocket, "Hej hedge.", asyncio.get_running_loop().time()):
+            in_use.append(slots.snapshot()["slots_in_use"])
+            open_streams.append(quota.snapshot()["keys"][0]["open_streams"])
+
+    assert policy.hedges_started == 1
+    assert at_hedge_start == [2]
+    # Förloraren avbryts när vinnaren valts; redan första ramen ser bara en plats och en ström
+    assert in_use and max(in_use) == 1
+    assert max(open_streams) == 1
+    assert slots.snapshot()["slots_in_use"] == 0
+    assert quota.snapshot()["keys"][0]["open_streams"] == 0
@@ -0,0 +1,50 @@
+import pytest
+import asyncio
+import os
+import uvicorn
+from app.main import app
+from tools.loadgen import compare, percentile, run_load, _free_port
+
+def test_percentile_interpolates():
+    """Testar percentiler med linjär interpolation."""
+    values = [0.1, 0.2, 0.3, 0.4, 0.5]
+    assert percentile(values, 50) == 0.3
+    assert percentile(values, 100) == 0.5
+    assert percentile(values, 95) == pytest.approx(0.48)
+    assert percentile([], 50) is None
+
+def test_compare_flags_regressions():
+    """Testar att jämförelsen markerar försämringar åt rätt håll per nyckeltal."""
+    baseline = {"time_to_first_audio": {"p95_ms": 100.0}, "throughput_audio_sec_per_sec": 10.0, "errors": 0}
+    current = {"time_to_first_audio": {"p95_ms": 150.0}, "throughput_audio_sec_per_sec": 12.0, "errors": 0}
+    lines = compare(baseline, current)
+    assert any(line.startswith("⚠️") and "p95_ms" in line for line in lines)
+    assert any(line.startswith("✅") and "throughput" in line for line in lines)
+
+@pytest.mark.filterwarnings("ignore:remove second argument of ws_handler:DeprecationWarning")
+async def test_run_load_against_app(fake_elevenlabs):
+    """Testar lastgeneratorn mot appen (uvicorn i samma process) och ElevenLabs-ersättningen."""
+    fake_elevenlabs.chunk_ms = 100
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    try:
+        while not server.started:
+            await asyncio.sleep(0.02)
+        report = await run_load(
+            f"ws://127.0.0.1:{port}/ws/tts", sessions=6, rate=50, concurrency=3, server_pid=os.getpid(), timeout_sec=10
+        )
+    finally:
+        server.should_exit = True
+        await serve_task
+
+    assert report["outcomes"] == {"done": 6}
+    assert report["errors"] == 0
+    assert report["time_to_first_audio"]["count"] == 6
+    assert report["time_to_first_audio"]["p50_ms"] <= report["time_to_first_audio"]["p99_ms"]
+    assert report["inter_chunk_gap"]["count"] > 0
+    assert report["throughput_audio_sec_per_sec"] > 0
+    assert sum(s["audio_bytes"] for s in report["per_session"]) == sum(
+        s.audio_bytes_sent for s in fake_elevenlabs.sessions
+    )
+    assert report["server"]["rss_peak_mb"] > 0
@@ -0,0 +1,71 @@
+import pytest
+import io
+import json
+import logging
+from app.logging_config import LogSampler, JsonFormatter, configure_logging, parse_logger_levels, stop_logging
+
+@pytest.fixture
+def restore_logging():
+    """Återställ rotloggern efter tester som konfigurerar om loggningen."""
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    stop_logging()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+def test_log_sampler():
+    """Testar att var N:te händelse släpps igenom och att 0 stänger av."""
+    sampler = LogSampler(3)
+    assert [sampler.sample() for _ in range(6)] == [False, False, True, False, False, True]
+    assert not any(LogSampler(0).sample() for _ in range(5))
+    assert all(LogSampler(1).sample() for _ in range(5))
+
+def test_parse_logger_levels():
+    """Testar tolkning av nivå per logger."""
+    assert parse_logger_levels("websockets=warning, app=DEBUG") == {"websockets": logging.WARNING, "app": logging.DEBUG}
+    assert parse_logger_levels("") == {}
+    with pytest.raises(ValueError):
+        parse_logger_levels("app=LOUD")
+
+def test_json_formatter_includes_extra_fields():
+    """Testar att JSON-loggen innehåller meddelande och extra-fält."""
+    record = logging.LogRecord("stefan-api-test-3", logging.INFO, __file__, 1, "Session %s", ("klar",), None)
+    record.audio_bytes_total = 42
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["msg"] == "Session klar"
+    assert entry["level"] == "INFO"
+    assert entry["audio_bytes_total"] == 42
+
+def test_queue_logging_writes_json(restore_logging):
+    """Testar att kö-baserad loggning skriver JSON-rader och respekterar nivå per logger."""
+    stream = io.StringIO()
+    configure_logging(level="DEBUG", fmt="json", logger_levels="tyst=ERROR", use_queue=True, stream=stream)
+    logging.getLogger("stefan-api-test-3").info("Hej %d", 1, extra={"session": "abc"})
+    logging.getLogger("tyst").warning("Syns inte")
+    stop_logging()  # Tömmer kön
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(lines) == 1
+    assert lines[0]["msg"] == "Hej 1"
+    assert lines[0]["session"] == "abc"
+
+@pytest.mark.parametrize("fmt", ["json", "text"])
+def test_queue_logging_keeps_exception(restore_logging, fmt):
+    """Testar att undantag via kön hamnar i "exc" (JSON) och att textformatet fortfarande visar tracebacken."""
+    stream = io.StringIO()
+    configure_logging(level="INFO", fmt=fmt, logger_levels="", use_queue=True, stream=stream)
+    try:
+        raise ValueError("trasig ram")
+    except ValueError:
+        logging.getLogger("stefan-api-test-3").exception("Stream failed for %s", "abc")
+    stop_logging()
+
+    output = stream.getvalue()
+    if fmt == "json":
+        entry = json.loads(output)
+        assert entry["msg"] == "Stream failed for abc"
+        assert "ValueError: trasig ram" in entry["exc"]
+    else:
+        assert "Stream failed for abc" in output
+        assert output.count("ValueError: trasig ram") == 1
@@ -0,0 +1,59 @@
+import pytest
+import asyncio
+import time
+from unittest.mock import patch
+from app.tts.loop_monitor import LoopLagMonitor
+from app.endpoints.tts_ws import ws_tts
+
+def _block_loop(seconds):
+    """Blockerar event-loopen som ett synkront anrop skulle göra."""
+    time.sleep(seconds)
+
+def test_shedding_hysteresis():
+    """Testar att shedding slås på över gränsen och av först under halva gränsen."""
+    monitor = LoopLagMonitor(interval_sec=0.1, stall_sec=0.25, shed_sec=0.1, alpha=1.0)
+    monitor.observe(0.01)
+    assert not monitor.should_shed()
+    monitor.observe(0.2)
+    assert monitor.should_shed()
+    monitor.observe(0.07)
+    assert monitor.should_shed()  # Fortfarande över halva gränsen
+    monitor.observe(0.02)
+    assert not monitor.should_shed()
+    assert monitor.shed_total == 2
+
+def test_shedding_disabled_by_default():
+    """Testar att shed_sec 0 aldrig avvisar sessioner."""
+    monitor = LoopLagMonitor(interval_sec=0.1, stall_sec=0.25, shed_sec=0, alpha=1.0)
+    monitor.observe(5.0)
+    assert not monitor.should_shed()
+
+def test_stall_captures_blocking_stack():
+    """Testar att en blockerad loop mäts och att den blockerande koden syns i stacken."""
+
+    async def _run_test():
+        monitor = LoopLagMonitor(interval_sec=0.02, stall_sec=0.05, shed_sec=0)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            _block_loop(0.3)
+            await asyncio.sleep(0.1)
+        finally:
+            await monitor.stop()
+
+        assert monitor.lag_max >= 0.2
+        assert monitor.stalls
+        assert any("_block_loop" in line for line in monitor.stalls[0]["stack"])
+
+    asyncio.run(_run_test())
+
+@pytest.mark.asyncio
+async def test_ws_tts_sheds_when_loop_lags(mock_websocket):
+    """Testar att /ws/tts avvisar nya sessioner med 1013 medan loopen ligger efter."""
+    monitor = LoopLagMonitor(interval_sec=0.1, stall_sec=0.25, shed_sec=0.1, alpha=1.0)
+    monitor.observe(0.5)
+    with patch('app.endpoints.tts_ws.loop_monitor', monitor):
+        await ws_tts(mock_websocket)
+
+    mock_websocket.close.assert_called_once_with(code=1013)
+    mock_websocket.receive_text.assert_not_called()
@@ -0,0 +1,58 @@
+import pytest
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
+from app.tts.metrics import Histogram, Counter, MetricsRegistry, registry, ERRORS, ACTIVE_SESSIONS
+from app.endpoints.tts_ws import ws_tts
+
+def test_histogram_buckets_are_cumulative():
+    """Testar att histogrammet följer Prometheus le-semantik och summerar kumulativt."""
+    hist = Histogram("test_seconds", "test", (0.1, 0.5, 1.0))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        hist.observe(value)
+
+    buckets = {labels[0][1]: value for name, labels, value in hist.samples() if name.endswith("_bucket")}
+    assert buckets == {"0.1": 2, "0.5": 3, "1": 3, "+Inf": 4}
+    assert hist.count == 4
+    assert hist.sum == pytest.approx(2.45)
+
+def test_render_text_format():
+    """Testar att registryt renderas i Prometheus textformat."""
+    reg = MetricsRegistry()
+    errors = reg.register(Counter("test_errors", "Errors", label="type", initial_labels=("a",)))
+    errors.labels_inc("b", 2)
+
+    text = reg.render()
+    assert "# TYPE test_errors counter" in text
+    assert 'test_errors_total{type="a"} 0' in text
+    assert 'test_errors_total{type="b"} 2' in text
+    assert text.endswith("\n")
+
+def test_ws_session_is_instrumented(mock_websocket):
+    """Testar att en hel session ger TTFB, glapp, längd, bytes och nollställda mätare."""
+
+    async def _run_test():
+        registry.reset()
+        mock_websocket.receive_text = AsyncMock(return_value=json.dumps({"text": "Hej"}))
+        with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
+            mock_eleven_ws = AsyncMock()
+            mock_connect.return_value.__aenter__.return_value = mock_eleven_ws
+            mock_eleven_ws.recv = AsyncMock(side_effect=[
+                '{"audio": "dGVzdF9hdWRpbw=="}',
+                '{"audio": "bW9yZV9hdWRpbw=="}',
+                '{"isFinal": true}',
+            ])
+            await ws_tts(mock_websocket)
+
+        text = registry.render()
+        assert "tts_upstream_connect_seconds_count 1" in text
+        assert "tts_time_to_first_audio_seconds_count 1" in text
+        assert "tts_inter_chunk_gap_seconds_count 1" in text
+        assert "tts_session_duration_seconds_count 1" in text
+        assert "tts_session_audio_bytes_sum 20" in text
+        assert "tts_sessions_total 1" in text
+        assert ACTIVE_SESSIONS.value == 0
+        assert "tts_upstream_connections 0" in text
+        assert all(count == 0 for count in ERRORS.values.values())
+
+    asyncio.run(_run_test())
@@ -0,0 +1,69 @@
+from app.tts.model_selector import ModelSelector, parse_model_candidates
+
+VOICE = "voice-1"
+
+def _selector(**overrides):
+    kwargs = dict(
+        candidates=[("flash", 1), ("turbo", 2), ("multilingual", 3)],
+        min_quality_tier=1,
+        slo_sec=1.0,
+        percentile=90,
+        window_sec=300,
+        min_samples=3,
+    )
+    kwargs.update(overrides)
+    return ModelSelector(**kwargs)
+
+def _observe(selector, model_id, seconds, n=5):
+    for _ in range(n):
+        selector.observe(model_id, VOICE, seconds)
+
+def test_parse_model_candidates():
+    """Testar att kandidatlistan tolkas med kvalitetsnivåer."""
+    assert parse_model_candidates("a:1, b:3,c") == [("a", 1), ("b", 3), ("c", 1)]
+
+def test_primary_used_while_within_slo():
+    """Testar att primär modell används så länge den håller SLO:n."""
+    selector = _selector()
+    assert selector.select(VOICE) == "flash"
+
+    _observe(selector, "flash", 0.4)
+    assert selector.select(VOICE) == "flash"
+    assert selector.snapshot()["recent_decisions"][-1]["reason"] == "primary-within-slo"
+
+def test_falls_back_to_fastest_healthy_model():
+    """Testar att den snabbaste modellen inom SLO:n väljs när primär bryter den."""
+    selector = _selector()
+    _observe(selector, "flash", 2.5)
+    _observe(selector, "turbo", 0.9)
+    _observe(selector, "multilingual", 0.6)
+
+    assert selector.select(VOICE) == "multilingual"
+    assert selector.snapshot()["selected_total"]["multilingual"] == 1
+
+def test_quality_tier_limits_fallback():
+    """Testar att reservmodeller under lägsta kvalitetsnivå inte väljs."""
+    selector = _selector(min_quality_tier=3)
+    _observe(selector, "flash", 2.5)
+    _observe(selector, "turbo", 0.2)
+
+    assert selector.select(VOICE) == "multilingual"  # Ingen data än, men rätt nivå
+
+def test_all_breaching_picks_fastest():
+    """Testar att den snabbaste modellen väljs när alla bryter SLO:n."""
+    selector = _selector()
+    _observe(selector, "flash", 3.0)
+    _observe(selector, "turbo", 1.5)
+    _observe(selector, "multilingual", 2.0)
+
+    assert selector.select(VOICE) == "turbo"
+
+def test_stale_samples_expire():
+    """Testar att gamla mätningar glöms så att primär modell prövas igen."""
+    selector = _selector(window_sec=0)
+    _observe(selector, "flash", 3.0)
+
+    assert selector.select(VOICE) == "flash"
+    latency = selector.snapshot()["latency"][0]
+    assert latency["samples"] == 0
+    assert not latency["breaching_slo"]
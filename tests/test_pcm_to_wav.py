@@ -0,0 +1,56 @@
+import pytest
+import os
+import time
+import wave
+from tests.utils.pcm_to_wav import convert_directory, convert_file, pcm_to_wav
+
+def _write_pcm(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+def _read_wav(path):
+    with wave.open(str(path), "rb") as w:
+        return w.getframerate(), w.getnchannels(), w.readframes(w.getnframes())
+
+def test_streams_in_chunks_and_drops_partial_frame(tmp_path):
+    """Testar att små bitar ger samma WAV och att en ofullständig sista sample inte tas med."""
+    data = bytes(range(256)) * 40 + b"\x01"  # Udda antal bytes
+    pcm = _write_pcm(tmp_path / "a.pcm", data)
+
+    assert convert_file(pcm, str(tmp_path / "small.wav"), 22050, chunk_size=7) == len(data) - 1
+    assert _read_wav(tmp_path / "small.wav") == (22050, 1, data[:-1])
+
+    wav = pcm_to_wav(pcm)
+    assert wav == tmp_path / "a.wav"  # Path som tidigare, så .name och / fungerar för anropare
+    assert _read_wav(wav)[2] == data[:-1]
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_missing_file_raises(tmp_path):
+    """Testar att en saknad PCM-fil ger FileNotFoundError utan att lämna en WAV."""
+    with pytest.raises(FileNotFoundError):
+        pcm_to_wav(str(tmp_path / "nope.pcm"))
+    assert not list(tmp_path.iterdir())
+
+def test_batch_converts_directory_and_skips_up_to_date(tmp_path):
+    """Testar katalogläget: alla filer konverteras, aktuella hoppas över och ändrade görs om."""
+    src, out = tmp_path / "pcm", tmp_path / "wav"
+    src.mkdir()
+    for i in range(3):
+        _write_pcm(src / f"f{i}.pcm", bytes([i]) * 3200)
+
+    first = convert_directory(str(src), str(out), workers=2)
+    assert (first["converted"], first["skipped"], first["failed"]) == (3, 0, [])
+    assert first["bytes"] == 9600 and first["mb_per_sec"] > 0
+    assert _read_wav(out / "f1.wav")[2] == b"\1" * 3200
+
+    assert convert_directory(str(src), str(out), workers=2)["skipped"] == 3
+
+    later = time.time() + 10
+    _write_pcm(src / "f2.pcm", b"\7" * 1600)
+    os.utime(src / "f2.pcm", (later, later))
+    again = convert_directory(str(src), str(out), workers=2)
+    assert (again["converted"], again["skipped"]) == (1, 2)
+    assert _read_wav(out / "f2.wav")[2] == b"\7" * 1600
+
+    assert convert_directory(str(src), str(out), workers=1, force=True)["converted"] == 3
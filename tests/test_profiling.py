@@ -0,0 +1,99 @@
+import pytest
+import asyncio
+import time
+from unittest.mock import patch
+from fastapi import HTTPException
+from app.profiling import SamplingProfiler, ProfilerBusyError, profile, allocation_snapshot
+from app.endpoints.admin import run_profiler
+
+def _busy_loop(seconds):
+    """Håller event-loopen sysselsatt med CPU-arbete."""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+@pytest.mark.parametrize("mode", ["wall", "cpu"])
+def test_profiler_attributes_time_to_task(mode):
+    """Testar att stackar samlas i collapsed-format med asyncio-tasken som rotram."""
+
+    async def _run_test():
+        async def worker():
+            await asyncio.sleep(0.02)
+            _busy_loop(0.3)
+
+        task = asyncio.create_task(worker(), name="tts-session")
+        profiler = await asyncio.gather(profile(mode, 0.25, 0.005), task)
+        return profiler[0]
+
+    profiler = asyncio.run(_run_test())
+    lines = profiler.collapsed().splitlines()
+    assert profiler.samples > 0
+    assert any(line.startswith("task:tts-session;") and "_busy_loop" in line for line in lines)
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+def test_profiler_finds_task_without_private_asyncio_state():
+    """Testar att tasken hittas via asyncio.all_tasks när asyncios interna dict saknas."""
+
+    async def _run_test():
+        async def worker():
+            await asyncio.sleep(0.02)
+            _busy_loop(0.3)
+
+        task = asyncio.create_task(worker(), name="tts-session")
+        profiler = await asyncio.gather(profile("wall", 0.25, 0.005), task)
+        return profiler[0]
+
+    with patch("app.profiling._current_tasks", None):
+        profiler = asyncio.run(_run_test())
+    lines = profiler.collapsed().splitlines()
+    assert any(line.startswith("task:tts-session;") and "_busy_loop" in line for line in lines)
+
+def test_profiler_rejects_bad_mode():
+    """Testar att okänt läge avvisas."""
+    with pytest.raises(ValueError):
+        SamplingProfiler("heap")
+
+def test_only_one_profile_at_a_time():
+    """Testar att en andra profilering samtidigt avvisas."""
+
+    async def _run_test():
+        first = asyncio.create_task(profile("wall", 0.1, 0.01))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ProfilerBusyError):
+            await allocation_snapshot(0.01)
+        await first
+
+    asyncio.run(_run_test())
+
+def test_allocation_snapshot_reports_growth():
+    """Testar att tracemalloc-jämförelsen visar var minnet allokerades."""
+
+    async def _run_test():
+        holder = []
+
+        async def allocate():
+            await asyncio.sleep(0.01)
+            holder.append([bytearray(1024) for _ in range(200)])
+
+        result, _ = await asyncio.gather(allocation_snapshot(0.05, top=5), allocate())
+        return result
+
+    result = asyncio.run(_run_test())
+    assert len(result["top"]) <= 5
+    assert any("test_profiling.py" in entry["location"][0] for entry in result["top"])
+
+@pytest.mark.asyncio
+async def test_admin_endpoint_requires_token():
+    """Testar att admin-endpointen är avstängd utan token och kräver rätt token."""
+    with pytest.raises(HTTPException) as exc:
+        await run_profiler(mode="wall", seconds=0.01, interval_ms=10, x_admin_token="x")
+    assert exc.value.status_code == 404
+
+    with patch('app.endpoints.admin.settings.ADMIN_TOKEN', "hemlig"):
+        with pytest.raises(HTTPException) as exc:
+            await run_profiler(mode="wall", seconds=0.01, interval_ms=10, x_admin_token="fel")
+        assert exc.value.status_code == 401
+
+        response = await run_profiler(mode="wall", seconds=0.05, interval_ms=10, x_admin_token="hemlig")
+        assert response.headers["X-Profile-Mode"] == "wall"
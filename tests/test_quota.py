@@ -0,0 +1,82 @@
+import pytest
+import asyncio
+from app.tts.quota import QuotaManager, QuotaExceededError
+
+def _manager(**overrides):
+    kwargs = dict(
+        api_keys=["key-aaaa", "key-bbbb"],
+        chars_per_period=100,
+        period_sec=60,
+        max_streams_per_key=1,
+        max_wait_sec=0.2,
+    )
+    kwargs.update(overrides)
+    return QuotaManager(**kwargs)
+
+@pytest.mark.asyncio
+async def test_least_loaded_key_selected():
+    """Testar att förfrågningar sprids till den minst belastade nyckeln."""
+    manager = _manager()
+
+    first = await manager.acquire(10)
+    second = await manager.acquire(10)
+
+    assert {first.api_key, second.api_key} == {"key-aaaa", "key-bbbb"}
+
+@pytest.mark.asyncio
+async def test_waits_for_stream_release():
+    """Testar att en förfrågan väntar tills en ström lämnas tillbaka."""
+    manager = _manager(api_keys=["key-aaaa"], max_wait_sec=1.0)
+    lease = await manager.acquire(10)
+
+    waiter = asyncio.create_task(manager.acquire(10))
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    lease.release()
+    second = await asyncio.wait_for(waiter, timeout=0.5)
+    assert second.api_key == "key-aaaa"
+
+@pytest.mark.asyncio
+async def test_rejects_when_chars_exhausted():
+    """Testar att förfrågan avvisas direkt när teckenbudgeten inte hinner fyllas på."""
+    manager = _manager(api_keys=["key-aaaa"], max_streams_per_key=0)
+    (await manager.acquire(90)).release()
+
+    with pytest.raises(QuotaExceededError):
+        await manager.acquire(50)
+    assert manager.snapshot()["rejected"] == 1
+
+@pytest.mark.asyncio
+async def test_text_larger_than_budget_rejected():
+    """Testar att text som aldrig ryms i kvoten avvisas."""
+    manager = _manager()
+    with pytest.raises(QuotaExceededError):
+        await manager.acquire(1000)
+
+def test_snapshot_masks_keys():
+    """Testar att nycklar maskeras och kvarvarande budget visas."""
+    manager = _manager(api_keys=["secret-key-1234"])
+    lease = manager.try_acquire(30)
+
+    snapshot = manager.snapshot()
+    key = snapshot["keys"][0]
+    assert key["key"] == "…1234"
+    assert key["chars_remaining"] == 70
+    assert key["open_streams"] == 1
+    assert key["streams_remaining"] == 0
+
+    lease.release()
+    assert manager.snapshot()["keys"][0]["open_streams"] == 0
+
+def test_charge_draws_from_same_key():
+    """Testar att omskickad text dras från samma nyckel utan att öppna en ny ström."""
+    manager = _manager(api_keys=["key-aaaa"], period_sec=1e9)
+    lease = manager.try_acquire(30)
+    lease.charge(20)
+
+    key = manager.snapshot()["keys"][0]
+    assert key["chars_used"] == 50
+    assert key["chars_remaining"] == 50
+    assert key["open_streams"] == 1
+    assert lease.chars == 50
@@ -8,6 +8,8 @@ from pathlib import Path
 from unittest.mock import AsyncMock
 from app.tts.text_to_audio import process_text_to_audio
 from tests.utils.pcm_to_wav import pcm_to_wav
+from app.audio_catalog import audio_catalog
+from app.tts.voice_profiles import DEFAULT_PROFILE
 
 def test_real_elevenlabs_pipeline():
     """Testar ElevenLabs API med riktig anslutning."""
@@ -74,7 +76,7 @@ def test_real_elevenlabs_pipeline():
         
         if all_audio_data:
             # Skapa output-filer
-            output_dir = "test_output"
+            output_dir = audio_catalog.audio_dir
             os.makedirs(output_dir, exist_ok=True)
             
             timestamp = time.strftime("%Y%m%d_%H%M%S")
@@ -96,6 +98,11 @@ def test_real_elevenlabs_pipeline():
                 print(f"⚠️  Kunde inte konvertera till WAV: {e}")
                 wav_path = None
             
+            # Registrera filerna i ljudkatalogen så att audio viewer hittar dem direkt
+            for path in (pcm_file, wav_path):
+                if path:
+                    audio_catalog.register(str(path), text=test_text, voice=DEFAULT_PROFILE)
+            
             print(f"🌐 Öppna i webbläsaren för att spela upp:")
             print(f"   http://localhost:8080/api/audio-files")
             print(f"   Eller på Render: https://din-app.onrender.com/api/audio-files")
@@ -188,7 +195,7 @@ def test_real_elevenlabs_short_text():
         
         if all_audio_data:
             # Skapa output-filer
-            output_dir = "test_output"
+            output_dir = audio_catalog.audio_dir
             os.makedirs(output_dir, exist_ok=True)
             
             timestamp = time.strftime("%Y%m%d_%H%M%S")
@@ -210,6 +217,11 @@ def test_real_elevenlabs_short_text():
                 print(f"⚠️  Kunde inte konvertera till WAV: {e}")
                 wav_path = None
             
+            # Registrera filerna i ljudkatalogen så att audio viewer hittar dem direkt
+            for path in (pcm_file, wav_path):
+                if path:
+                    audio_catalog.register(str(path), text=test_text, voice=DEFAULT_PROFILE)
+            
             print(f"🌐 Öppna i webbläsaren för att spela upp:")
             print(f"   http://localhost:8080/api/audio-files")
             print(f"   Eller på Render: https://din-app.onrender.com/api/audio-files")
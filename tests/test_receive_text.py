@@ -71,3 +71,44 @@ async def test_missing_text_field_rejected(mock_websocket):
     assert result is None
     mock_websocket.send_text.assert_called_once()
     mock_websocket.close.assert_called_once_with(code=1003)
+
+@pytest.mark.asyncio
+async def test_priority_defaults_and_validates(mock_websocket):
+    """Testar att prioritet sätts till standard och att ogiltig prioritet avvisas."""
+    mock_websocket.receive_text = AsyncMock(return_value=json.dumps({"text": "Hej", "priority": "bulk"}))
+    result = await receive_and_validate_text(mock_websocket)
+    assert result["priority"] == "bulk"
+
+    mock_websocket.receive_text = AsyncMock(return_value=json.dumps({"text": "Hej"}))
+    result = await receive_and_validate_text(mock_websocket)
+    assert result["priority"] == "standard"
+
+    mock_websocket.receive_text = AsyncMock(return_value=json.dumps({"text": "Hej", "priority": "urgent"}))
+    result = await receive_and_validate_text(mock_websocket)
+    assert result is None
+    mock_websocket.close.assert_called_once_with(code=1003)
+
+@pytest.mark.asyncio
+async def test_unknown_voice_profile_rejected(mock_websocket):
+    """Testar att okänd röstprofil avvisas och att default används annars."""
+    mock_websocket.receive_text = AsyncMock(return_value=json.dumps({"text": "Hej"}))
+    result = await receive_and_validate_text(mock_websocket)
+    assert result["voice"] == "default"
+
+    mock_websocket.receive_text = AsyncMock(return_value=json.dumps({"text": "Hej", "voice": "okänd"}))
+    result = await receive_and_validate_text(mock_websocket)
+    assert result is None
+    mock_websocket.close.assert_called_once_with(code=1003)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("field, value", [
+    ("voice", ["default"]), ("voice", {"name": "default"}), ("priority", ["bulk"]), ("priority", {"class": "bulk"}),
+])
+async def test_non_string_voice_or_priority_rejected(mock_websocket, field, value):
+    """Testar att listor och objekt som röst eller prioritet ger valideringsfel i stället för en krasch."""
+    mock_websocket.receive_text = AsyncMock(return_value=json.dumps({"text": "Hej", field: value}))
+    result = await receive_and_validate_text(mock_websocket)
+    assert result is None
+    error = json.loads(mock_websocket.send_text.call_args.args[0])
+    assert error["type"] == "error"
+    mock_websocket.close.assert_called_once_with(code=1003)
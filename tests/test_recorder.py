@@ -0,0 +1,112 @@
+import pytest
+import json
+import time
+from unittest.mock import AsyncMock, patch
+from app.endpoints.tts_ws import ws_tts
+from app.tts.model_selector import model_selector
+from app.tts.recorder import NOOP_RECORDING, list_recordings, load_recording, recorder
+from app.tts.text_to_audio import process_text_to_audio
+from app.tts.voice_profiles import load_voice_profiles
+from tests.utils.replay_elevenlabs import ReplayElevenLabsServer, load_recordings, replay_connect
+
+TEXT = "Första meningen spelas in. Andra meningen också."
+
+@pytest.fixture
+def record_dir(tmp_path, monkeypatch):
+    """Slår på inspelning till en temporär katalog."""
+    monkeypatch.setattr(recorder, "directory", str(tmp_path))
+    monkeypatch.setattr(recorder, "sample_rate", 1.0)
+    return tmp_path
+
+async def _record_session(fake_elevenlabs, mock_websocket):
+    fake_elevenlabs.ttfb_sec = 0.15
+    fake_elevenlabs.rtf = 0.2
+    fake_elevenlabs.chunk_ms = 200
+    mock_websocket.receive_text = AsyncMock(return_value=json.dumps({"text": TEXT}))
+    await ws_tts(mock_websocket)
+    await recorder.drain()
+
+def _audio_sent(mock_websocket) -> bytes:
+    return b"".join(call.args[0] for call in mock_websocket.send_bytes.call_args_list)
+
+async def test_records_upstream_frames_with_timing(record_dir, fake_elevenlabs, mock_websocket):
+    """Testar att varje uppströmsram sparas med ankomsttid räknat från flush."""
+    await _record_session(fake_elevenlabs, mock_websocket)
+
+    paths = list_recordings(str(record_dir))
+    assert len(paths) == 1
+    meta, frames = load_recording(paths[0])
+    assert meta["text"] == TEXT
+    assert meta["outcome"] == "ok"
+    assert meta["output_format"] == "pcm_16000"
+    assert meta["frames"] == len(frames) == fake_elevenlabs.sessions[0].frames_sent + 1
+    assert json.loads(frames[-1][1])["isFinal"] is True
+
+    times = [t for t, _ in frames]
+    assert times == sorted(times)
+    assert times[0] >= 0.15  # TTFB från flush
+    assert times[-1] - times[0] >= 0.1  # Realtidsfaktorn syns mellan ramarna
+
+async def test_replay_server_reproduces_session(record_dir, fake_elevenlabs, mock_websocket):
+    """Testar att uppspelningen ger samma ljud och samma tidsform, skalad med hastigheten."""
+    await _record_session(fake_elevenlabs, mock_websocket)
+    recorded_audio = _audio_sent(mock_websocket)
+    recordings = load_recordings([str(record_dir)])
+    _, frames = recordings[0]
+    recorder.directory = ""  # Spela inte in uppspelningen
+
+    elapsed = {}
+    for speed in (1.0, 4.0):
+        server = ReplayElevenLabsServer(recordings, speed=speed)
+        await server.start()
+        replay_ws = AsyncMock()
+        replay_ws.receive_text = AsyncMock(return_value=json.dumps({"text": TEXT}))
+        profiles = load_voice_profiles("", (m for m, _ in model_selector.candidates), base_url=server.url)
+        try:
+            with patch.dict('app.tts.text_to_audio.voice_profiles', profiles):
+                started = time.perf_counter()
+                await ws_tts(replay_ws)
+                elapsed[speed] = time.perf_counter() - started
+        finally:
+            await server.stop()
+        assert _audio_sent(replay_ws) == recorded_audio
+        assert server.sessions[0].audio_bytes_sent == len(recorded_audio)
+
+    assert elapsed[1.0] >= frames[-1][0]
+    assert elapsed[4.0] < elapsed[1.0]
+
+async def test_replay_connection_in_process(record_dir, fake_elevenlabs, mock_websocket):
+    """Testar uppspelning i processen via ws_connect-ersättningen, utan väntan."""
+    await _record_session(fake_elevenlabs, mock_websocket)
+    recordings = load_recordings([str(record_dir)])
+    recorder.directory = ""
+
+    connect = replay_connect(recordings, speed=0)
+    with patch('app.tts.text_to_audio.ws_connect', connect):
+        started = time.perf_counter()
+        frames = [msg async for msg, _ in process_text_to_audio(mock_websocket, TEXT, time.perf_counter())]
+        elapsed = time.perf_counter() - started
+
+    assert frames == [frame for _, frame in recordings[0][1]]
+    assert elapsed < recordings[0][1][-1][0]
+    assert json.loads(connect.connections[0].sent[-1])["flush"] is True
+
+def test_sampling_and_size_limit(monkeypatch):
+    """Testar att osamplade anslutningar inte spelas in och att stora inspelningar kortas av."""
+    class _Profile:
+        voice_id, output_format = "v", "pcm_16000"
+
+    class _Attempt:
+        model_id, schedule, hedge = "m", "default", False
+
+    monkeypatch.setattr(recorder, "directory", "/tmp/ignored")
+    monkeypatch.setattr(recorder, "sample_rate", 0.0)
+    assert recorder.start(_Profile(), _Attempt(), "hej", 0.1) is NOOP_RECORDING
+
+    monkeypatch.setattr(recorder, "sample_rate", 1.0)
+    monkeypatch.setattr(recorder, "max_bytes", 100)
+    recording = recorder.start(_Profile(), _Attempt(), "hej", 0.1)
+    recording.frame("x" * 60)
+    recording.frame("y" * 60)
+    assert len(recording.frames) == 1
+    assert recording.truncated
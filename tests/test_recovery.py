@@ -0,0 +1,172 @@
+import pytest
+import asyncio
+import base64
+import json
+import time
+from unittest.mock import AsyncMock, patch
+from websockets.exceptions import ConnectionClosedError
+from app.tts.quota import quota_manager
+from app.tts.recovery import resume_offset, alignment_chars, recovery_stats
+from app.tts.text_to_audio import process_text_to_audio
+
+TEXT = "Första meningen. Andra meningen! Tredje meningen."
+
+def _audio_frame(chars):
+    return json.dumps({
+        "audio": base64.b64encode(b"pcm").decode(),
+        "alignment": {"chars": list(chars), "charStartTimesMs": [0] * len(chars), "charDurationsMs": [0] * len(chars)},
+    })
+
+def test_resume_offset_at_sentence_start():
+    """Testar att syntesen återupptas vid början av första ej färdiga mening."""
+    second = TEXT.index("Andra")
+    assert resume_offset(TEXT, 0) == 0
+    assert resume_offset(TEXT, 5) == 0
+    assert resume_offset(TEXT, second) == second
+    assert resume_offset(TEXT, second + 3) == second
+    assert resume_offset(TEXT, len(TEXT)) == len(TEXT)
+
+def test_alignment_chars_counts_voiced_text():
+    """Testar att antal upplästa tecken läses från alignment-datan."""
+    assert alignment_chars({"alignment": {"chars": ["H", "e", "j"]}}) == 3
+    assert alignment_chars({"normalizedAlignment": {"chars": ["a"]}}) == 1
+    assert alignment_chars({"alignment": None, "audio": "x"}) == 0
+
+def test_dropped_stream_resumes_from_next_sentence(mock_websocket):
+    """Testar att en tappad uppströmsanslutning återupptas från nästa ej upplästa mening."""
+
+    async def _run_test():
+        recovery_stats.reset()
+        first_sentence = TEXT[:TEXT.index("Andra")]
+
+        with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
+            mock_eleven_ws = AsyncMock()
+            mock_connect.return_value.__aenter__.return_value = mock_eleven_ws
+            mock_eleven_ws.recv = AsyncMock(side_effect=[
+                _audio_frame(first_sentence),
+                _audio_frame("Andra me"),
+                ConnectionClosedError(None, None),
+                _audio_frame(TEXT[TEXT.index("Andra"):]),
+                '{"isFinal": true}',
+            ])
+
+            frames = [msg async for msg, _ in process_text_to_audio(mock_websocket, TEXT, time.perf_counter())]
+
+        assert mock_connect.call_count == 2
+        sent_texts = [json.loads(call.args[0]).get("text") for call in mock_eleven_ws.send.call_args_list]
+        assert TEXT in sent_texts
+        # Andra meningen läses om från början i den nya strömmen
+        assert "Andra meningen! Tredje meningen." in sent_texts
+        assert frames[-1] == '{"isFinal": true}'
+
+        snapshot = recovery_stats.snapshot()
+        assert snapshot["resumes"] == 1
+        assert snapshot["sessions_recovered"] == 1
+
+    asyncio.run(_run_test())
+
+def test_drop_before_connect_is_not_resumed(mock_websocket):
+    """Testar att anslutningsfel inte återupptas utan skickas vidare."""
+
+    async def _run_test():
+        with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
+            mock_connect.return_value.__aenter__.side_effect = OSError("connection refused")
+            with pytest.raises(OSError):
+                async for _ in process_text_to_audio(mock_websocket, TEXT, time.perf_counter()):
+                    pass
+            assert mock_connect.call_count == 1
+
+    asyncio.run(_run_test())
+
+def test_resumed_sentence_skips_audio_already_sent(mock_websocket):
+    """Testar att ljud som klienten redan fått inte skickas igen och att omskickad text kostar kvot."""
+
+    async def _run_test():
+        recovery_stats.reset()
+        first_sentence = TEXT[:TEXT.index("Andra")]
+        resumed = TEXT[TEXT.index("Andra"):]
+        chars_before = sum(key["chars_used"] for key in quota_manager.snapshot()["keys"])
+
+        with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
+            mock_eleven_ws = AsyncMock()
+            mock_connect.return_value.__aenter__.return_value = mock_eleven_ws
+            mock_eleven_ws.recv = AsyncMock(side_effect=[
+                _audio_frame(first_sentence),
+                _audio_frame("Andra me"),
+                ConnectionClosedError(None, None),
+                _audio_frame("Andra "),
+                _audio_frame("me"),
+                _audio_frame("ningen! Tredje meningen."),
+                '{"isFinal": true}',
+            ])
+
+            frames = [msg async for msg, _ in process_text_to_audio(mock_websocket, TEXT, time.perf_counter())]
+
+        voiced = [
+            "".join(json.loads(msg)["alignment"]["chars"])
+            for msg in frames if isinstance(msg, str) and "alignment" in msg
+        ]
+        assert voiced == [first_sentence, "Andra me", "ningen! Tredje meningen."]
+        assert recovery_stats.snapshot()["skipped_chars"] == len("Andra me")
+
+        chars_after = sum(key["chars_used"] for key in quota_manager.snapshot()["keys"])
+        assert chars_after - chars_before == len(TEXT) + len(resumed)
+
+        resume_info = [
+            json.loads(call.args[0])["resume"] for call in mock_websocket.send_text.call_args_list
+            if "resume" in call.args[0]
+        ]
+        assert resume_info == [{"offset": TEXT.index("Andra"), "attempt": 1, "skip_chars": len("Andra me")}]
+
+    asyncio.run(_run_test())
+
+def _audio_without_alignment():
+    return json.dumps({"audio": base64.b64encode(b"pcm").decode()})
+
+def test_stall_without_alignment_is_not_resumed(mock_websocket):
+    """Testar att en tyst ström utan alignment avslutas direkt i stället för att läsas upp igen."""
+
+    async def _run_test():
+        recovery_stats.reset()
+        with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
+            mock_eleven_ws = AsyncMock()
+            mock_connect.return_value.__aenter__.return_value = mock_eleven_ws
+            mock_eleven_ws.recv = AsyncMock(side_effect=[
+                _audio_without_alignment(),
+                _audio_without_alignment(),
+                asyncio.TimeoutError(),  # Inaktivitets-timeout
+                _audio_without_alignment(),
+                '{"isFinal": true}',
+            ])
+
+            frames = [msg async for msg, _ in process_text_to_audio(mock_websocket, TEXT, time.perf_counter())]
+
+        assert mock_connect.call_count == 1
+        assert frames == [_audio_without_alignment()] * 2
+        assert recovery_stats.snapshot()["resumes"] == 0
+
+    asyncio.run(_run_test())
+
+def test_drop_without_alignment_fails_fast(mock_websocket):
+    """Testar att en tappad ström utan alignment inte återupptas, eftersom klienten då skulle få samma ljud igen."""
+
+    async def _run_test():
+        recovery_stats.reset()
+        frames = []
+        with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
+            mock_eleven_ws = AsyncMock()
+            mock_connect.return_value.__aenter__.return_value = mock_eleven_ws
+            mock_eleven_ws.recv = AsyncMock(side_effect=[
+                _audio_without_alignment(),
+                ConnectionClosedError(None, None),
+                _audio_without_alignment(),
+            ])
+            with pytest.raises(ConnectionClosedError):
+                async for msg, _ in process_text_to_audio(mock_websocket, TEXT, time.perf_counter()):
+                    frames.append(msg)
+
+        assert mock_connect.call_count == 1
+        assert frames == [_audio_without_alignment()]
+        assert recovery_stats.snapshot()["resumes"] == 0
+
+    asyncio.run(_run_test())
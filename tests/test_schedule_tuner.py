@@ -0,0 +1,82 @@
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, patch
+from app.tts.schedule_tuner import ScheduleTuner, SCHEDULE_CANDIDATES, DEFAULT_SCHEDULE, length_bucket
+from app.tts.text_to_audio import process_text_to_audio
+
+def test_length_buckets():
+    """Testar att texter delas in i längdgrupper."""
+    assert length_bucket(10) == "short"
+    assert length_bucket(200) == "medium"
+    assert length_bucket(1000) == "long"
+
+def test_disabled_tuner_uses_default():
+    """Testar att avstängd tuner alltid ger det tidigare schemat."""
+    tuner = ScheduleTuner(enabled=False, explore_rate=0.5)
+    assert tuner.select(10) == DEFAULT_SCHEDULE
+    assert SCHEDULE_CANDIDATES[DEFAULT_SCHEDULE] == ([50, 90, 140], True)
+
+def test_untried_schedules_are_tried_first():
+    """Testar att alla scheman prövas innan tunern börjar välja det bästa."""
+    tuner = ScheduleTuner(enabled=True, explore_rate=0, seed=1)
+    tried = set()
+    for _ in SCHEDULE_CANDIDATES:
+        name = tuner.select(10)
+        tried.add(name)
+        tuner.observe(10, name, 1.0, 0.1)
+    assert tried == set(SCHEDULE_CANDIDATES)
+
+def test_best_schedule_per_bucket():
+    """Testar att schemat med lägst TTFB + glapp väljs per längdgrupp."""
+    tuner = ScheduleTuner(enabled=True, explore_rate=0, seed=1)
+    for name in SCHEDULE_CANDIDATES:
+        tuner.observe(10, name, 1.0, 0.2)
+        tuner.observe(500, name, 1.0, 0.2)
+    tuner.observe(10, "eager", 0.1, 0.1)
+    for _ in range(10):
+        tuner.observe(500, "balanced", 0.3, 0.1)
+
+    assert tuner.select(10) == "eager"
+    assert tuner.select(500) == "balanced"
+    snapshot = tuner.snapshot()
+    assert snapshot["buckets"]["short"]["best"] == "eager"
+    assert snapshot["buckets"]["medium"]["best"] is None
+
+def test_forced_schedule_sent_in_init(mock_websocket):
+    """Testar att valt schema skickas i init-meddelandet till ElevenLabs."""
+
+    async def _run_test():
+        with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
+            mock_eleven_ws = AsyncMock()
+            mock_connect.return_value.__aenter__.return_value = mock_eleven_ws
+            mock_eleven_ws.recv = AsyncMock(side_effect=['{"isFinal": true}'])
+
+            async for _ in process_text_to_audio(mock_websocket, "Test", time.perf_counter(), schedule="provider-default"):
+                pass
+
+            sent = [json.loads(call.args[0]) for call in mock_eleven_ws.send.call_args_list]
+            assert sent[0]["generation_config"]["chunk_length_schedule"] == [120, 160, 250, 290]
+            assert sent[1]["try_trigger_generation"] is False
+
+    asyncio.run(_run_test())
+
+def test_experiment_records_failed_runs():
+    """Testar att ett misslyckat anrop hamnar i schemats rad i stället för att avbryta svepet."""
+    from tools import schedule_experiment
+
+    async def _run_once(text, schedule):
+        if schedule == DEFAULT_SCHEDULE:
+            raise OSError("connection refused")
+        return {"ttfb_sec": 0.1, "total_sec": 0.5}
+
+    with patch.object(schedule_experiment, "_run_once", _run_once):
+        results = asyncio.run(schedule_experiment.run_experiment(["Hej!"], repeats=2))
+
+    assert len(results) == len(SCHEDULE_CANDIDATES)
+    rows = {row["schedule"]: row for row in results}
+    assert rows[DEFAULT_SCHEDULE]["failed"] == 2
+    assert rows[DEFAULT_SCHEDULE]["errors"][0] == "OSError: connection refused"
+    assert rows[DEFAULT_SCHEDULE]["total_median_sec"] is None
+    other = next(row for name, row in rows.items() if name != DEFAULT_SCHEDULE)
+    assert other["runs"] == 2 and other["failed"] == 0
@@ -0,0 +1,102 @@
+import pytest
+import asyncio
+from app.tts.scheduler import PriorityScheduler
+
+async def _queue_up(scheduler, priority, order):
+    """Köar en förfrågan och noterar i vilken ordning den släpps fram."""
+    await scheduler.acquire(priority)
+    order.append(priority)
+
+@pytest.mark.asyncio
+async def test_free_slot_granted_immediately():
+    """Testar att en ledig plats delas ut direkt utan kö."""
+    scheduler = PriorityScheduler(max_slots=2, bulk_min_share=0.1)
+
+    await scheduler.acquire("bulk")
+    await scheduler.acquire("interactive")
+
+    snapshot = scheduler.snapshot()
+    assert snapshot["slots_in_use"] == 2
+    assert snapshot["classes"]["bulk"]["granted"] == 1
+    assert snapshot["classes"]["interactive"]["granted"] == 1
+
+@pytest.mark.asyncio
+async def test_interactive_preempts_queued_bulk():
+    """Testar att interaktiva förfrågningar går före köad bulk-trafik."""
+    scheduler = PriorityScheduler(max_slots=1, bulk_min_share=0)
+    await scheduler.acquire("standard")
+
+    order = []
+    bulk = asyncio.create_task(_queue_up(scheduler, "bulk", order))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(_queue_up(scheduler, "interactive", order))
+    await asyncio.sleep(0)
+
+    scheduler.release()
+    await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(bulk, interactive)
+
+    assert order == ["interactive", "bulk"]
+
+@pytest.mark.asyncio
+async def test_bulk_gets_minimum_share():
+    """Testar att bulk får sin minsta andel även när interaktiv trafik väntar."""
+    scheduler = PriorityScheduler(max_slots=1, bulk_min_share=0.25)
+    await scheduler.acquire("standard")
+
+    order = []
+    tasks = [asyncio.create_task(_queue_up(scheduler, "bulk", order))]
+    for _ in range(8):
+        tasks.append(asyncio.create_task(_queue_up(scheduler, "interactive", order)))
+    await asyncio.sleep(0)
+
+    for _ in range(len(tasks)):
+        scheduler.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+    # Var fjärde tilldelning ska gå till bulk när bulk väntar
+    assert order.index("bulk") == 3
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    """Testar att en avbruten väntande förfrågan tas bort ur kön."""
+    scheduler = PriorityScheduler(max_slots=1, bulk_min_share=0.1)
+    await scheduler.acquire("interactive")
+
+    waiter = asyncio.create_task(scheduler.acquire("bulk"))
+    await asyncio.sleep(0)
+    assert scheduler.snapshot()["classes"]["bulk"]["queued"] == 1
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    scheduler.release()
+    snapshot = scheduler.snapshot()
+    assert snapshot["classes"]["bulk"]["queued"] == 0
+    assert snapshot["slots_in_use"] == 0
+
+@pytest.mark.asyncio
+async def test_unknown_priority_rejected():
+    """Testar att okänd prioritet avvisas."""
+    scheduler = PriorityScheduler(max_slots=1, bulk_min_share=0.1)
+    with pytest.raises(ValueError):
+        await scheduler.acquire("urgent")
+
+@pytest.mark.asyncio
+async def test_try_slot_never_waits_or_jumps_queue():
+    """Testar att try_slot bara tar en ledig plats och aldrig går före köade förfrågningar."""
+    scheduler = PriorityScheduler(max_slots=2, bulk_min_share=0.1)
+
+    assert scheduler.try_slot("standard")
+    await scheduler.acquire("standard")
+    assert not scheduler.try_slot("interactive")  # Alla platser upptagna
+
+    waiter = asyncio.create_task(scheduler.acquire("bulk"))
+    await asyncio.sleep(0)
+    scheduler.release()
+    await waiter  # Den köade fick platsen, inte try_slot
+    assert not scheduler.try_slot("interactive")
+    assert scheduler.snapshot()["slots_in_use"] == 2
@@ -9,7 +9,7 @@ def test_text_to_audio_connection(mock_websocket):
     
     async def _run_test():
         test_text = "Det här är ett test"
-        started_at = time.time()
+        started_at = time.perf_counter()
         
         # Mocka websockets.client.connect för att undvika riktiga API-anrop
         with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
@@ -44,7 +44,7 @@ def test_text_to_audio_with_long_text(mock_websocket):
     
     async def _run_test():
         long_text = "Det här är en längre text som testar att systemet kan hantera fler ord och längre meningar utan problem."
-        started_at = time.time()
+        started_at = time.perf_counter()
         
         with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
             mock_eleven_ws = AsyncMock()
@@ -70,7 +70,7 @@ def test_text_to_audio_timeout_handling(mock_websocket):
     
     async def _run_test():
         test_text = "Test"
-        started_at = time.time()
+        started_at = time.perf_counter()
         
         with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
             mock_eleven_ws = AsyncMock()
@@ -93,7 +93,7 @@ def test_text_to_audio_error_handling(mock_websocket):
     
     async def _run_test():
         test_text = "Test"
-        started_at = time.time()
+        started_at = time.perf_counter()
         
         with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
             mock_eleven_ws = AsyncMock()
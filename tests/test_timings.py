@@ -0,0 +1,40 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
+from app.tts.timings import SessionTimings, STAGES
+from app.endpoints.tts_ws import ws_tts
+
+def test_first_mark_wins():
+    """Testar att bara första tidsstämpeln per steg sparas."""
+    timings = SessionTimings()
+    timings.mark("text_received")
+    first = timings.get("text_received")
+    timings.mark("text_received")
+    assert timings.get("text_received") == first
+
+    breakdown = timings.breakdown()
+    assert list(breakdown["since_accept_ms"]) == ["accepted", "text_received"]
+    assert list(breakdown["stage_ms"]) == ["accepted->text_received"]
+
+def test_done_status_contains_breakdown(mock_websocket):
+    """Testar att done-meddelandet innehåller tid per steg för hela sessionen."""
+
+    async def _run_test():
+        mock_websocket.receive_text = AsyncMock(return_value=json.dumps({"text": "Hej"}))
+        with patch('app.tts.text_to_audio.ws_connect') as mock_connect:
+            mock_eleven_ws = AsyncMock()
+            mock_connect.return_value.__aenter__.return_value = mock_eleven_ws
+            mock_eleven_ws.recv = AsyncMock(side_effect=[
+                '{"audio": "dGVzdF9hdWRpbw=="}',
+                '{"isFinal": true}',
+            ])
+            await ws_tts(mock_websocket)
+
+        sent = [json.loads(call.args[0]) for call in mock_websocket.send_text.call_args_list]
+        done = next(msg for msg in sent if msg.get("stage") == "done")
+        since_accept = done["timings"]["since_accept_ms"]
+        assert list(since_accept) == list(STAGES)
+        assert list(since_accept.values()) == sorted(since_accept.values())
+        assert done["elapsed_sec"] * 1000 >= since_accept["final_frame"] - 1
+
+    asyncio.run(_run_test())
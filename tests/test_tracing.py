@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, patch
+from app.tts.tracing import Tracer, JsonLinesExporter, NOOP_TRACE, parse_trace_context
+from app.endpoints.tts_ws import ws_tts
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+def test_parse_trace_context():
+    """Testar att trace-id läses från traceparent eller trace_id och att skräp ignoreras."""
+    assert parse_trace_context({"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}) == (TRACE_ID, PARENT_ID)
+    assert parse_trace_context({"trace_id": TRACE_ID.upper()}) == (TRACE_ID, None)
+    assert parse_trace_context({"trace_id": "inte-hex"}) == (None, None)
+    assert parse_trace_context({"traceparent": "00-" + "0" * 32 + f"-{PARENT_ID}-01"}) == (None, None)
+
+def test_sampling_by_trace_id(tmp_path):
+    """Testar att samplingen är av vid 0 och avgörs deterministiskt av trace-id:t."""
+    exporter = JsonLinesExporter(str(tmp_path / "traces.jsonl"))
+    assert Tracer(0.0, exporter).start_trace(TRACE_ID) is NOOP_TRACE
+    assert Tracer(1.0, exporter).start_trace(TRACE_ID).sampled
+
+    half = Tracer(0.5, exporter)
+    assert half.start_trace("0" * 16 + "0" * 15 + "1").sampled
+    assert half.start_trace("0" * 16 + "f" * 16) is NOOP_TRACE
+
+def test_ws_session_exports_spans(mock_websocket, tmp_path):
+    """Testar att en spårad session exporteras som en OTLP-JSON-rad med klientens trace-id."""
+
+    async def _run_test():
+        path = tmp_path / "traces.jsonl"
+        mock_websocket.receive_text = AsyncMock(return_value=json.dumps({
+            "text": "Hej", "traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01",
+        }))
+        exporter = JsonLinesExporter(str(path))
+        with patch('app.endpoints.tts_ws.tracer', Tracer(1.0, exporter, frame_batch=1)), \
+                patch('app.tts.text_to_audio.ws_connect') as mock_connect:
+            mock_eleven_ws = AsyncMock()
+            mock_connect.return_value.__aenter__.return_value = mock_eleven_ws
+            mock_eleven_ws.recv = AsyncMock(side_effect=[
+                '{"audio": "dGVzdF9hdWRpbw=="}',
+                '{"isFinal": true}',
+            ])
+            await ws_tts(mock_websocket)
+            await exporter.drain()
+
+        lines = path.read_text().splitlines()
+        assert len(lines) == 1
+        spans = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        by_name = {span["name"]: span for span in spans}
+        assert {"ws_tts", "validate", "queue", "upstream.connect", "upstream.stream", "upstream.frames", "stream"} <= set(by_name)
+        assert all(span["traceId"] == TRACE_ID for span in spans)
+        assert by_name["ws_tts"]["parentSpanId"] == PARENT_ID
+        assert by_name["upstream.frames"]["parentSpanId"] == by_name["upstream.stream"]["spanId"]
+        # frame_batch kommer från sessionens tracer: en span per ram här
+        assert sum(span["name"] == "upstream.frames" for span in spans) == 2
+        for span in spans:
+            assert int(span["endTimeUnixNano"]) >= int(span["startTimeUnixNano"])
+
+        done = [json.loads(c.args[0]) for c in mock_websocket.send_text.call_args_list]
+        assert any(msg.get("stage") == "done" and msg.get("trace_id") == TRACE_ID for msg in done)
+
+    asyncio.run(_run_test())
+
+async def test_export_does_not_block_event_loop(tmp_path):
+    """Testar att exporten skriver i en tråd och att drain väntar in skrivningen."""
+    exporter = JsonLinesExporter(str(tmp_path / "traces.jsonl"))
+    write = exporter._write
+
+    def slow_write(line):
+        time.sleep(0.2)  # Långsam disk
+        write(line)
+
+    exporter._write = slow_write
+    trace = Tracer(1.0, exporter).start_trace(TRACE_ID)
+    started = time.perf_counter()
+    trace.finish()
+    assert time.perf_counter() - started < 0.1
+    assert exporter.exported == 0
+
+    await exporter.drain()
+    assert exporter.exported == 1
+    assert json.loads((tmp_path / "traces.jsonl").read_text())["resourceSpans"]
@@ -0,0 +1,67 @@
+import pytest
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, patch
+from pydantic import ValidationError
+from app.tts.voice_profiles import load_voice_profiles, DEFAULT_PROFILE
+from app.tts.text_to_audio import process_text_to_audio
+
+def test_default_profile_always_present():
+    """Testar att default-profilen finns även utan konfiguration."""
+    profiles = load_voice_profiles("", ["flash"])
+    assert DEFAULT_PROFILE in profiles
+    assert "model_id=flash&output_format=pcm_16000" in profiles[DEFAULT_PROFILE].url("flash")
+
+def test_profiles_precompute_messages():
+    """Testar att URL, init-meddelande och debug-info byggs en gång per profil."""
+    profiles = load_voice_profiles(json.dumps({
+        "narrator": {
+            "voice_id": "voice-narrator",
+            "model_id": "eleven_multilingual_v2",
+            "output_format": "pcm_24000",
+            "voice_settings": {"stability": 0.7},
+            "schedule": "balanced",
+        }
+    }), ["flash"])
+    narrator = profiles["narrator"]
+
+    assert narrator.sample_rate == 24000
+    assert narrator.url("eleven_multilingual_v2").endswith(
+        "/voice-narrator/stream-input?model_id=eleven_multilingual_v2&output_format=pcm_24000"
+    )
+    init = json.loads(narrator.init_message("balanced"))
+    assert init["voice_settings"]["stability"] == 0.7
+    assert init["generation_config"]["chunk_length_schedule"] == [80, 120, 200, 260]
+    assert "xi_api_key" not in init  # Nyckeln skickas i headern
+    # Samma strängobjekt återanvänds mellan förfrågningar
+    assert narrator.init_message("balanced") is narrator.init_message("balanced")
+    assert json.loads(narrator.debug_api_details("flash"))["api_details"]["profile"] == "narrator"
+
+def test_invalid_profile_rejected_at_startup():
+    """Testar att felaktiga profiler avvisas när de laddas."""
+    with pytest.raises(ValidationError):
+        load_voice_profiles(json.dumps({"bad": {"voice_id": "x", "output_format": "mp3_44100_128"}}), [])
+    with pytest.raises(ValidationError):
+        load_voice_profiles(json.dumps({"bad": {"voice_id": "x", "schedule": "nope"}}), [])
+    with pytest.raises(ValidationError):
+        load_voice_profiles(json.dumps({"bad": {"voice_id": "x", "voice_settings": {"speed": 3}}}), [])
+
+def test_profile_selected_per_request(mock_websocket):
+    """Testar att vald profil styr URL och init-meddelande till ElevenLabs."""
+
+    async def _run_test():
+        profiles = load_voice_profiles(json.dumps({"fixed": {"voice_id": "voice-fixed", "model_id": "m1"}}), [])
+        with patch.dict('app.tts.text_to_audio.voice_profiles', profiles), \
+                patch('app.tts.text_to_audio.ws_connect') as mock_connect:
+            mock_eleven_ws = AsyncMock()
+            mock_connect.return_value.__aenter__.return_value = mock_eleven_ws
+            mock_eleven_ws.recv = AsyncMock(side_effect=['{"isFinal": true}'])
+
+            async for _ in process_text_to_audio(mock_websocket, "Test", time.perf_counter(), profile="fixed"):
+                pass
+
+            url = mock_connect.call_args.args[0]
+            assert "/voice-fixed/stream-input?model_id=m1" in url
+
+    asyncio.run(_run_test())
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Lokal ersättning för ElevenLabs stream-input-websocket.
+Talar samma protokoll (init, text, flush, base64-ljud med alignment, isFinal) och
+genererar syntetisk PCM med inställbar TTFB, realtidsfaktor och chunkstorlek.
+
+Användning: python -m tests.utils.fake_elevenlabs [--port 8765] [--ttfb-ms 200] [--rtf 0.3] [--chunk-ms 250]
+Peka sedan tjänsten mot den med ELEVENLABS_WS_BASE=ws://127.0.0.1:8765
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import math
+import re
+import time
+from typing import List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from websockets.exceptions import ConnectionClosed
+from websockets.server import serve
+
+_PATH = re.compile(r"^/v1/text-to-speech/(?P<voice_id>[^/]+)/stream-input$")
+
+
+class StopSession(Exception):
+    """Avslutar sessionen från serversidan (används av felinjektionen)."""
+
+
+def synth_pcm(samples: int, sample_rate: int, start_sample: int = 0, freq: float = 220.0) -> bytes:
+    """Syntetisk 16-bit mono PCM (sinuston) som fortsätter fasriktigt från start_sample."""
+    t = (np.arange(samples) + start_sample) / sample_rate
+    return (np.sin(2 * math.pi * freq * t) * 8000).astype("<i2").tobytes()
+
+
+class FakeSession:
+    """Det servern tog emot under en uppkoppling, för assertions i tester."""
+
+    def __init__(self, index: int, voice_id: str, model_id: str, output_format: str, api_key: Optional[str]):
+        self.index = index  # Ordningsnummer för anslutningen mot servern
+        self.voice_id = voice_id
+        self.model_id = model_id
+        self.output_format = output_format
+        self.api_key = api_key
+        self.init: Optional[dict] = None
+        self.texts: List[str] = []
+        self.flushed = False
+        self.frames_sent = 0
+        self.audio_bytes_sent = 0
+        self.first_audio_at: Optional[float] = None
+        self.connected_at = time.perf_counter()
+        self.closed = False
+
+
+class FakeElevenLabsServer:
+    """Websocket-server som beter sig som ElevenLabs stream-input.
+
+    `ttfb_sec` är tiden från flush till första ljudramen, `rtf` är genereringstid
+    per sekund ljud (0 = så fort som möjligt, 1 = realtid), `chunk_ms` är ljud per
+    ram och `chars_per_sec` styr hur långt ljud varje tecken ger.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        ttfb_sec: float = 0.05,
+        rtf: float = 0.0,
+        chunk_ms: int = 250,
+        chars_per_sec: float = 15.0,
+        api_key: Optional[str] = None,
+        send_alignment: bool = True,
+    ):
+        self.host = host
+        self.port = port
+        self.ttfb_sec = ttfb_sec
+        self.rtf = rtf
+        self.chunk_ms = chunk_ms
+        self.chars_per_sec = chars_per_sec
+        self.api_key = api_key
+        self.send_alignment = send_alignment
+        self.sessions: List[FakeSession] = []
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        """Bas-URL att sätta som ELEVENLABS_WS_BASE."""
+        return f"ws://{self.host}:{self.port}"
+
+    @property
+    def active_connections(self) -> int:
+        return sum(1 for session in self.sessions if not session.closed)
+
+    async def start(self):
+        self._server = await serve(self._handle, self.host, self.port, process_request=self._process_request)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    # Protokoll ---------------------------------------------------------------
+
+    async def _process_request(self, path, request_headers):
+        """Anropas före websocket-handskakningen; None = fortsätt som vanligt."""
+        return None
+
+    async def _handle(self, ws):
+        parsed = urlparse(ws.path)
+        match = _PATH.match(parsed.path)
+        if not match:
+            await ws.close(code=1008, reason="unknown path")
+            return
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        session = FakeSession(
+            len(self.sessions),
+            match["voice_id"],
+            query.get("model_id", ""),
+            query.get("output_format", "mp3_44100_128"),
+            ws.request_headers.get("xi-api-key"),
+        )
+        self.sessions.append(session)
+        try:
+            await self._serve_session(ws, session)
+        except (ConnectionClosed, StopSession):
+            pass
+        finally:
+            session.closed = True
+
+    async def _serve_session(self, ws, session: FakeSession):
+        # Init-meddelandet (text " ") kommer först; nyckeln kan också ligga i det
+        session.init = json.loads(await ws.recv())
+        session.api_key = session.api_key or session.init.get("xi_api_key")
+        if self.api_key is not None and session.api_key != self.api_key:
+            await ws.send(json.dumps({"error": "invalid_api_key", "message": "Invalid API key"}))
+            await ws.close(code=1008)
+            return
+
+        # Text tills flush eller tom text (slut på inmatning)
+        while True:
+            msg = json.loads(await ws.recv())
+            text = msg.get("text", "")
+            if text:
+                session.texts.append(text)
+            if msg.get("flush") or text == "":
+                session.flushed = True
+                break
+
+        await self.respond(ws, session, "".join(session.texts))
+
+    async def respond(self, ws, session: FakeSession, text: str):
+        """Svarar på en flushad text: syntetiskt ljud och sedan isFinal."""
+        await self.stream_audio(ws, session, text)
+        await ws.send(json.dumps({"isFinal": True}))
+
+    def _sample_rate(self, session: FakeSession) -> int:
+        fmt = session.output_format
+        return int(fmt[4:]) if fmt.startswith("pcm_") and fmt[4:].isdigit() else 16000
+
+    async def stream_audio(self, ws, session: FakeSession, text: str):
+        """Skickar syntetiskt ljud för texten i chunkar, med alignment per chunk."""
+        sample_rate = self._sample_rate(session)
+        text = text.strip()
+        if not text:
+            return
+        ms_per_char = 1000.0 / self.chars_per_sec
+        total_ms = len(text) * ms_per_char
+        chunk_samples = int(sample_rate * self.chunk_ms / 1000)
+        total_samples = int(sample_rate * total_ms / 1000)
+
+        await asyncio.sleep(self.ttfb_sec)
+        sent_samples = 0
+        sent_chars = 0
+        while sent_samples < total_samples:
+            samples = min(chunk_samples, total_samples - sent_samples)
+            pcm = synth_pcm(samples, sample_rate, sent_samples)
+            sent_samples += samples
+            # Tecken vars starttid ligger inom den här chunkens ljud
+            chars_until = min(len(text), math.ceil(sent_samples * 1000 / sample_rate / ms_per_char))
+            frame = {"audio": base64.b64encode(pcm).decode(), "isFinal": None}
+            if self.send_alignment:
+                chars = text[sent_chars:chars_until]
+                frame["alignment"] = {
+                    "chars": list(chars),
+                    "charStartTimesMs": [int((sent_chars + i) * ms_per_char) for i in range(len(chars))],
+                    "charDurationsMs": [int(ms_per_char)] * len(chars),
+                }
+            sent_chars = chars_until
+            await self.send_frame(ws, session, frame, len(pcm))
+            if self.rtf > 0 and sent_samples < total_samples:
+                await asyncio.sleep(samples / sample_rate * self.rtf)
+
+    async def send_frame(self, ws, session: FakeSession, frame: dict, pcm_bytes: int):
+        await ws.send(json.dumps(frame))
+        if session.first_audio_at is None:
+            session.first_audio_at = time.perf_counter()
+        session.frames_sent += 1
+        session.audio_bytes_sent += pcm_bytes
+
+
+async def _serve_forever(args):
+    server = FakeElevenLabsServer(
+        host=args.host, port=args.port, ttfb_sec=args.ttfb_ms / 1000, rtf=args.rtf,
+        chunk_ms=args.chunk_ms, chars_per_sec=args.chars_per_sec,
+    )
+    await server.start()
+    print(f"🎭 Fake ElevenLabs lyssnar på {server.url} (sätt ELEVENLABS_WS_BASE={server.url})")
+    try:
+        await asyncio.Future()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttfb-ms", type=float, default=200)
+    parser.add_argument("--rtf", type=float, default=0.3, help="genereringstid per sekund ljud (0 = direkt)")
+    parser.add_argument("--chunk-ms", type=int, default=250)
+    parser.add_argument("--chars-per-sec", type=float, default=15.0)
+    try:
+        asyncio.run(_serve_forever(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Felinjektion för uppströmsvägen ovanpå den lokala ElevenLabs-ersättningen.
+Scenarier läses från en JSON-fil (se fault_scenarios.json) och kan ge fördröjd
+anslutning, tystnad mitt i strömmen, tappad anslutning, felramar, trasig JSON
+och överstora chunkar.
+
+Användning: python -m tests.utils.fault_injection --scenario stall_mid_stream [--scenarios fil.json] [--port 8765]
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from tests.utils.fake_elevenlabs import FakeElevenLabsServer, FakeSession, StopSession
+
+DEFAULT_SCENARIOS = Path(__file__).with_name("fault_scenarios.json")
+
+FAULT_TYPES = ("connect_delay", "stall", "drop", "error_frame", "malformed", "oversized")
+
+
+class Fault:
+    """Ett fel som injiceras i utvalda anslutningar, efter ett visst antal ljudramar."""
+
+    def __init__(
+        self,
+        type: str,
+        after_frames: int = 0,
+        sec: float = 0.0,
+        message: str = "Injected failure",
+        bytes: int = 2_000_000,
+        connections: Optional[List[int]] = None,
+    ):
+        if type not in FAULT_TYPES:
+            raise ValueError(f"Okänd feltyp: {type} (tillgängliga: {', '.join(FAULT_TYPES)})")
+        self.type = type
+        self.after_frames = after_frames
+        self.sec = sec
+        self.message = message
+        self.bytes = bytes
+        self.connections = connections  # None = alla anslutningar
+
+    def applies_to(self, session_index: int) -> bool:
+        return self.connections is None or session_index in self.connections
+
+
+class FaultScenario:
+    """Namngivet scenario: fel att injicera, serverinställningar och förväntat utfall."""
+
+    def __init__(self, name: str, faults: List[dict], server: dict = None, expect: dict = None, description: str = ""):
+        self.name = name
+        self.description = description
+        self.faults = [Fault(**fault) for fault in faults]
+        self.server = server or {}
+        self.expect = expect or {}
+
+
+def load_scenarios(path=DEFAULT_SCENARIOS) -> Dict[str, FaultScenario]:
+    """Läser scenariofilen: JSON-objekt namn → {faults, server, expect, description}."""
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    return {name: FaultScenario(name, **spec) for name, spec in raw.items()}
+
+
+class FaultyElevenLabsServer(FakeElevenLabsServer):
+    """ElevenLabs-ersättning som injicerar felen i ett scenario."""
+
+    def __init__(self, scenario: FaultScenario, **kwargs):
+        super().__init__(**{**scenario.server, **kwargs})
+        self.scenario = scenario
+        self.injected: List[str] = []
+
+    def _faults(self, fault_type: str, session_index: int) -> List[Fault]:
+        return [f for f in self.scenario.faults if f.type == fault_type and f.applies_to(session_index)]
+
+    async def _process_request(self, path, request_headers):
+        # Anslutningen räknas innan den finns, så indexet är nästa sessions nummer
+        for fault in self._faults("connect_delay", len(self.sessions)):
+            self.injected.append("connect_delay")
+            await asyncio.sleep(fault.sec)
+        return None
+
+    async def send_frame(self, ws, session: FakeSession, frame: dict, pcm_bytes: int):
+        for fault in self.scenario.faults:
+            if fault.type == "connect_delay" or not fault.applies_to(session.index):
+                continue
+            if session.frames_sent != fault.after_frames:
+                continue
+            self.injected.append(fault.type)
+            if fault.type == "stall":
+                # Tyst tills klienten ger upp (eller tiden gått), utan att blockera serverns stängning
+                try:
+                    await asyncio.wait_for(ws.wait_closed(), timeout=fault.sec)
+                except asyncio.TimeoutError:
+                    pass
+            elif fault.type == "drop":
+                ws.transport.abort()  # Abrupt TCP-avbrott utan close-ram
+                raise StopSession()
+            elif fault.type == "error_frame":
+                await ws.send(json.dumps({"error": "injected_error", "message": fault.message}))
+                await ws.close(code=1011)
+                raise StopSession()
+            elif fault.type == "malformed":
+                await ws.send('{"audio": "trasig json')
+            elif fault.type == "oversized":
+                await ws.send(json.dumps({"audio": base64.b64encode(os.urandom(fault.bytes)).decode()}))
+        await super().send_frame(ws, session, frame, pcm_bytes)
+
+
+async def _serve_forever(args):
+    scenario = load_scenarios(args.scenarios)[args.scenario]
+    server = FaultyElevenLabsServer(scenario, port=args.port)
+    await server.start()
+    print(f"💥 Fake ElevenLabs med scenariot '{scenario.name}' lyssnar på {server.url}")
+    try:
+        await asyncio.Future()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", required=True)
+    parser.add_argument("--scenarios", default=str(DEFAULT_SCENARIOS))
+    parser.add_argument("--port", type=int, default=8765)
+    try:
+        asyncio.run(_serve_forever(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
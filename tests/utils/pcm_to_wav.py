@@ -2,74 +2,181 @@
 """
 Verktyg för att konvertera PCM-filer till WAV-format.
 ElevenLabs skickar PCM 16kHz 16-bit, vilket vi konverterar till WAV.
+
+Filen kopieras i bitar av fast storlek efter ett genererat WAV-huvud, så minnet är
+detsamma oavsett filens storlek (även flera GB). En katalog konverteras i en
+processpool och filer vars WAV redan är nyare än PCM-filen hoppas över.
+
+Användning: python -m tests.utils.pcm_to_wav <pcm-fil|katalog> [wav-fil|utkatalog] [--workers 4] [--force]
 """
 
-import wave
+import argparse
+import multiprocessing
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def pcm_to_wav(pcm_file_path, wav_file_path=None, sample_rate=16000, channels=1, sample_width=2):
+from app.audio_files import wav_header
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB per läsning
+
+
+def pcm_to_wav(pcm_file_path, wav_file_path=None, sample_rate=16000, channels=1, sample_width=2,
+               chunk_size=CHUNK_SIZE):
     """
     Konverterar PCM-fil till WAV-format.
-    
+
     Args:
         pcm_file_path: Sökväg till PCM-filen
         wav_file_path: Sökväg för WAV-filen (om None, skapas automatiskt)
         sample_rate: Sampling rate (default: 16000 Hz för ElevenLabs)
         channels: Antal kanaler (default: 1 för mono)
         sample_width: Bredd per sample i bytes (default: 2 för 16-bit)
+        chunk_size: Bytes per läsning; styr minnesanvändningen
+    """
+    if wav_file_path is None:
+        wav_file_path = Path(pcm_file_path).with_suffix('.wav')
+    convert_file(pcm_file_path, wav_file_path, sample_rate, channels, sample_width, chunk_size)
+    return wav_file_path
+
+
+def convert_file(pcm_file_path, wav_file_path=None, sample_rate=16000, channels=1, sample_width=2,
+                 chunk_size=CHUNK_SIZE):
+    """Strömmar PCM → WAV och returnerar antal kopierade PCM-bytes.
+
+    Skrivs till en .tmp-fil som byter namn när den är klar, så en avbruten
+    konvertering aldrig lämnar en halv WAV som ser aktuell ut.
     """
-    
     if not os.path.exists(pcm_file_path):
         raise FileNotFoundError(f"PCM-fil hittades inte: {pcm_file_path}")
-    
-    # Skapa WAV-filnamn om inte angivet
     if wav_file_path is None:
-        pcm_path = Path(pcm_file_path)
-        wav_file_path = pcm_path.with_suffix('.wav')
-    
-    print(f"🔄 Konverterar {pcm_file_path} → {wav_file_path}")
-    
-    # Läs PCM-data
-    with open(pcm_file_path, 'rb') as pcm_file:
-        pcm_data = pcm_file.read()
-    
-    print(f"📊 PCM-data: {len(pcm_data)} bytes")
-    
-    # Skapa WAV-fil
-    with wave.open(wav_file_path, 'wb') as wav_file:
-        wav_file.setnchannels(channels)
-        wav_file.setsampwidth(sample_width)
-        wav_file.setframerate(sample_rate)
-        wav_file.writeframes(pcm_data)
-    
-    # Verifiera WAV-filen
-    with wave.open(wav_file_path, 'rb') as wav_file:
-        frames = wav_file.getnframes()
-        duration = frames / sample_rate
-    
-    print(f"✅ WAV skapad: {wav_file_path}")
-    print(f"📊 WAV-info: {frames} frames, {duration:.2f}s, {sample_rate}Hz")
-    
-    return wav_file_path
+        wav_file_path = Path(pcm_file_path).with_suffix('.wav')
+
+    block_align = channels * sample_width
+    size = os.path.getsize(pcm_file_path)
+    data_bytes = size - size % block_align  # Ofullständig sista frame tas inte med
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    tmp = f"{wav_file_path}.tmp"
+    try:
+        with open(pcm_file_path, 'rb') as src, open(tmp, 'wb') as dst:
+            dst.write(wav_header(data_bytes, sample_rate, channels, sample_width))
+            remaining = data_bytes
+            while remaining > 0:
+                n = src.readinto(view[:min(chunk_size, remaining)])
+                if not n:
+                    raise IOError(f"PCM-filen krympte under konverteringen: {pcm_file_path}")
+                dst.write(view[:n])
+                remaining -= n
+        os.replace(tmp, wav_file_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return data_bytes
+
+
+def is_up_to_date(pcm_path, wav_path) -> bool:
+    """WAV-filen finns och är inte äldre än PCM-filen."""
+    try:
+        return os.path.getmtime(wav_path) >= os.path.getmtime(pcm_path)
+    except OSError:
+        return False
+
+
+def _convert_job(job):
+    pcm, wav, sample_rate, channels, sample_width, chunk_size = job
+    started = time.perf_counter()
+    data_bytes = convert_file(pcm, wav, sample_rate, channels, sample_width, chunk_size)
+    return pcm, data_bytes, time.perf_counter() - started
+
+
+def convert_directory(source_dir, out_dir=None, workers=None, force=False, sample_rate=16000, channels=1,
+                      sample_width=2, chunk_size=CHUNK_SIZE):
+    """Konverterar alla .pcm i `source_dir` (till `out_dir`, annars bredvid) i en processpool.
+
+    Returnerar en sammanfattning med antal konverterade, överhoppade och misslyckade
+    filer, bytes, tid och genomströmning (MB/s och sekunder ljud per sekund).
+    """
+    out_dir = out_dir or source_dir
+    os.makedirs(out_dir, exist_ok=True)
+    jobs, skipped = [], 0
+    for pcm in sorted(Path(source_dir).glob("*.pcm")):
+        wav = Path(out_dir) / pcm.with_suffix(".wav").name
+        if not force and is_up_to_date(pcm, wav):
+            skipped += 1
+            continue
+        jobs.append((str(pcm), str(wav), sample_rate, channels, sample_width, chunk_size))
+
+    converted, failed, total_bytes = [], [], 0
+    started = time.perf_counter()
+    if jobs:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+        # spawn: samma beteende på alla plattformar och inga ärvda trådar
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {pool.submit(_convert_job, job): job[0] for job in jobs}
+            for future, pcm in futures.items():
+                try:
+                    _, data_bytes, _ = future.result()
+                    converted.append(pcm)
+                    total_bytes += data_bytes
+                except Exception as e:
+                    failed.append((pcm, str(e)))
+    elapsed = time.perf_counter() - started
+    return {
+        "converted": len(converted),
+        "skipped": skipped,
+        "failed": failed,
+        "bytes": total_bytes,
+        "elapsed_sec": elapsed,
+        "mb_per_sec": total_bytes / 1e6 / elapsed if elapsed > 0 else 0.0,
+        "audio_sec_per_sec": total_bytes / (sample_rate * channels * sample_width) / elapsed if elapsed > 0 else 0.0,
+    }
+
 
 def main():
     """Huvudfunktion för kommandoradsanvändning."""
-    if len(sys.argv) < 2:
-        print("Användning: python pcm_to_wav.py <pcm-fil> [wav-fil]")
-        print("Exempel: python pcm_to_wav.py test_output/audio.pcm")
-        sys.exit(1)
-    
-    pcm_file = sys.argv[1]
-    wav_file = sys.argv[2] if len(sys.argv) > 2 else None
-    
+    parser = argparse.ArgumentParser(description="Konverterar PCM-filer (eller en hel katalog) till WAV")
+    parser.add_argument("source", help="PCM-fil eller katalog med .pcm-filer")
+    parser.add_argument("dest", nargs="?", help="WAV-fil eller utkatalog (standard: bredvid PCM-filen)")
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None, help="Processer i katalogläge (standard: antal CPU:er)")
+    parser.add_argument("--force", action="store_true", help="Konvertera även filer vars WAV redan är aktuell")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Bytes per läsning")
+    args = parser.parse_args()
+
     try:
-        wav_path = pcm_to_wav(pcm_file, wav_file)
-        print(f"🎵 Konvertering klar: {wav_path}")
+        if os.path.isdir(args.source):
+            print(f"🔄 Konverterar {args.source} → {args.dest or args.source}")
+            summary = convert_directory(args.source, args.dest, args.workers, args.force, args.sample_rate,
+                                        args.channels, chunk_size=args.chunk_size)
+            print(f"✅ {summary['converted']} konverterade, {summary['skipped']} redan aktuella, "
+                  f"{len(summary['failed'])} misslyckades")
+            for pcm, error in summary["failed"]:
+                print(f"❌ {pcm}: {error}")
+        else:
+            print(f"🔄 Konverterar {args.source} → {args.dest or Path(args.source).with_suffix('.wav')}")
+            started = time.perf_counter()
+            data_bytes = convert_file(args.source, args.dest, args.sample_rate, args.channels,
+                                      chunk_size=args.chunk_size)
+            elapsed = time.perf_counter() - started
+            summary = {
+                "bytes": data_bytes,
+                "elapsed_sec": elapsed,
+                "mb_per_sec": data_bytes / 1e6 / elapsed if elapsed > 0 else 0.0,
+                "audio_sec_per_sec": data_bytes / (args.sample_rate * args.channels * 2) / elapsed if elapsed > 0 else 0.0,
+                "failed": [],
+            }
+        print(f"📊 {summary['bytes'] / 1e6:.1f} MB på {summary['elapsed_sec']:.2f}s: "
+              f"{summary['mb_per_sec']:.1f} MB/s, {summary['audio_sec_per_sec']:.0f}× realtid")
     except Exception as e:
         print(f"❌ Fel vid konvertering: {e}")
         sys.exit(1)
+    if summary["failed"]:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
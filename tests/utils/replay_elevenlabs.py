@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Uppspelning av inspelade ElevenLabs-sessioner (se app/tts/recorder.py, TTS_RECORD_DIR).
+Ramarna skickas med samma tidsavstånd som när de spelades in, räknat från flush,
+eller snabbare med --speed (2 = dubbelt så fort, 0 = utan väntan).
+
+Användning: python -m tests.utils.replay_elevenlabs --recordings recordings/ [--speed 1] [--port 8765]
+Peka sedan tjänsten mot den med ELEVENLABS_WS_BASE=ws://127.0.0.1:8765
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import time
+from typing import List, Tuple
+
+import orjson
+
+from app.tts.recorder import list_recordings, load_recording
+from tests.utils.fake_elevenlabs import FakeElevenLabsServer, FakeSession
+
+
+def load_recordings(paths) -> List[Tuple[dict, list]]:
+    """Läser inspelningar från filer och/eller kataloger."""
+    recordings = []
+    for path in paths:
+        files = list_recordings(path) if os.path.isdir(path) else [path]
+        recordings.extend(load_recording(f) for f in files)
+    if not recordings:
+        raise ValueError(f"Inga inspelningar i {', '.join(map(str, paths))}")
+    return recordings
+
+
+def _audio_bytes(frame) -> int:
+    if isinstance(frame, (bytes, bytearray)):
+        return len(frame)
+    try:
+        audio = orjson.loads(frame).get("audio")
+    except Exception:
+        return 0
+    return len(base64.b64decode(audio)) if audio else 0
+
+
+async def replay_frames(frames, speed: float, send):
+    """Skickar ramarna med inspelade tidsavstånd (delat med `speed`) från anropstillfället."""
+    started = time.perf_counter()
+    for t, frame in frames:
+        if speed > 0:
+            delay = started + t / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await send(frame)
+
+
+class ReplayElevenLabsServer(FakeElevenLabsServer):
+    """ElevenLabs-ersättning som spelar upp inspelade sessioner i tur och ordning.
+
+    Anslutning nummer N får inspelning N modulo antalet; med `replay_connect` väntar
+    handskakningen också den inspelade anslutningstiden.
+    """
+
+    def __init__(self, recordings: List[Tuple[dict, list]], speed: float = 1.0, replay_connect: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        self.recordings = recordings
+        self.speed = speed
+        self.replay_connect = replay_connect
+
+    def recording_for(self, session_index: int) -> Tuple[dict, list]:
+        return self.recordings[session_index % len(self.recordings)]
+
+    async def _process_request(self, path, request_headers):
+        if self.replay_connect and self.speed > 0:
+            meta, _ = self.recording_for(len(self.sessions))
+            await asyncio.sleep(meta.get("connect_sec", 0) / self.speed)
+        return None
+
+    async def respond(self, ws, session: FakeSession, text: str):
+        _, frames = self.recording_for(session.index)
+
+        async def send(frame):
+            await ws.send(frame)
+            audio = _audio_bytes(frame)
+            if audio:
+                if session.first_audio_at is None:
+                    session.first_audio_at = time.perf_counter()
+                session.frames_sent += 1
+                session.audio_bytes_sent += audio
+
+        await replay_frames(frames, self.speed, send)
+
+
+class ReplayConnection:
+    """Uppström i minnet med samma gränssnitt som websockets-anslutningen, för att patcha ws_connect.
+
+    Ramarna börjar spelas upp när klienten skickar flush, precis som mot ElevenLabs.
+    """
+
+    def __init__(self, recording: Tuple[dict, list], speed: float = 1.0):
+        self.meta, self.frames = recording
+        self.speed = speed
+        self.sent: List[str] = []
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        return False
+
+    async def send(self, data):
+        self.sent.append(data)
+        if self._task is None and orjson.loads(data).get("flush"):
+            self._task = asyncio.create_task(replay_frames(self.frames, self.speed, self._queue.put))
+
+    async def recv(self):
+        return await self._queue.get()
+
+
+def replay_connect(recordings: List[Tuple[dict, list]], speed: float = 1.0):
+    """Ersättning för ws_connect som ger en ReplayConnection per anslutning, i tur och ordning."""
+    calls = []
+
+    def connect(*args, **kwargs):
+        connection = ReplayConnection(recordings[len(calls) % len(recordings)], speed)
+        calls.append(connection)
+        return connection
+    connect.connections = calls
+    return connect
+
+
+async def _serve_forever(args):
+    server = ReplayElevenLabsServer(
+        load_recordings(args.recordings), speed=args.speed, replay_connect=args.replay_connect,
+        host=args.host, port=args.port,
+    )
+    await server.start()
+    print(f"📼 Uppspelning av {len(server.recordings)} sessioner på {server.url} (hastighet {args.speed}x)")
+    try:
+        await asyncio.Future()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recordings", nargs="+", required=True, help="Inspelningsfiler eller kataloger")
+    parser.add_argument("--speed", type=float, default=1.0, help="Uppspelningshastighet (0 = utan väntan)")
+    parser.add_argument("--replay-connect", action="store_true", help="Fördröj handskakningen som vid inspelningen")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    try:
+        asyncio.run(_serve_forever(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark av loggningens kostnad i den heta vägen (send_audio_to_frontend).
+Mäter ramar per sekund med loggning av, synkron DEBUG, kö-baserad DEBUG och samplad DEBUG.
+
+Användning: python -m tools.bench_logging [--frames N] [--format json|text]
+"""
+
+import argparse
+import asyncio
+import base64
+import logging
+import os
+import tempfile
+import time
+
+import orjson
+
+from app.logging_config import configure_logging, stop_logging
+from app.tts import send_audio_to_frontend as sender
+
+# En typisk ElevenLabs-ram: ~4 kB PCM som base64 plus alignment
+FRAME = orjson.dumps({
+    "audio": base64.b64encode(os.urandom(4096)).decode(),
+    "isFinal": None,
+    "normalizedAlignment": {"chars": list("hej"), "charStartTimesMs": [0, 50, 100], "charDurationsMs": [50, 50, 50]},
+}).decode()
+
+# (namn, nivå, kö, var N:te chunk loggas)
+MODES = [
+    ("off", "WARNING", False, 1),
+    ("debug-sync-every-frame", "DEBUG", False, 1),
+    ("debug-queue-every-frame", "DEBUG", True, 1),
+    ("debug-queue-sampled-50", "DEBUG", True, 50),
+]
+
+
+class _NullWebSocket:
+    async def send_text(self, data):
+        pass
+
+    async def send_bytes(self, data):
+        pass
+
+
+async def _run(frames: int) -> float:
+    ws = _NullWebSocket()
+    total, last = 0, None
+    started = time.perf_counter()
+    for _ in range(frames):
+        total, last, _ = await sender.send_audio_to_frontend(ws, FRAME, total, last)
+    return frames / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--format", default="json", choices=("json", "text"))
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.NamedTemporaryFile("w", suffix=".log") as log_file:
+        for name, level, use_queue, every in MODES:
+            configure_logging(level=level, fmt=args.format, logger_levels="", use_queue=use_queue, stream=log_file)
+            sender._frame_log.every = sender._chunk_log.every = every
+            results[name] = asyncio.run(_run(args.frames))
+            stop_logging()  # Räkna inte med att lyssnartråden hinner ikapp efteråt
+        log_bytes = os.path.getsize(log_file.name)
+
+    logging.getLogger().handlers.clear()
+    baseline = results["off"]
+    print(f"{'läge':<28}{'ramar/s':>12}{'vs av':>9}")
+    for name, fps in results.items():
+        print(f"{name:<28}{fps:>12.0f}{fps / baseline:>9.2f}")
+    print(f"loggdata skriven: {log_bytes} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Lastgenerator för /ws/tts: öppnar N klienter i en given ankomsttakt mot en körande app
+och rapporterar tid till första ljud (p50/p95/p99), jitter mellan chunkar, genomströmning
+i ljudsekunder per väggsekund, fel per typ samt serverns CPU och RSS.
+
+Användning:
+  python -m tools.loadgen --url ws://127.0.0.1:8000/ws/tts --sessions 50 --rate 10 --server-pid PID
+  python -m tools.loadgen --spawn --sessions 50 --rate 10 --out loadgen.json   # app + lokal ElevenLabs-ersättning
+  python -m tools.loadgen --spawn --compare loadgen_main.json                  # jämför mot en tidigare körning
+  python -m tools.loadgen --spawn --replay recordings/ --replay-speed 2        # inspelad trafik i stället för syntetisk
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+from websockets.client import connect as ws_connect
+from websockets.exceptions import ConnectionClosed
+
+DEFAULT_TEXT = "Det här är ett lasttest av TTS-tjänsten. Den andra meningen gör texten lite längre."
+BYTES_PER_SAMPLE = 2  # pcm_<rate> är 16-bit mono
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Percentil med linjär interpolation; None för tom lista."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _dist(values: List[float]) -> dict:
+    def ms(v):
+        return round(v * 1000, 2) if v is not None else None
+    return {
+        "count": len(values),
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(max(values) if values else None),
+    }
+
+
+class SessionResult:
+    """Mätvärden för en klientsession."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.outcome = "pending"  # done, error, closed eller exception:<typ>
+        self.error: Optional[str] = None
+        self.connect_sec: Optional[float] = None
+        self.ttfa_sec: Optional[float] = None  # Från skickad text till första binära ljudram
+        self.gaps: List[float] = []
+        self.audio_bytes = 0
+        self.elapsed_sec = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "index": self.index,
+            "outcome": self.outcome,
+            "error": self.error,
+            "connect_ms": round(self.connect_sec * 1000, 2) if self.connect_sec is not None else None,
+            "ttfa_ms": round(self.ttfa_sec * 1000, 2) if self.ttfa_sec is not None else None,
+            "chunks": len(self.gaps) + (1 if self.ttfa_sec is not None else 0),
+            "audio_bytes": self.audio_bytes,
+            "elapsed_ms": round(self.elapsed_sec * 1000, 2),
+        }
+
+
+async def run_session(index: int, url: str, request: dict, timeout_sec: float) -> SessionResult:
+    """En /ws/tts-klient: väntar på ready, skickar texten och läser tills done/error/stängning."""
+    result = SessionResult(index)
+    started = time.perf_counter()
+    try:
+        async with asyncio.timeout(timeout_sec):
+            async with ws_connect(url, max_size=None) as ws:
+                result.connect_sec = time.perf_counter() - started
+                sent_at = None
+                last_chunk = None
+                async for msg in ws:
+                    if isinstance(msg, bytes):
+                        now = time.perf_counter()
+                        if result.ttfa_sec is None:
+                            result.ttfa_sec = now - sent_at
+                        else:
+                            result.gaps.append(now - last_chunk)
+                        last_chunk = now
+                        result.audio_bytes += len(msg)
+                        continue
+                    data = json.loads(msg)
+                    if data.get("type") == "status" and data.get("stage") == "ready":
+                        sent_at = time.perf_counter()
+                        await ws.send(json.dumps(request))
+                    elif data.get("type") == "status" and data.get("stage") == "done":
+                        result.outcome = "done"
+                        break
+                    elif data.get("type") == "error":
+                        result.outcome = "error"
+                        result.error = data.get("message")
+                        break
+                if result.outcome == "pending":
+                    result.outcome = "closed"
+    except (TimeoutError, asyncio.TimeoutError):
+        result.outcome = "exception:timeout"
+    except ConnectionClosed as e:
+        result.outcome = "closed"
+        result.error = str(e)
+    except Exception as e:
+        result.outcome = f"exception:{type(e).__name__}"
+        result.error = str(e)
+    result.elapsed_sec = time.perf_counter() - started
+    return result
+
+
+class ProcessSampler:
+    """Samplar CPU-tid och RSS för en process via /proc (Linux) medan lasten körs."""
+
+    def __init__(self, pid: int, interval_sec: float = 0.25):
+        self.pid = pid
+        self.interval_sec = interval_sec
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.rss_samples: List[int] = []
+        self.cpu_start = self.cpu_end = None
+        self.wall_start = self.wall_end = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _cpu_sec(self) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                # Fält efter kommandonamnet (som kan innehålla blanksteg); utime/stime är fält 14/15
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / self.ticks
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def _rss_bytes(self) -> Optional[int]:
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+        return None
+
+    async def _run(self):
+        while True:
+            rss = self._rss_bytes()
+            if rss is not None:
+                self.rss_samples.append(rss)
+            await asyncio.sleep(self.interval_sec)
+
+    def start(self):
+        self.cpu_start, self.wall_start = self._cpu_sec(), time.perf_counter()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self.cpu_end, self.wall_end = self._cpu_sec(), time.perf_counter()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def summary(self) -> Optional[dict]:
+        if self.cpu_start is None or self.cpu_end is None:
+            return None  # Ingen /proc eller processen försvann
+        wall = self.wall_end - self.wall_start
+        cpu = self.cpu_end - self.cpu_start
+        return {
+            "pid": self.pid,
+            "cpu_sec": round(cpu, 3),
+            "cpu_percent": round(100 * cpu / wall, 1) if wall > 0 else None,
+            "rss_start_mb": round(self.rss_samples[0] / 2**20, 1) if self.rss_samples else None,
+            "rss_peak_mb": round(max(self.rss_samples) / 2**20, 1) if self.rss_samples else None,
+        }
+
+
+async def run_load(
+    url: str,
+    sessions: int,
+    rate: float,
+    concurrency: int = 0,
+    text: str = DEFAULT_TEXT,
+    voice: Optional[str] = None,
+    priority: Optional[str] = None,
+    sample_rate: int = 16000,
+    timeout_sec: float = 60.0,
+    poisson: bool = False,
+    server_pid: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> dict:
+    """Startar `sessions` klienter med `rate` ankomster/s (max `concurrency` samtidiga, 0 = obegränsat)."""
+    request = {"text": text}
+    if voice:
+        request["voice"] = voice
+    if priority:
+        request["priority"] = priority
+    rng = random.Random(seed)
+    limit = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+    sampler = ProcessSampler(server_pid) if server_pid else None
+
+    async def one(index: int) -> SessionResult:
+        if limit is None:
+            return await run_session(index, url, request, timeout_sec)
+        async with limit:
+            return await run_session(index, url, request, timeout_sec)
+
+    if sampler:
+        sampler.start()
+    started = time.perf_counter()
+    tasks = []
+    next_at = started
+    for index in range(sessions):
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(index), name=f"loadgen-{index}"))
+        next_at += rng.expovariate(rate) if poisson else 1.0 / rate
+    results = await asyncio.gather(*tasks)
+    wall_sec = time.perf_counter() - started
+    if sampler:
+        await sampler.stop()
+    return summarize(
+        results, wall_sec, sample_rate,
+        config={
+            "url": url, "sessions": sessions, "rate": rate, "concurrency": concurrency, "poisson": poisson,
+            "text_chars": len(text), "voice": voice, "priority": priority, "sample_rate": sample_rate,
+        },
+        server=sampler.summary() if sampler else None,
+    )
+
+
+def summarize(results: List[SessionResult], wall_sec: float, sample_rate: int, config: dict = None, server: dict = None) -> dict:
+    """Sammanställer sessionsresultat till en jämförbar rapport."""
+    outcomes = {}
+    for r in results:
+        outcomes[r.outcome] = outcomes.get(r.outcome, 0) + 1
+    audio_bytes = sum(r.audio_bytes for r in results)
+    audio_sec = audio_bytes / (sample_rate * BYTES_PER_SAMPLE)
+    gaps = [gap for r in results for gap in r.gaps]
+    # Jitter per session = standardavvikelse för glappen mellan chunkar
+    jitter = [statistics.pstdev(r.gaps) for r in results if len(r.gaps) >= 2]
+    return {
+        "config": config or {},
+        "wall_sec": round(wall_sec, 3),
+        "sessions": len(results),
+        "outcomes": outcomes,
+        "errors": sum(n for outcome, n in outcomes.items() if outcome != "done"),
+        "connect": _dist([r.connect_sec for r in results if r.connect_sec is not None]),
+        "time_to_first_audio": _dist([r.ttfa_sec for r in results if r.ttfa_sec is not None]),
+        "inter_chunk_gap": _dist(gaps),
+        "inter_chunk_jitter": _dist(jitter),
+        "audio_sec": round(audio_sec, 3),
+        "throughput_audio_sec_per_sec": round(audio_sec / wall_sec, 3) if wall_sec > 0 else None,
+        "server": server,
+        "per_session": [r.to_dict() for r in results],
+    }
+
+
+# Nyckeltal som jämförs mellan körningar: (sökväg, högre är bättre)
+COMPARE_KEYS = [
+    (("time_to_first_audio", "p50_ms"), False),
+    (("time_to_first_audio", "p95_ms"), False),
+    (("time_to_first_audio", "p99_ms"), False),
+    (("inter_chunk_jitter", "p95_ms"), False),
+    (("throughput_audio_sec_per_sec",), True),
+    (("errors",), False),
+    (("server", "cpu_percent"), False),
+    (("server", "rss_peak_mb"), False),
+]
+
+
+def _lookup(report: dict, path):
+    for key in path:
+        if not isinstance(report, dict):
+            return None
+        report = report.get(key)
+    return report
+
+
+def compare(baseline: dict, current: dict) -> List[str]:
+    """Rader med förändring per nyckeltal mot en tidigare rapport."""
+    lines = []
+    for path, higher_is_better in COMPARE_KEYS:
+        old, new = _lookup(baseline, path), _lookup(current, path)
+        if old is None or new is None:
+            continue
+        delta = new - old
+        pct = f"{100 * delta / old:+.1f}%" if old else "n/a"
+        better = delta == 0 or (delta > 0) == higher_is_better
+        lines.append(f"{'✅' if better else '⚠️ '} {'.'.join(path):<36} {old:>10} → {new:<10} ({pct})")
+    return lines
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_for_port(port: int, timeout_sec: float = 15.0):
+    deadline = time.monotonic() + timeout_sec
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Appen svarade inte på port {port}")
+
+
+async def _run_spawned(args) -> dict:
+    """Startar lokal ElevenLabs-ersättning och appen (uvicorn) som underprocess, kör lasten och stänger ned."""
+    from tests.utils.fake_elevenlabs import FakeElevenLabsServer
+    from tests.utils.replay_elevenlabs import ReplayElevenLabsServer, load_recordings
+
+    if args.replay:
+        fake = ReplayElevenLabsServer(load_recordings(args.replay), speed=args.replay_speed, replay_connect=True)
+    else:
+        fake = FakeElevenLabsServer(ttfb_sec=args.fake_ttfb_ms / 1000, rtf=args.fake_rtf, chunk_ms=args.fake_chunk_ms)
+    await fake.start()
+    port = _free_port()
+    env = {
+        **os.environ,
+        "ELEVENLABS_WS_BASE": fake.url,
+        "ELEVENLABS_API_KEY": os.getenv("ELEVENLABS_API_KEY") or "loadgen",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    }
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)], env=env,
+    )
+    try:
+        await _wait_for_port(port)
+        return await run_load(
+            f"ws://127.0.0.1:{port}/ws/tts", args.sessions, args.rate, args.concurrency, args.text, args.voice,
+            args.priority, args.sample_rate, args.timeout, args.poisson, server_pid=app.pid, seed=args.seed,
+        )
+    finally:
+        app.terminate()
+        try:
+            app.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            app.kill()
+        await fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws/tts")
+    parser.add_argument("--sessions", type=int, default=20, help="Totalt antal klientsessioner")
+    parser.add_argument("--rate", type=float, default=5.0, help="Ankomster per sekund")
+    parser.add_argument("--concurrency", type=int, default=0, help="Max samtidiga sessioner (0 = obegränsat)")
+    parser.add_argument("--poisson", action="store_true", help="Exponentialfördelade ankomster i stället för jämn takt")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--text", default=DEFAULT_TEXT)
+    parser.add_argument("--voice")
+    parser.add_argument("--priority")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="För ljudsekunder (pcm_<rate>)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Max tid per session")
+    parser.add_argument("--server-pid", type=int, help="Appens PID för CPU/RSS (Linux)")
+    parser.add_argument("--spawn", action="store_true", help="Starta appen mot lokal ElevenLabs-ersättning")
+    parser.add_argument("--fake-ttfb-ms", type=float, default=200)
+    parser.add_argument("--fake-rtf", type=float, default=0.3)
+    parser.add_argument("--fake-chunk-ms", type=int, default=250)
+    parser.add_argument("--replay", nargs="+", help="Spela upp inspelade sessioner (filer/kataloger) med --spawn")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="Uppspelningshastighet (0 = utan väntan)")
+    parser.add_argument("--out", help="Spara rapporten som JSON")
+    parser.add_argument("--compare", help="Tidigare rapport (JSON) att jämföra mot")
+    args = parser.parse_args()
+
+    if args.spawn:
+        report = asyncio.run(_run_spawned(args))
+    else:
+        report = asyncio.run(run_load(
+            args.url, args.sessions, args.rate, args.concurrency, args.text, args.voice, args.priority,
+            args.sample_rate, args.timeout, args.poisson, server_pid=args.server_pid, seed=args.seed,
+        ))
+    report["commit"] = _git_commit()
+    report["created_at"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+    ttfa = report["time_to_first_audio"]
+    print(
+        f"{report['sessions']} sessioner på {report['wall_sec']}s  fel: {report['errors']} {report['outcomes']}\n"
+        f"TTFA p50/p95/p99: {ttfa['p50_ms']}/{ttfa['p95_ms']}/{ttfa['p99_ms']} ms  "
+        f"jitter p95: {report['inter_chunk_jitter']['p95_ms']} ms  "
+        f"genomströmning: {report['throughput_audio_sec_per_sec']} ljud-s/s"
+    )
+    if report["server"]:
+        print(f"Server: CPU {report['server']['cpu_percent']}%  RSS topp {report['server']['rss_peak_mb']} MB")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Jämfört med {args.compare} ({baseline.get('commit')}):")
+        print("\n".join(compare(baseline, report)))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✅ Rapport sparad i {args.out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
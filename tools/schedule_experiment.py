@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Offline-experiment för chunk_length_schedule.
+Kör samma texter mot varje kandidatschema och rapporterar TTFB och total tid.
+
+Användning: python -m tools.schedule_experiment [--texts fil.txt] [--repeats N] [--out resultat.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import orjson
+
+# Paketet app läser .env när det importeras
+from app.tts.text_to_audio import process_text_to_audio
+from app.tts.schedule_tuner import SCHEDULE_CANDIDATES, length_bucket
+
+DEFAULT_TEXTS = [
+    "Hej!",
+    "Detta är ett test av TTS-systemet med standardtext.",
+    "Det här är en längre text som testar hur snabbt första ljudet kommer när texten består av "
+    "flera meningar. Den andra meningen gör texten längre. Och en tredje mening för att nå "
+    "den långa längdgruppen med lite marginal, så att schemat verkligen får jobba.",
+]
+
+
+class _NullWebSocket:
+    """Tar emot debug-meddelanden från pipelinen utan att göra något med dem."""
+
+    async def send_text(self, data):
+        pass
+
+    async def send_bytes(self, data):
+        pass
+
+
+def _is_audio(server_msg) -> bool:
+    if isinstance(server_msg, (bytes, bytearray)):
+        return True
+    try:
+        return bool(orjson.loads(server_msg).get("audio"))
+    except Exception:
+        return False
+
+
+async def _run_once(text: str, schedule: str) -> dict:
+    started = time.perf_counter()
+    ttfb = None
+    async for server_msg, _ in process_text_to_audio(_NullWebSocket(), text, time.perf_counter(), schedule=schedule):
+        if ttfb is None and _is_audio(server_msg):
+            ttfb = time.perf_counter() - started
+    return {"ttfb_sec": ttfb, "total_sec": time.perf_counter() - started}
+
+
+async def run_experiment(texts, repeats: int) -> list:
+    """Kör alla kombinationer av text × schema och returnerar sammanställda resultat."""
+    results = []
+    for text in texts:
+        for schedule in SCHEDULE_CANDIDATES:
+            runs, errors = [], []
+            for _ in range(repeats):
+                # Ett misslyckat anrop ska inte kasta bort resten av svepet
+                try:
+                    runs.append(await _run_once(text, schedule))
+                except Exception as e:
+                    errors.append(f"{type(e).__name__}: {e}")
+            ttfbs = [r["ttfb_sec"] for r in runs if r["ttfb_sec"] is not None]
+            results.append({
+                "text_chars": len(text),
+                "bucket": length_bucket(len(text)),
+                "schedule": schedule,
+                "runs": len(runs),
+                "failed": len(errors),
+                "errors": errors,
+                "ttfb_median_sec": round(statistics.median(ttfbs), 4) if ttfbs else None,
+                "ttfb_max_sec": round(max(ttfbs), 4) if ttfbs else None,
+                "total_median_sec": round(statistics.median(r["total_sec"] for r in runs), 4) if runs else None,
+            })
+            print(
+                f"{results[-1]['bucket']:>6} {len(text):>4} tecken  {schedule:<17} "
+                f"TTFB {results[-1]['ttfb_median_sec']}s  total {results[-1]['total_median_sec']}s"
+                + (f"  ({len(errors)} misslyckade: {errors[-1]})" if errors else "")
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jämför chunk_length_schedule-kandidater")
+    parser.add_argument("--texts", help="Fil med en text per rad (default: inbyggda exempel)")
+    parser.add_argument("--repeats", type=int, default=3, help="Antal körningar per text och schema")
+    parser.add_argument("--out", help="Spara resultat som JSON")
+    args = parser.parse_args()
+
+    if not os.getenv("ELEVENLABS_API_KEY") and not os.getenv("ELEVENLABS_API_KEYS"):
+        print("⚠️  Ingen ElevenLabs API-nyckel konfigurerad")
+
+    texts = DEFAULT_TEXTS
+    if args.texts:
+        with open(args.texts, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+
+    results = asyncio.run(run_experiment(texts, args.repeats))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"✅ Resultat sparade i {args.out}")
+
+if __name__ == "__main__":
+    sys.exit(main())